@@ -0,0 +1,212 @@
+"""
+Deterministic generator of synthetic Spotify datasets, schema-identical to
+``dataset/spotify_songs_clean.csv``, at any scale.
+
+The output keeps the traits the sections depend on:
+
+- genre and subgenre proportions of the real dataset;
+- a heavy-tailed artist discography size distribution, artists mostly
+  releasing in one "home" genre over a career of a few years to decades;
+- release dates as full days, year only or month only;
+- correlated audio features (energy/loudness/acousticness, valence/danceability)
+  with genre-specific shifts;
+- tracks listed in several playlists, i.e. repeated ``track_id`` rows.
+
+Rows are generated and written chunk by chunk, so memory is bounded by
+``--chunk-rows`` whatever the requested size. Artists are described by a hash
+of their ID rather than a table. The output only depends on ``--seed`` and
+``--chunk-rows``.
+
+Usage (from the repository root)::
+
+    python benchmarks/generate_dataset.py --rows 1000000 --output /tmp/spotify_1m.csv
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "track_id", "track_name", "track_artist", "track_popularity", "track_album_id",
+    "track_album_name", "track_album_release_date", "playlist_name", "playlist_id",
+    "playlist_genre", "playlist_subgenre", "danceability", "energy", "key", "loudness",
+    "mode", "speechiness", "acousticness", "instrumentalness", "liveness", "valence",
+    "tempo", "duration_ms",
+]
+
+# Share of the rows of each genre and of its subgenres in the real dataset.
+GENRES = {
+    "edm": (0.184, {"big room": 0.20, "electro house": 0.27, "pop edm": 0.25, "progressive electro house": 0.28}),
+    "latin": (0.157, {"latin hip hop": 0.26, "latin pop": 0.25, "reggaeton": 0.18, "tropical": 0.31}),
+    "pop": (0.168, {"dance pop": 0.23, "electropop": 0.26, "indie poptimism": 0.30, "post-teen pop": 0.21}),
+    "r&b": (0.165, {"hip pop": 0.19, "neo soul": 0.31, "new jack swing": 0.25, "urban contemporary": 0.25}),
+    "rap": (0.175, {"gangster rap": 0.23, "hip hop": 0.29, "southern hip hop": 0.29, "trap": 0.19}),
+    "rock": (0.151, {"album rock": 0.24, "classic rock": 0.27, "hard rock": 0.24, "permanent wave": 0.25}),
+}
+GENRE_NAMES = list(GENRES)
+GENRE_SHARES = np.array([share for share, _ in GENRES.values()])
+
+# Latent features, drawn jointly then mapped to each feature's range.
+LATENT = ["danceability", "energy", "loudness", "acousticness", "valence", "speechiness", "instrumentalness", "liveness", "tempo"]
+CORRELATION = np.eye(len(LATENT))
+for (a, b), value in {
+    ("energy", "loudness"): 0.68, ("energy", "acousticness"): -0.54, ("loudness", "acousticness"): -0.36,
+    ("valence", "danceability"): 0.33, ("valence", "energy"): 0.15, ("loudness", "instrumentalness"): -0.15,
+    ("danceability", "tempo"): -0.18, ("energy", "liveness"): 0.16, ("danceability", "speechiness"): 0.18,
+}.items():
+    i, j = LATENT.index(a), LATENT.index(b)
+    CORRELATION[i, j] = CORRELATION[j, i] = value
+CHOLESKY = np.linalg.cholesky(CORRELATION)
+
+# Shift of the latent means per genre (same order as LATENT).
+GENRE_SHIFT = {
+    "edm": [0.2, 0.6, 0.5, -0.4, -0.3, -0.2, 0.9, 0.2, 0.3],
+    "latin": [0.5, 0.1, 0.1, 0.0, 0.5, 0.1, -0.2, 0.0, 0.0],
+    "pop": [0.1, 0.1, 0.1, 0.0, 0.0, -0.3, -0.2, -0.1, 0.0],
+    "r&b": [0.2, -0.4, -0.3, 0.3, 0.1, 0.2, -0.3, -0.1, -0.1],
+    "rap": [0.6, 0.0, 0.0, -0.1, 0.1, 1.0, -0.3, 0.0, 0.0],
+    "rock": [-0.7, 0.3, -0.1, 0.1, 0.2, -0.4, 0.0, 0.1, 0.1],
+}
+SHIFTS = np.array([GENRE_SHIFT[genre] for genre in GENRE_NAMES])
+
+SYLLABLES = np.array(["ka", "lo", "mi", "ren", "sa", "tor", "vi", "da", "nel", "zo", "ar", "be",
+                      "cy", "dru", "el", "fa", "gor", "hu", "is", "jo", "ky", "lu", "ma", "no"])
+
+SECONDS_1957 = pd.Timestamp("1957-01-01").value // 10**9
+SECONDS_2020 = pd.Timestamp("2020-01-29").value // 10**9
+
+
+def mix(values, salt):
+    """Vectorized splitmix64: uniform floats in [0, 1) derived from integer IDs."""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(salt) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def phi(z):
+    """Logistic approximation of the standard normal CDF."""
+    return 1 / (1 + np.exp(-1.702 * z))
+
+
+def artist_names(artist_ids):
+    first = SYLLABLES[(mix(artist_ids, 1) * len(SYLLABLES)).astype(int)]
+    second = SYLLABLES[(mix(artist_ids, 2) * len(SYLLABLES)).astype(int)]
+    names = pd.Series(first).str.capitalize() + pd.Series(second) + " " + pd.Series(artist_ids).astype(str)
+    with_the = mix(artist_ids, 3) < 0.1
+    names[with_the] = "The " + names[with_the]
+    return names.to_numpy()
+
+
+def generate_chunk(chunk_index, n_rows, n_artists, seed):
+    """Generates ``n_rows`` rows; tracks are numbered globally from the chunk index."""
+    rng = np.random.default_rng([seed, chunk_index])
+
+    # Tracks of the chunk, then their playlist memberships (about 15 % extra rows)
+    n_tracks = max(1, int(round(n_rows / 1.15)))
+    memberships = 1 + rng.poisson(0.15, n_tracks)
+    track_of_row = np.repeat(np.arange(n_tracks), memberships)[:n_rows]
+    if len(track_of_row) < n_rows:
+        track_of_row = np.concatenate([track_of_row, rng.integers(0, n_tracks, n_rows - len(track_of_row))])
+    track_ids = np.int64(chunk_index) * 10**9 + np.arange(n_tracks)
+
+    # Heavy-tailed discographies: low artist IDs release far more tracks
+    artists = (n_artists * rng.random(n_tracks) ** 3).astype(np.int64)
+    home_genre = (np.searchsorted(np.cumsum(GENRE_SHARES), mix(artists, 4) * GENRE_SHARES.sum())).clip(0, len(GENRE_NAMES) - 1)
+    career_start = 1957 + (63 * mix(artists, 5) ** 0.35).astype(int)
+    career_years = 1 + (40 * mix(artists, 6) ** 3).astype(int)
+
+    # Release dates within the artist's career
+    years = np.minimum(career_start + rng.integers(0, career_years + 1), 2020)
+    seconds = pd.to_datetime(years.astype(str), format="%Y").asi8 // 10**9 + rng.integers(0, 365 * 86400, n_tracks)
+    dates = pd.to_datetime(np.clip(seconds, SECONDS_1957, SECONDS_2020), unit="s")
+    release = pd.Series(dates.strftime("%Y-%m-%d"))
+    date_format = rng.random(n_tracks)
+    release[(date_format >= 0.94) & (date_format < 0.999)] = release.str[:4]
+    release[date_format >= 0.999] = release.str[:7]
+    release = release.to_numpy()
+
+    # Genre per row: mostly the artist's home genre, then a subgenre of that genre
+    row_artist = artists[track_of_row]
+    genre = np.where(
+        rng.random(n_rows) < 0.8, home_genre[track_of_row],
+        rng.choice(len(GENRE_NAMES), n_rows, p=GENRE_SHARES / GENRE_SHARES.sum())
+    )
+    subgenre = np.empty(n_rows, dtype=object)
+    for g, name in enumerate(GENRE_NAMES):
+        rows = genre == g
+        names = list(GENRES[name][1])
+        shares = np.array(list(GENRES[name][1].values()))
+        subgenre[rows] = np.array(names, dtype=object)[rng.choice(len(names), rows.sum(), p=shares / shares.sum())]
+
+    # Correlated audio features, per track (genre of its first membership)
+    track_genre = genre[np.searchsorted(track_of_row, np.arange(n_tracks)).clip(0, n_rows - 1)]
+    latent = rng.standard_normal((n_tracks, len(LATENT))) @ CHOLESKY.T + SHIFTS[track_genre] * 0.5
+    u = phi(latent)
+    features = {
+        "danceability": np.clip(0.65 + 0.145 * latent[:, 0], 0, 0.98),
+        "energy": np.clip(0.7 + 0.18 * latent[:, 1], 0, 1),
+        "loudness": np.clip(-6.7 + 2.9 * latent[:, 2], -46, 1.3),
+        "acousticness": u[:, 3] ** 4,
+        "valence": np.clip(0.51 + 0.23 * latent[:, 4], 0, 0.99),
+        "speechiness": 0.022 + 0.9 * u[:, 5] ** 5,
+        "instrumentalness": np.where(u[:, 6] > 0.7, u[:, 6] ** 6, 0.0),
+        "liveness": 0.01 + 0.95 * u[:, 7] ** 4,
+        "tempo": np.clip(121 + 27 * latent[:, 8], 40, 240),
+    }
+    popularity = np.clip(42 + 20 * rng.standard_normal(n_tracks) + 15 * (mix(artists, 7) - 0.5) + 0.3 * (years - 2000), 0, 100)
+    popularity[rng.random(n_tracks) < 0.08] = 0
+
+    playlist = rng.integers(0, 80, n_rows)
+    data = pd.DataFrame({
+        "track_id": pd.Series(track_ids[track_of_row]).map("{:022x}".format),
+        "track_name": pd.Series(track_ids[track_of_row]).map("Track {}".format),
+        "track_artist": artist_names(row_artist),
+        "track_popularity": popularity.astype(int)[track_of_row],
+        "track_album_id": pd.Series(row_artist * 100 + years[track_of_row] % 100).map("al{:020x}".format),
+        "track_album_name": pd.Series(years[track_of_row]).map("Album {}".format),
+        "track_album_release_date": release[track_of_row],
+        "playlist_name": pd.Series(subgenre).str.title() + " " + pd.Series(playlist).astype(str),
+        "playlist_id": pd.Series(genre * 1000 + playlist).map("pl{:020x}".format),
+        "playlist_genre": np.array(GENRE_NAMES, dtype=object)[genre],
+        "playlist_subgenre": subgenre,
+        "key": rng.integers(0, 12, n_tracks)[track_of_row],
+        "mode": (rng.random(n_tracks) < 0.56).astype(int)[track_of_row],
+        "duration_ms": np.clip(225_000 + 60_000 * rng.standard_normal(n_tracks), 4_000, 517_000).astype(int)[track_of_row],
+    })
+    for name, values in features.items():
+        data[name] = np.round(values[track_of_row], 4)
+    return data[COLUMNS]
+
+
+def generate_dataset(path, n_rows, seed=0, chunk_rows=100_000):
+    """
+    Writes ``n_rows`` synthetic rows to the CSV file ``path``, one chunk at a time.
+    """
+    n_artists = max(10, n_rows // 3)
+    written = 0
+    chunk_index = 0
+    while written < n_rows:
+        size = min(chunk_rows, n_rows - written)
+        chunk = generate_chunk(chunk_index, size, n_artists, seed)
+        chunk.to_csv(path, mode="a" if chunk_index else "w", header=not chunk_index, index=False)
+        written += size
+        chunk_index += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    args = parser.parse_args()
+    generate_dataset(args.output, args.rows, args.seed, args.chunk_rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
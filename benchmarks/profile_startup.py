@@ -0,0 +1,248 @@
+"""
+Profiles the startup of the dashboard: wall time, CPU time and memory of each
+module imported by ``src.app``, of each function called at module level by
+the sections, and of the first rendering of each lazily mounted section.
+
+Each measurement runs in a fresh process so that instrumentation does not
+skew the other numbers:
+
+- ``time``: no instrumentation, wall and CPU time of each step;
+- ``functions``: ``sys.setprofile`` hook timing the calls made directly by
+  the module-level code of ``src.*`` (includes the hook's own overhead);
+- ``memory``: ``tracemalloc``, memory kept (net) and peak of each step and
+  module-level call.
+
+Usage (from the repository root)::
+
+    python benchmarks/profile_startup.py
+    python benchmarks/profile_startup.py --rows 300000 --output startup.json
+    python benchmarks/profile_startup.py --budget benchmarks/startup_budget.json
+
+A budget is a JSON object mapping step names or module-level call sites (as
+printed in the report, e.g. ``"src.q1"`` or ``"src.q13:12"``, or ``"total"``) to
+limits, e.g.
+``{"src.q1": {"wall_s": 2.0}, "total": {"wall_s": 8.0, "peak_mb": 400}}``.
+The exit status is 1 when a limit is exceeded.
+"""
+import argparse
+import importlib
+import json
+import linecache
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generate_dataset import generate_dataset
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATASET = os.path.join("dataset", "spotify_songs_clean.csv")
+
+# Third-party packages first, so that their import cost is not charged to the
+# first section that needs them; then the modules in the order of src/app.py.
+DEPENDENCIES = [
+    "numpy", "pandas", "plotly.express", "plotly.graph_objects", "dash",
+    "statsmodels.nonparametric.smoothers_lowess", "prometheus_client",
+]
+MODULES = [
+    "src.caracteristiques_audio", "src.q1", "src.q2", "src.q4", "src.q5",
+    "src.q11", "src.metrics", "src.q14", "src.q13", "src.app",
+]
+MODES = ("time", "functions", "memory")
+
+
+# -----------------------------------------------------------------------------
+# Worker
+# -----------------------------------------------------------------------------
+class ModuleLevelProfiler:
+    """
+    ``sys.setprofile`` hook recording the calls made from the module-level
+    code (``<module>`` frame) of ``src.*`` modules, e.g. ``preprocess_data``
+    in q1 or ``pd.read_csv`` in q13. Calls are grouped by calling line.
+    """
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.active = {}
+        self.results = {}
+
+    def __call__(self, frame, event, arg):
+        if event not in ("call", "return"):
+            return
+        caller = frame.f_back
+        if caller is None or caller.f_code.co_name != "<module>":
+            return
+        module = caller.f_globals.get("__name__", "")
+        if not module.startswith("src.") or frame.f_code.co_filename.startswith("<frozen"):
+            return
+        if event == "call":
+            start = (time.perf_counter(), time.process_time())
+            if self.memory:
+                tracemalloc.reset_peak()
+                start += (tracemalloc.get_traced_memory()[0],)
+            self.active[frame] = start
+        elif frame in self.active:
+            start = self.active.pop(frame)
+            name = f"{module}:{caller.f_lineno}"
+            if name not in self.results:
+                code = linecache.getline(caller.f_code.co_filename, caller.f_lineno).strip()
+                self.results[name] = {"code": code, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "net_mb": 0.0, "peak_mb": 0.0}
+            entry = self.results[name]
+            entry["calls"] += 1
+            entry["wall_s"] += time.perf_counter() - start[0]
+            entry["cpu_s"] += time.process_time() - start[1]
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                entry["net_mb"] += (current - start[2]) / 2**20
+                entry["peak_mb"] = max(entry["peak_mb"], (peak - start[2]) / 2**20)
+
+
+def measure(step):
+    """Runs ``step()`` and returns its wall/CPU time and, when tracing, its memory."""
+    memory = tracemalloc.is_tracing()
+    if memory:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    wall, cpu = time.perf_counter(), time.process_time()
+    step()
+    entry = {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu}
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        entry.update(net_mb=(current - before) / 2**20, peak_mb=(peak - before) / 2**20)
+    return entry
+
+
+def run_worker(mode):
+    sys.path.insert(0, REPO_ROOT)
+    profiler = ModuleLevelProfiler(memory=mode == "memory") if mode != "time" else None
+    if mode == "memory":
+        tracemalloc.start()
+    if profiler:
+        sys.setprofile(profiler)
+
+    steps = {}
+    for name in DEPENDENCIES + MODULES:
+        steps[name] = measure(lambda name=name: importlib.import_module(name))
+
+    # Sections mounted lazily build their layout on first display
+    app_module = sys.modules["src.app"]
+    for section_id, module in app_module.lazy_sections.items():
+        render = module.layout if callable(module.layout) else lambda module=module: module.layout
+        steps[f"layout:{section_id}"] = measure(render)
+
+    sys.setprofile(None)
+    return {"steps": steps, "functions": profiler.results if profiler else {}}
+
+
+# -----------------------------------------------------------------------------
+# Driver
+# -----------------------------------------------------------------------------
+def run_modes(workdir):
+    results = {}
+    for mode in MODES:
+        result_path = os.path.join(tempfile.gettempdir(), f"profile_startup_{os.getpid()}_{mode}.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", mode, "--result", result_path],
+            cwd=workdir, check=True,
+        )
+        with open(result_path) as f:
+            results[mode] = json.load(f)
+        os.remove(result_path)
+    return merge(results)
+
+
+def merge(results):
+    """Combines the times of the uninstrumented runs with the memory of the traced one."""
+    def combine(timed, traced):
+        return {
+            name: {**values, **{key: traced.get(name, {}).get(key) for key in ("net_mb", "peak_mb")}}
+            for name, values in timed.items()
+        }
+
+    steps = combine(results["time"]["steps"], results["memory"]["steps"])
+    functions = combine(results["functions"]["functions"], results["memory"]["functions"])
+    imports = [values for name, values in steps.items() if not name.startswith("layout:")]
+    total = {
+        "wall_s": sum(values["wall_s"] for values in imports),
+        "cpu_s": sum(values["cpu_s"] for values in imports),
+        "net_mb": sum(values["net_mb"] or 0 for values in imports),
+        "peak_mb": max(values["peak_mb"] or 0 for values in imports),
+    }
+    return {"total": total, "steps": steps, "functions": functions}
+
+
+def check_budget(report, budget):
+    """Lists the limits of ``budget`` exceeded by ``report``."""
+    entries = {"total": report["total"], **report["steps"], **report["functions"]}
+    exceeded = []
+    for name, limits in budget.items():
+        if name not in entries:
+            exceeded.append(f"{name}: not measured")
+            continue
+        for key, limit in limits.items():
+            value = entries[name].get(key)
+            if value is not None and value > limit:
+                exceeded.append(f"{name}: {key} {value:.2f} > {limit:.2f}")
+    return exceeded
+
+
+def print_report(report, top):
+    def table(title, entries):
+        print(f"\n== {title}")
+        print(f"{'':<64}{'wall s':>9}{'cpu s':>9}{'net MB':>9}{'peak MB':>9}")
+        for name, m in sorted(entries.items(), key=lambda item: -item[1]["wall_s"])[:top]:
+            label = f"{name}  {m['code']}" if "code" in m else name
+            print(f"{label[:63]:<64}{m['wall_s']:>9.3f}{m['cpu_s']:>9.3f}"
+                  f"{m['net_mb'] or 0:>9.1f}{m['peak_mb'] or 0:>9.1f}")
+
+    table("Imports and first layouts", report["steps"])
+    table("Module-level calls (with profiler overhead)", report["functions"])
+    total = report["total"]
+    print(f"\nTotal import: {total['wall_s']:.2f} s wall, {total['cpu_s']:.2f} s CPU, "
+          f"{total['net_mb']:.0f} MB kept, largest step peak {total['peak_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, help="profile on a synthetic dataset of this size instead of dataset/")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic dataset")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--top", type=int, default=25, help="rows printed per table (the JSON has all of them)")
+    parser.add_argument("--budget", help="JSON file of limits; exit status 1 when one is exceeded")
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    if args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.makedirs(os.path.join(workdir, "dataset"))
+            generate_dataset(os.path.join(workdir, DATASET), args.rows, args.seed)
+            report = run_modes(workdir)
+    else:
+        report = run_modes(REPO_ROOT)
+    print_report(report, args.top)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.budget:
+        with open(args.budget) as f:
+            exceeded = check_budget(report, json.load(f))
+        if exceeded:
+            print("\nBudget exceeded:\n  " + "\n  ".join(exceeded))
+            return 1
+        print("\nWithin budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Replays realistic Dash callback requests against ``app.server`` and reports,
+per callback, latency percentiles, response sizes and peak memory.
+
+Each dataset size is benchmarked in its own process: the sections read
+``./dataset/spotify_songs_clean.csv`` at import time, so the worker runs from
+a scratch directory holding a synthetic dataset of the requested size, made
+by ``generate_dataset.py``.
+
+Usage (from the repository root)::
+
+    python benchmarks/replay_callbacks.py --rows 30000 300000 3000000
+    python benchmarks/replay_callbacks.py --rows 30000 --output bench.json --save-baseline benchmarks/baseline.json
+    python benchmarks/replay_callbacks.py --rows 30000 --baseline benchmarks/baseline.json
+
+With ``--baseline``, the exit status is 1 when a callback regresses by more
+than ``--tolerance`` on p50/p99 latency, response size or peak memory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from generate_dataset import generate_dataset
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATASET = os.path.join("dataset", "spotify_songs_clean.csv")
+
+
+# -----------------------------------------------------------------------------
+# Callback requests
+# -----------------------------------------------------------------------------
+def build_request(app, output, values, changed=None):
+    """
+    Builds the JSON body the renderer posts to ``/_dash-update-component``.
+
+    Args:
+        app: The Dash app
+        output: Output key of the callback in ``app.callback_map``
+        values: {"component.prop": value} for the callback's inputs and states
+        changed: Triggering props, all the inputs by default
+    """
+    callback = app.callback_map[output]
+
+    def describe(dependencies):
+        return [
+            {"id": dep["id"], "property": dep["property"], "value": values.get(f"{dep['id']}.{dep['property']}")}
+            for dep in dependencies
+        ]
+
+    if output.startswith(".."):
+        outputs = [dict(zip(("id", "property"), key.split("."))) for key in output[2:-2].split("...")]
+    else:
+        component, prop = output.rsplit(".", 1)
+        outputs = {"id": component, "property": prop}
+
+    inputs = describe(callback["inputs"])
+    return {
+        "output": output,
+        "outputs": outputs,
+        "inputs": inputs,
+        "state": describe(callback.get("state", [])),
+        "changedPropIds": changed or [f"{i['id']}.{i['property']}" for i in inputs],
+    }
+
+
+def scenarios(app):
+    """
+    Yields (name, request bodies) for the interactions of each section.
+    The imports are local: they need the worker's dataset in place.
+    """
+    from src import q1, q2, q5, q13, q14  # pylint: disable=import-outside-toplevel
+
+    q1_story = "..analysis-text-q1.children...year-slider.value...genre-dropdown.value...page-indicator-q1.children...features-store.data.."
+    yield "q1 story pages", [
+        build_request(app, q1_story, {"story-page-q1.data": page}) for page in range(1, 8)
+    ]
+    q1_pages = [
+        ([1970, 2020], "all", q1.carac_audio),
+        ([1970, 2020], "pop", q1.carac_audio),
+        ([1970, 2010], "all", ["mode", "valence", "loudness"]),
+        ([2010, 2020], "all", ["mode", "valence", "loudness"]),
+        ([1970, 2020], "all", ["key", "liveness"]),
+    ]
+    yield "q1 charts", [
+        build_request(app, "charts-container.children", {
+            "year-slider.value": years, "genre-dropdown.value": genre, "features-store.data": features
+        })
+        for years, genre, features in q1_pages
+    ]
+
+    q2_output = "..selected-feature-display.children...music-matrix.figure...selected-column.data...analysis-text.children.."
+    columns = [None] + list(range(len(q2.x_labels)))
+    yield "q2 arrows", [
+        build_request(app, q2_output, {
+            "prev-button.n_clicks": 0, "next-button.n_clicks": i + 1,
+            "selected-column.data": column, "color-store.data": q2.colors.tolist(),
+        }, changed=["next-button.n_clicks"])
+        for i, column in enumerate(columns)
+    ]
+
+    q5_output = "..analysis-text-container.children...graphs-container.children.."
+    genres = ["all"] + list(q5.df_popular["playlist_genre"].unique())
+    # q5.calculate_index divides every genre by its value in the base year, so
+    # only slider years that every genre has are valid (small datasets have gaps)
+    years_by_genre = q5.df_popular.groupby("playlist_genre")["year_group"].agg(lambda dates: set(dates.dt.year))
+    common_years = set.intersection(*years_by_genre)
+    base_years = [year for year in range(q5.min_year, q5.max_year + 1, 3) if year in common_years]
+    if base_years:
+        yield "q5 slider and genre", [
+            build_request(app, q5_output, {"base-year-slider.value": year, "genre-selector.value": genre})
+            for year in base_years[:4] for genre in genres
+        ]
+
+    yield "q13 features", [
+        build_request(app, "line_chart-q13.figure", {"feature-dropdown-q13.value": feature})
+        for feature in q13.features
+    ]
+
+    artist_options = "..artist_dropdown.options...artist_dropdown.value.."
+    genres = sorted(q14.genre_timelines)
+    yield "q14 genre", [
+        build_request(app, artist_options, {"genre_dropdown.value": genre}, changed=["genre_dropdown.value"])
+        for genre in genres
+    ]
+    yield "q14 artist search", [
+        build_request(app, artist_options, {
+            "genre_dropdown.value": genre, "artist_dropdown.search_value": q14.search_artists(genre)[0][:3]
+        }, changed=["artist_dropdown.search_value"])
+        for genre in genres
+    ]
+    selections = [(genre, q14.search_artists(genre)[0]) for genre in genres]
+    yield "q14 artist", [
+        build_request(app, "artist_subgenre_graph.figure", {"genre_dropdown.value": genre, "artist_dropdown.value": artist})
+        for genre, artist in selections
+    ]
+    yield "q14 genre context", [
+        build_request(app, "subgenre_graph-q15.figure", {
+            "genre_dropdown.value": genre, "artist_dropdown.value": artist,
+            "bins_slider-q14.value": 10, "window_slider-q14.value": None,
+        }, changed=["artist_dropdown.value"])
+        for genre, artist in selections
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Worker: runs inside the scratch directory of one dataset
+# -----------------------------------------------------------------------------
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def run_worker(repeat):
+    sys.path.insert(0, REPO_ROOT)
+    start = time.perf_counter()
+    from src.app import app  # pylint: disable=import-outside-toplevel
+    import_seconds = time.perf_counter() - start
+
+    client = app.server.test_client()
+    results = {}
+    for name, requests in scenarios(app):
+        # Warm-up and memory pass (tracemalloc slows the calls down, keep it out of the timings)
+        tracemalloc.start()
+        sizes = []
+        for body in requests:
+            response = client.post("/_dash-update-component", json=body)
+            if response.status_code not in (200, 204):
+                raise RuntimeError(f"{name}: HTTP {response.status_code} for {body['output']}")
+            sizes.append(len(response.data))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies = []
+        for _ in range(repeat):
+            for body in requests:
+                start = time.perf_counter()
+                client.post("/_dash-update-component", json=body)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        results[name] = {
+            "calls": len(latencies),
+            "p50_ms": percentile(latencies, 50),
+            "p90_ms": percentile(latencies, 90),
+            "p99_ms": percentile(latencies, 99),
+            "mean_bytes": float(np.mean(sizes)),
+            "max_bytes": int(max(sizes)),
+            "peak_memory_kb": peak / 1024,
+        }
+
+    layout = client.get("/_dash-layout")
+    return {"import_seconds": import_seconds, "layout_bytes": len(layout.data), "callbacks": results}
+
+
+# -----------------------------------------------------------------------------
+# Driver
+# -----------------------------------------------------------------------------
+def run_dataset(n_rows, repeat, seed):
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "dataset"))
+        generate_dataset(os.path.join(workdir, DATASET), n_rows, seed)
+        result_path = os.path.join(workdir, "result.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", result_path, "--repeat", str(repeat)],
+            cwd=workdir, check=True,
+        )
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def compare(results, baseline, tolerance):
+    """Lists the metrics that got worse than the baseline by more than ``tolerance``."""
+    regressions = []
+    for rows, dataset in results.items():
+        for name, metrics in dataset["callbacks"].items():
+            reference = baseline.get(rows, {}).get("callbacks", {}).get(name)
+            if not reference:
+                continue
+            for key in ("p50_ms", "p99_ms", "mean_bytes", "peak_memory_kb"):
+                if reference.get(key) and metrics[key] > reference[key] * (1 + tolerance):
+                    regressions.append(f"{rows} rows / {name}: {key} {reference[key]:.1f} -> {metrics[key]:.1f}")
+    return regressions
+
+
+def print_report(results):
+    for rows, dataset in results.items():
+        print(f"\n== {rows} rows (import {dataset['import_seconds']:.1f} s, layout {dataset['layout_bytes'] / 1024:.0f} KB)")
+        print(f"{'callback':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'mean KB':>10}{'peak MB':>10}")
+        for name, m in dataset["callbacks"].items():
+            print(f"{name:<22}{m['p50_ms']:>10.1f}{m['p90_ms']:>10.1f}{m['p99_ms']:>10.1f}"
+                  f"{m['mean_bytes'] / 1024:>10.1f}{m['peak_memory_kb'] / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[30_000, 300_000, 3_000_000])
+    parser.add_argument("--repeat", type=int, default=5, help="timed replays of each scenario")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic datasets")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with this baseline JSON")
+    parser.add_argument("--save-baseline", help="store the results as a new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, "w") as f:
+            json.dump(run_worker(args.repeat), f)
+        return 0
+
+    results = {str(n): run_dataset(n, args.repeat, args.seed) for n in args.rows}
+    print_report(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regression against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
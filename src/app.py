@@ -1,6 +1,6 @@
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output, State
+from dash import dcc, html, no_update
+from dash.dependencies import Input, Output
 import os
 import sys
 
@@ -19,6 +19,20 @@ from . import q5
 from . import q11
 from . import q14
 from . import q13
+from . import compression
+from . import metrics
+from . import static_assets
+from . import warmup
+
+# Compress the responses (registered first so that its after_request hook
+# runs last, once the metrics have seen the uncompressed size).
+compression.init_app(app)
+
+# Long-lived caching of the versioned files of src/assets.
+static_assets.init_app(app)
+
+# Instrument every callback registered below and serve them on /metrics.
+metrics.init_app(app)
 
 # Register callbacks for the sections.
 caracteristiques_audio.register_callbacks(app)
@@ -29,40 +43,52 @@ q5.register_callbacks(app)
 q14.register_callbacks(app)
 q13.register_callbacks(app)
 
+# Liveness and readiness probes; the caches are warmed by src/warmup.py.
+warmup.init_app(app)
+
+# Spotify icon of the navbar links: a local SVG used as a CSS mask, so it
+# takes the color of the link (see .nav-icon in style.css).
+NAV_ICON_MASK = f"url({static_assets.asset_url('icons/spotify_glyph.svg')})"
+
+
+def nav_icon():
+    return html.Span(className="nav-icon", style={'maskImage': NAV_ICON_MASK, 'WebkitMaskImage': NAV_ICON_MASK})
+
+
 # Top navigation bar with anchor links for scrolling.
 navbar = html.Div(
     [
-        html.Img(src="/assets/spotify_icon.svg", style={'height': '40px', 'marginRight': '10px'}),
+        html.Img(src=static_assets.asset_url("spotify_icon.svg"), style={'height': '40px', 'marginRight': '10px'}),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Définitions"],
+            [nav_icon(), "Définitions"],
             href="#def-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Caractéristiques"],
+            [nav_icon(), "Caractéristiques"],
             href="#q1-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Corrélation"],
+            [nav_icon(), "Corrélation"],
             href="#q2-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Évolutions"],
+            [nav_icon(), "Évolutions"],
             href="#q5-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Popularité vs Durée"],
+            [nav_icon(), "Popularité vs Durée"],
             href="#q4-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Discographie"],
+            [nav_icon(), "Discographie"],
             href="#q11-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Adaptation"],
+            [nav_icon(), "Adaptation"],
             href="#q14-section"
         ),
         html.A(
-            [html.I(className="fa-brands fa-spotify", style={'marginRight': '8px'}), "Longévité"],
+            [nav_icon(), "Longévité"],
             href="#q13-section"
         )
     ],
@@ -192,6 +218,52 @@ narrative_q11 = html.Div(
 )
 
 
+# Sections mounted on demand: the page only carries a light placeholder per
+# section, and assets/lazy_sections.js asks for the content (figures included)
+# when the placeholder approaches the viewport.
+lazy_sections = {
+    "q1-section": q1,
+    "q2-section": q2,
+    "q5-section": q5,
+    "q4-section": q4,
+    "q11-section": q11,
+    "q14-section": q14,
+    "q13-section": q13,
+}
+
+
+def lazy_section(section_id):
+    return html.Div(
+        [
+            dcc.Store(id=f"{section_id}-visible", data=False),
+            dcc.Loading(
+                html.Div(id=f"{section_id}-content", className="lazy-section-content"),
+                color="#1DB954"
+            ),
+        ],
+        id=section_id,
+        className="lazy-section",
+        style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
+    )
+
+
+def register_lazy_section(section_id, module):
+    @app.callback(
+        Output(f"{section_id}-content", "children"),
+        Input(f"{section_id}-visible", "data"),
+        prevent_initial_call=True
+    )
+    def load_section(visible):
+        if not visible:
+            return no_update
+        # Modules with figures built on demand expose their layout as a function.
+        return module.layout() if callable(module.layout) else module.layout
+
+
+for section_id, module in lazy_sections.items():
+    register_lazy_section(section_id, module)
+
+
 # Main content area that includes all sections.
 content = html.Div(
     [
@@ -204,56 +276,28 @@ content = html.Div(
         ),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
         narrative_q1,
-        html.Div(
-            q1.layout,
-            id="q1-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q1-section"),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
         narrative_q2,
         # Q2 Section with an id for anchor scrolling.
-        html.Div(
-            q2.layout,
-            id="q2-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q2-section"),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
         # Q5 Section with an id for anchor scrolling
         narrative_q5,
-        html.Div(
-            q5.layout,
-            id="q5-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q5-section"),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
         # Q4 Section with an id for anchor scrolling
         narrative_q4,
-        html.Div(
-            q4.layout,
-            id="q4-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q4-section"),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
         # Q11 Section with an id for anchor scrolling.
         narrative_q11,
-        html.Div(
-            q11.layout,
-            id="q11-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q11-section"),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
         # Q14 Section with an id for anchor scrolling.
-        html.Div(
-            q14.layout,
-            id="q14-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q14-section"),
         html.Hr(style={"border-color": "#1DB954", "marginLeft": "5%", "marginRight": "5%", "marginTop": "30px"}),
-        html.Div(
-            q13.layout,
-            id="q13-section",
-            style={"padding-top": "60px", "margin-top": "-60px", 'marginLeft': '5%', 'marginRight': '5%'}
-        ),
+        lazy_section("q13-section"),
         html.H3(
             """
             C’est ici que s’achève notre exploration de l’univers musical à travers les données de Spotify.
@@ -274,21 +318,10 @@ content = html.Div(
     className="content"
 )
 
-# # An Interval component that fires every 1000ms (adjust as needed).
-# interval = dcc.Interval(id="scroll-interval", interval=1000, n_intervals=0)
-
-# # A hidden Store to keep track of the current section.
-# current_section_store = dcc.Store(id="current-section", data="")
-
-# # A Store to keep track of the mascot's visibility (True = visible).
-# mascot_state = dcc.Store(id="mascot-state", data=True)
-
-# Overall app layout (added Interval, Stores, and the toggle button).
+# Overall app layout. The section currently in view is tracked client-side by
+# assets/section_tracker.js, which also updates the mascot's speech bubble.
 app.layout = html.Div([
     dcc.Location(id="url"),
-    # interval,
-    # current_section_store,
-    # mascot_state,
     navbar,
     content,
     # mascot,              # Mascot image.
@@ -297,116 +330,5 @@ app.layout = html.Div([
 ])
 
 
-# -----------------------------------------------------------------------------
-# Callback 1: Toggle the mascot's visibility using clicks from either the mascot or toggle button.
-# -----------------------------------------------------------------------------
-@app.callback(
-    Output('mascot-state', 'data'),
-    [Input('mascot', 'n_clicks'),
-     Input('mascot-toggle-btn', 'n_clicks')],
-    State('mascot-state', 'data')
-)
-def toggle_mascot_state(mascot_clicks, toggle_btn_clicks, current_state):
-    # Determine which input triggered the callback.
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return current_state
-    # Toggle the state when either element is clicked.
-    return not current_state
-
-
-# -----------------------------------------------------------------------------
-# Callback 2: Update the styles of the mascot and the toggle button based on visibility.
-# -----------------------------------------------------------------------------
-@app.callback(
-    [Output('mascot', 'style'),
-     Output('mascot-toggle-btn', 'style')],
-    Input('mascot-state', 'data')
-)
-def update_mascot_styles(is_visible):
-    base_mascot_style = {
-        'position': 'fixed',
-        'bottom': '20px',
-        'left': '0px',
-        'zIndex': '1001'
-    }
-    base_toggle_style = {
-        'position': 'fixed',
-        'bottom': '20px',
-        'left': '0px',
-        'zIndex': '1002',
-        'backgroundColor': '#1DB954',
-        'border': 'none',
-        'color': 'white',
-        'padding': '10px',
-        'borderRadius': '5px'
-    }
-    if is_visible:
-        base_mascot_style['display'] = 'block'
-        base_toggle_style['display'] = 'none'
-    else:
-        base_mascot_style['display'] = 'none'
-        base_toggle_style['display'] = 'block'
-    return base_mascot_style, base_toggle_style
-
-
-# -----------------------------------------------------------------------------
-# Clientside callback: Detect the section currently in view.
-# It measures the distance between each section's top and the vertical midpoint of the window.
-# -----------------------------------------------------------------------------
-app.clientside_callback(
-    """
-    function(n_intervals) {
-        var sections = ['q1-section', 'q2-section', 'q8-section', 'q11-section'];
-        var current = "";
-        var minDistance = Infinity;
-        var target = window.innerHeight / 2;  // Middle of the viewport.
-        for (var i = 0; i < sections.length; i++){
-            var el = document.getElementById(sections[i]);
-            if (el){
-                var rect = el.getBoundingClientRect();
-                var distance = Math.abs(rect.top - target);
-                if (distance < minDistance){
-                    minDistance = distance;
-                    current = sections[i];
-                }
-            }
-        }
-        return current;
-    }
-    """,
-    Output('current-section', 'data'),
-    Input('scroll-interval', 'n_intervals')
-)
-
-
-# -----------------------------------------------------------------------------
-# Callback 3: Update the speech bubble text based on the current section.
-# -----------------------------------------------------------------------------
-@app.callback(
-    Output('mascot-speech', 'children'),
-    Input('current-section', 'data')
-)
-def update_speech(current):
-    if current == "def-section":
-        return "Définissions les termes"
-    elif current == "q1-section":
-        return "Comment évoluent les caractéristiques audio, et quel impact sur la popularité ?"
-    elif current == "q2-section":
-        return "Quelles corrélations entre les caractéristiques audio ?"
-    elif current == "q5-section":
-        return "Comment évoluent les caractéristiques audio selon le genre ?"
-    elif current == "q4-section":
-        return "La durée d’un morceau a-t-elle un impact sur le succès de celle-ci ?"
-    elif current == "q11-section":
-        return "Les artistes diversifiés sont-ils plus populaires ?"
-    elif current == "q14-section":
-        return "Les artistes à grande discographie s'adaptent-ils aux sous-genres populaires ?"
-    elif current == "q13-section":
-        return "Et les artistes s'adaptent-ils aux caractéristiques audio populaires ?"
-    else:
-        return "Welcome to Spotify Songs Analysis!"
-
-
 # if __name__ == '__main__':
 #     app.run_server(debug=True)
@@ -0,0 +1,78 @@
+"""
+Dictionnaire des artistes : identifiants entiers denses au lieu des noms.
+
+Les sections regroupent et filtrent souvent par artiste ; sur les noms,
+chaque opération hache ou compare des chaînes à chaque ligne. Les noms sont
+ici numérotés une fois (dans l'ordre des codes track_artist de la matrice,
+voir ``dataset.load_artists``) : une agrégation par artiste devient un
+``np.bincount`` sur les identifiants, et un artiste se retrouve par
+arithmétique sur son identifiant plutôt que par comparaison de chaînes.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class ArtistIndex:
+    """Noms des artistes et leurs identifiants (0 à len - 1) ; -1 pour un artiste manquant."""
+
+    def __init__(self, names):
+        self.names = np.asarray(names, dtype=object)
+        self.index = pd.Index(self.names)
+        # Les artistes ajoutés après le chargement reçoivent les identifiants suivants
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, names, add=False):
+        """
+        Identifiants des artistes names
+
+        Args
+        ----
+        names : array-like
+            Noms des artistes
+        add : bool
+            Numéroter les artistes inconnus ; sinon leur identifiant est -1
+
+        Returns
+        -------
+        np.ndarray of int64
+        """
+        names = pd.Index(np.asarray(names, dtype=object))
+        ids = self.index.get_indexer(names).astype(np.int64)
+        unknown = (ids < 0) & ~names.isna()
+        if add and unknown.any():
+            with self.lock:
+                new = names[unknown].unique().difference(self.index)
+                self.names = np.append(self.names, new.to_numpy(dtype=object))
+                self.index = pd.Index(self.names)
+            ids[unknown] = self.index.get_indexer(names[unknown])
+        return ids
+
+    def code(self, name):
+        """Identifiant d'un artiste, -1 s'il est inconnu."""
+        return int(self.lookup([name])[0])
+
+    def bincount(self, ids, weights=None):
+        """
+        Somme de weights (ou nombre de lignes) par artiste
+
+        Args
+        ----
+        ids : np.ndarray
+            Identifiant de l'artiste de chaque ligne (-1 ignoré)
+        weights : np.ndarray, optional
+            Valeur de chaque ligne
+
+        Returns
+        -------
+        np.ndarray
+            Une valeur par identifiant
+        """
+        known = ids >= 0
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)[known]
+        return np.bincount(ids[known], weights=weights, minlength=len(self))
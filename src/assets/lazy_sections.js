@@ -0,0 +1,26 @@
+// Mount the heavy story sections only when they get close to the viewport.
+// Each placeholder (.lazy-section) holds a "<section id>-visible" store that
+// app.py listens to in order to send the section's content.
+(function () {
+    const observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (!entry.isIntersecting || !window.dash_clientside) return;
+            observer.unobserve(entry.target);
+            window.dash_clientside.set_props(entry.target.id + "-visible", {data: true});
+        });
+    }, {rootMargin: "600px 0px"});
+
+    const observed = new WeakSet();
+
+    // Dash renders the layout after this script runs, so watch for the placeholders.
+    function observeSections() {
+        document.querySelectorAll(".lazy-section").forEach(function (section) {
+            if (observed.has(section)) return;
+            observed.add(section);
+            observer.observe(section);
+        });
+    }
+
+    new MutationObserver(observeSections).observe(document.body, {childList: true, subtree: true});
+    observeSections();
+})();
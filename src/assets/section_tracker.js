@@ -0,0 +1,51 @@
+// Track the story section currently in view without polling: an
+// IntersectionObserver watching a thin band at the middle of the viewport only
+// fires when a section enters or leaves it. On each transition the matching
+// navbar link is highlighted and the mascot's speech bubble (when present) is
+// updated.
+(function () {
+    const speech = {
+        "def-section": "Définissions les termes",
+        "q1-section": "Comment évoluent les caractéristiques audio, et quel impact sur la popularité ?",
+        "q2-section": "Quelles corrélations entre les caractéristiques audio ?",
+        "q5-section": "Comment évoluent les caractéristiques audio selon le genre ?",
+        "q4-section": "La durée d’un morceau a-t-elle un impact sur le succès de celle-ci ?",
+        "q11-section": "Les artistes diversifiés sont-ils plus populaires ?",
+        "q14-section": "Les artistes à grande discographie s'adaptent-ils aux sous-genres populaires ?",
+        "q13-section": "Et les artistes s'adaptent-ils aux caractéristiques audio populaires ?"
+    };
+    const defaultSpeech = "Welcome to Spotify Songs Analysis!";
+    let current = null;
+
+    function setCurrent(sectionId) {
+        if (sectionId === current) return;
+        current = sectionId;
+
+        document.querySelectorAll(".navbar a").forEach(function (link) {
+            link.classList.toggle("active", link.getAttribute("href") === "#" + sectionId);
+        });
+        const bubble = document.getElementById("mascot-speech");
+        if (bubble) bubble.textContent = speech[sectionId] || defaultSpeech;
+    }
+
+    const observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) setCurrent(entry.target.id);
+        });
+    }, {rootMargin: "-50% 0px -50% 0px"});
+
+    const observed = new WeakSet();
+
+    // Dash renders the layout after this script runs, so watch for the sections.
+    function observeSections() {
+        Object.keys(speech).forEach(function (sectionId) {
+            const section = document.getElementById(sectionId);
+            if (!section || observed.has(section)) return;
+            observed.add(section);
+            observer.observe(section);
+        });
+    }
+
+    new MutationObserver(observeSections).observe(document.body, {childList: true, subtree: true});
+    observeSections();
+})();
@@ -1,4 +1,10 @@
 from dash import Dash, html, dcc, Input, Output, ALL
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from . import dataset
+from .static_assets import asset_url
 
 # Exemple de dictionnaire d'explication
 explanations = {
@@ -61,12 +67,120 @@ explanations = {
 }
 
 
+# Nombre de barres des histogrammes et percentile des exemples tirés du dataset
+HISTOGRAM_BINS = 30
+EXAMPLE_PERCENTILE = 1
+
+
+def get_feature_profiles(features):
+    """
+    Calcule en une passe vectorisée, pour toutes les caractéristiques, l'histogramme
+    de leur distribution et un morceau représentatif de chaque extrême : celui situé
+    au percentile EXAMPLE_PERCENTILE (faible) et 100 - EXAMPLE_PERCENTILE (fort),
+    trouvé par sélection partielle (argpartition) plutôt que par un tri complet.
+
+    Le jeu de données est lu par morceaux depuis sa source (CSV, store ou base
+    SQLite, voir dataset.iter_chunks).
+
+    Args
+    ----
+    features : list
+        Caractéristiques à décrire
+
+    Returns
+    -------
+    dict
+        {caractéristique: {'edges', 'counts', 'low', 'high'}} où 'low' et 'high'
+        sont des tuples (nom du morceau, valeur)
+    """
+    chunks = dataset.iter_chunks(["track_name", "track_artist"] + features)
+    data = pd.concat(chunk.dropna() for chunk in chunks)
+    values = data[features].to_numpy(dtype=float)
+    n_rows, n_features = values.shape
+
+    # Histogrammes de toutes les caractéristiques avec un seul bincount
+    lows, highs = values.min(axis=0), values.max(axis=0)
+    spans = np.where(highs > lows, highs - lows, 1.0)
+    bin_idx = np.clip(((values - lows) / spans * HISTOGRAM_BINS).astype(int), 0, HISTOGRAM_BINS - 1)
+    counts = np.bincount(
+        (bin_idx + np.arange(n_features) * HISTOGRAM_BINS).ravel(),
+        minlength=n_features * HISTOGRAM_BINS
+    ).reshape(n_features, HISTOGRAM_BINS)
+
+    # Morceaux aux percentiles extrêmes, toutes colonnes en même temps
+    k_low = n_rows * EXAMPLE_PERCENTILE // 100
+    k_high = n_rows - 1 - k_low
+    partitioned = np.argpartition(values, [k_low, k_high], axis=0)
+    names = (data["track_name"].astype(str) + " - " + data["track_artist"].astype(str)).to_numpy()
+
+    profiles = {}
+    for j, feature in enumerate(features):
+        low_row, high_row = partitioned[k_low, j], partitioned[k_high, j]
+        profiles[feature] = {
+            'edges': np.linspace(lows[j], lows[j] + spans[j], HISTOGRAM_BINS + 1),
+            'counts': counts[j],
+            'low': (names[low_row], values[low_row, j]),
+            'high': (names[high_row], values[high_row, j]),
+        }
+    return profiles
+
+feature_profiles = get_feature_profiles(list(explanations))
+
+
+@dataset.on_reload
+def reload_data():
+    """
+    Profils recalculés sur la nouvelle version du jeu de données.
+
+    Returns
+    -------
+    function
+        La fonction qui les met en place
+    """
+    profiles = get_feature_profiles(list(explanations))
+
+    def swap():
+        global feature_profiles
+        feature_profiles = profiles
+    return swap
+
+
+def get_sparkline(selected_key):
+    """Histogramme miniature de la distribution, avec la position des deux exemples."""
+    profile = feature_profiles[selected_key]
+    edges = profile['edges']
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=profile['counts'],
+        marker=dict(color='#1DB954', line=dict(width=0)),
+    ))
+    if selected_key != 'duration_ms':
+        for _, value in (profile['low'], profile['high']):
+            fig.add_vline(x=value, line=dict(color='white', dash='dot', width=1))
+    fig.update_layout(
+        height=70,
+        margin=dict(t=0, b=20, l=0, r=0),
+        bargap=0,
+        template='none',  # pas besoin du thème complet pour une miniature
+        xaxis=dict(showgrid=False, tickfont=dict(color='white', size=10)),
+        yaxis=dict(visible=False),
+        plot_bgcolor='#1e1e1e',
+        paper_bgcolor='#1e1e1e',
+    )
+    return fig
+
+
 def get_feature_block(selected_key):
     feature_data = explanations[selected_key]
     explanation_block = [
         html.Div([
             html.P(html.B(selected_key.capitalize() + " :"), style={'marginBottom': '10px'}),
-            html.P(feature_data['description'])
+            html.P(feature_data['description']),
+            dcc.Graph(
+                figure=get_sparkline(selected_key),
+                config={'staticPlot': True},
+                style={'height': '70px'}
+            )
         ], style={'flex': '2'})
     ]
 
@@ -75,14 +189,18 @@ def get_feature_block(selected_key):
             html.Div([
                 html.P(html.B(f"Faible {selected_key} :"), style={'color': '#1DB954'}),
                 html.P(feature_data['low_example_name']),
+                html.P(
+                    f"Dans les données : {feature_profiles[selected_key]['low'][0]}",
+                    style={'color': '#b3b3b3', 'fontSize': '12px'}
+                ),
                 html.Img(
-                    src="/assets/icons/play_icon.png",
+                    src=asset_url("icons/play_icon.png"),
                     id={'type': 'audio-icon', 'index': f"{selected_key}-low"},
                     style={'width': '30px', 'cursor': 'pointer'}
                 ),
                 html.Audio(
                     id=f"{selected_key}-low-audio",
-                    src=f"/assets/audio/{selected_key}_low.mp3",
+                    src=asset_url(f"audio/{selected_key}_low.mp3"),
                     controls=False,
                     preload="none",
                     loop = True,
@@ -93,14 +211,18 @@ def get_feature_block(selected_key):
             html.Div([
                 html.P(html.B(f"Fort·e {selected_key} :"), style={'color': '#1DB954'}),
                 html.P(feature_data['high_example_name']),
+                html.P(
+                    f"Dans les données : {feature_profiles[selected_key]['high'][0]}",
+                    style={'color': '#b3b3b3', 'fontSize': '12px'}
+                ),
                 html.Img(
-                    src="/assets/icons/play_icon.png",
+                    src=asset_url("icons/play_icon.png"),
                     id={'type': 'audio-icon', 'index': f"{selected_key}-high"},
                     style={'width': '30px', 'cursor': 'pointer'}
                 ),
                 html.Audio(
                     id=f"{selected_key}-high-audio",
-                    src=f"/assets/audio/{selected_key}_high.mp3",
+                    src=asset_url(f"audio/{selected_key}_high.mp3"),
                     controls=False,
                     preload="none",
                     loop = True,
@@ -120,93 +242,73 @@ layout = html.Div([
                 feature.capitalize(),
                 id={'type': 'feature-tab', 'index': feature},
                 n_clicks_timestamp=1 if feature == 'acousticness' else 0,
-                className='custom-button',
-                style={
-                    'marginRight': '4px',
-                    'padding': '2px 5px',
-                    'border': 'none',
-                    'backgroundColor': '#1DB954' if feature == 'acousticness' else '#1e1e1e',
-                    'color': '#1e1e1e' if feature == 'acousticness' else '#1DB954',
-                    'cursor': 'pointer',
-                    'borderRadius': '3px',
-                    'fontWeight': 'bold',
-                    'transition': 'all 0.3s ease-in-out',
-                    'whiteSpace': 'nowrap',
-                    'flexShrink': 1,
-                }
+                className='feature-tab active' if feature == 'acousticness' else 'feature-tab'
             )
             for feature in explanations
         ],
         style={'marginBottom': '20px', 'display': 'flex', 'flexWrap': 'nowrap', 'justifyContent': 'center', 'gap': '3px'}
     ),
 
+    # Tous les blocs d'explication sont rendus d'avance, seul le bloc actif est affiché (voir style.css)
     html.Div(
         id='feature-explanation',
-        children=get_feature_block('danceability'),
+        children=[
+            html.Div(
+                get_feature_block(feature),
+                id={'type': 'feature-block', 'index': feature},
+                className='feature-block active' if feature == 'acousticness' else 'feature-block'
+            )
+            for feature in explanations
+        ],
         style={
             'backgroundColor': '#1e1e1e',
             'padding': '15px',
             'borderRadius': '8px',
             'color': 'white',
             'fontSize': '14px',
-            'lineHeight': '1.4',
-            'display': 'flex',
-            'justifyContent': 'space-between',
-            'gap': '40px'
+            'lineHeight': '1.4'
         }
     ),
 
     dcc.Store(id="dummy-store-audio")
 ], style={'padding': '30px', 'backgroundColor': '#1e1e1e'})
 
+# Les icônes sont aussi changées côté client : PLAY_ICON et STOP_ICON dans le
+# code JS sont remplacés par leurs URL versionnées
+def with_icon_urls(js):
+    return (js.replace("PLAY_ICON", f'"{asset_url("icons/play_icon.png")}"')
+              .replace("STOP_ICON", f'"{asset_url("icons/stop_icon.png")}"'))
+
 def register_callbacks(app):
-    @app.callback(
-        Output('feature-explanation', 'children'),
-        Output({'type': 'feature-tab', 'index': ALL}, 'style'),
-        Input({'type': 'feature-tab', 'index': ALL}, 'n_clicks_timestamp')
-    )
+    # Changement d'onglet entièrement côté client : on déplace la classe "active"
+    # et on coupe les extraits audio du bloc qui disparaît
+    app.clientside_callback(
+        with_icon_urls("""
+        function(timestamps) {
+            let selected = 0;
+            timestamps.forEach((ts, i) => {
+                if ((ts || 0) > (timestamps[selected] || 0)) selected = i;
+            });
 
-    def update_feature(n_clicks_timestamps):
-        if not n_clicks_timestamps or all(ts == 0 for ts in n_clicks_timestamps):
-            selected_key = 'danceability'
-        else:
-            selected_idx = n_clicks_timestamps.index(max(n_clicks_timestamps))
-            selected_key = list(explanations.keys())[selected_idx]
-
-        explanation_block = get_feature_block(selected_key)
-
-        styles = []
-        for i, key in enumerate(explanations.keys()):
-            if key == selected_key:
-                styles.append({
-                    'marginRight': '10px',
-                    'padding': '6px 10px',
-                    'border': 'none',
-                    'backgroundColor': '#1DB954',
-                    'color': '#1e1e1e',
-                    'cursor': 'pointer',
-                    'borderRadius': '5px',
-                    'fontWeight': 'bold',
-                    'transition': 'all 0.3s ease-in-out'
-                })
-            else:
-                styles.append({
-                    'marginRight': '10px',
-                    'padding': '6px 10px',
-                    'border': 'none',
-                    'backgroundColor': '#1e1e1e',
-                    'color': '#1DB954',
-                    'cursor': 'pointer',
-                    'borderRadius': '5px',
-                    'fontWeight': 'bold',
-                    'transition': 'all 0.3s ease-in-out'
-                })
-
-        return explanation_block, styles
+            document.querySelectorAll("audio").forEach(a => a.pause());
+            document.querySelectorAll("img[id*='audio-icon']").forEach(img => {
+                img.src = PLAY_ICON;
+            });
 
+            return [
+                timestamps.map((_, i) => i === selected ? "feature-tab active" : "feature-tab"),
+                timestamps.map((_, i) => i === selected ? "feature-block active" : "feature-block")
+            ];
+        }
+        """),
+        Output({'type': 'feature-tab', 'index': ALL}, 'className'),
+        Output({'type': 'feature-block', 'index': ALL}, 'className'),
+        Input({'type': 'feature-tab', 'index': ALL}, 'n_clicks_timestamp'),
+        prevent_initial_call=True
+    )
 
     app.clientside_callback(
-        """
+        with_icon_urls("""
         function(n1) {
             const ctx = dash_clientside.callback_context;
             if (!ctx.triggered.length) return "";
@@ -227,20 +329,20 @@ def register_callbacks(app):
                 if (a.id !== audioId) a.pause();
             });
             document.querySelectorAll("img[id*='audio-icon']").forEach(img => {
-                img.src = "/assets/icons/play_icon.png";
+                img.src = PLAY_ICON;
             });
 
             if (audioEl.paused) {
                 audioEl.play();
-                iconEl.src = "/assets/icons/stop_icon.png";
+                iconEl.src = STOP_ICON;
             } else {
                 audioEl.pause();
-                iconEl.src = "/assets/icons/play_icon.png";
+                iconEl.src = PLAY_ICON;
             }
 
             return "";
         }
-        """,
+        """),
         Output("dummy-store-audio", "data"),
         Input({'type': 'audio-icon', 'index': ALL}, 'n_clicks'),
         prevent_initial_call=True
@@ -0,0 +1,237 @@
+"""
+Stockage en colonnes du jeu de données sur disque, pour les catalogues plus
+grands que la mémoire.
+
+Chaque colonne est un fichier ``.npy`` lu par projection en mémoire
+(``mmap_mode="r"``) : seules les pages lues sont chargées, et le cache de
+pages du système est partagé entre les workers. Les colonnes texte sont
+encodées par dictionnaire : le fichier contient des codes entiers (-1 pour
+une valeur manquante) et ``<colonne>.json`` la liste triée des valeurs.
+``manifest.json`` décrit les colonnes ; il est écrit en dernier, un dossier
+sans manifeste est donc un store incomplet.
+
+Une chanson apparaît une fois par playlist qui la contient : ses colonnes
+propres (TRACK_COLUMNS) sont gardées une seule fois, dans la table des
+chansons, à l'indice de son code track_id. La table des appartenances garde
+une ligne par playlist : code de la chanson, playlist, genre et sous-genre.
+
+Construction, depuis la racine du dépôt::
+
+    python -m src.column_store dataset/spotify_songs_clean.csv dataset/store
+
+puis ``SPOTIFY_STORE=dataset/store`` pour que les sections le lisent (voir
+``src/dataset.py``).
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from .feature_matrix import FEATURES
+
+ENCODED = [
+    "track_id", "track_name", "track_artist", "track_album_release_date",
+    "playlist_id", "playlist_genre", "playlist_subgenre",
+]
+# Colonnes de la table des chansons (une ligne par chanson, dans l'ordre des codes track_id)
+TRACK_COLUMNS = FEATURES + ["track_name", "track_artist", "track_album_release_date", "year"]
+MANIFEST = "manifest.json"
+
+
+def code_dtype(size):
+    """Plus petit type entier signé pour des codes de 0 à size - 1 (et -1)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if size <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def build(csv_path, store_path, chunk_rows=1_000_000):
+    """
+    Construit le store à partir du CSV, en deux passes par morceaux : la
+    première compte les lignes et collecte les dictionnaires, la seconde
+    écrit les colonnes. Les colonnes d'une chanson sont prises à sa première
+    ligne.
+
+    Args
+    ----
+    csv_path : str
+        Chemin du fichier CSV
+    store_path : str
+        Dossier du store (créé au besoin)
+    chunk_rows : int
+        Nombre de lignes lues à la fois
+    """
+    usecols = FEATURES + ENCODED
+
+    def read_chunks():
+        # Le texte reste du texte, même dans un morceau où il ressemble à des nombres
+        return pd.read_csv(csv_path, usecols=usecols, dtype={name: str for name in ENCODED}, chunksize=chunk_rows)
+
+    rows = 0
+    values = {name: set() for name in ENCODED}
+    for chunk in read_chunks():
+        rows += len(chunk)
+        for name in ENCODED:
+            values[name].update(chunk[name].dropna().unique())
+    dictionaries = {name: sorted(values[name]) for name in ENCODED}
+    del values
+
+    # Année de sortie dérivée des dates distinctes ; l'indice -1 (date manquante) donne -1
+    dates = pd.to_datetime(pd.Series(dictionaries["track_album_release_date"], dtype=object), errors="coerce")
+    year_by_code = np.append(dates.dt.year.fillna(-1).to_numpy(dtype=np.int16), np.int16(-1))
+
+    os.makedirs(store_path, exist_ok=True)
+    tracks = len(dictionaries["track_id"])
+    dtypes = {name: np.dtype(np.float64) for name in FEATURES}
+    dtypes.update({name: code_dtype(len(dictionaries[name])) for name in ENCODED})
+    dtypes["year"] = np.dtype(np.int16)
+    columns = {
+        name: open_memmap(
+            os.path.join(store_path, f"{name}.npy"), mode="w+", dtype=dtype,
+            shape=(tracks if name in TRACK_COLUMNS else rows,),
+        )
+        for name, dtype in dtypes.items()
+    }
+
+    written = np.zeros(tracks, dtype=bool)
+    start = 0
+    for chunk in read_chunks():
+        end = start + len(chunk)
+        codes = {name: pd.Categorical(chunk[name], categories=dictionaries[name]).codes for name in ENCODED}
+        for name in ENCODED:
+            if name not in TRACK_COLUMNS:
+                columns[name][start:end] = codes[name]
+        # Première ligne de chaque chanson pas encore écrite
+        track, first = np.unique(codes["track_id"], return_index=True)
+        new = track >= 0
+        new[new] = ~written[track[new]]
+        track, first = track[new], first[new]
+        written[track] = True
+        for name in FEATURES:
+            columns[name][track] = chunk[name].to_numpy(dtype=np.float64)[first]
+        for name in ENCODED:
+            if name in TRACK_COLUMNS:
+                columns[name][track] = codes[name][first]
+        columns["year"][track] = year_by_code[codes["track_album_release_date"][first]]
+        start = end
+    for column in columns.values():
+        column.flush()
+
+    for name, dictionary in dictionaries.items():
+        with open(os.path.join(store_path, f"{name}.json"), "w") as f:
+            json.dump(dictionary, f)
+    stat = os.stat(csv_path)
+    manifest = {
+        "rows": rows,
+        "tracks": tracks,
+        "source": {"path": os.path.abspath(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        "columns": {
+            name: {
+                "file": f"{name}.npy", "dtype": dtype.str, "table": "tracks" if name in TRACK_COLUMNS else "rows",
+                **({"dictionary": f"{name}.json"} if name in dictionaries else {}),
+            }
+            for name, dtype in dtypes.items()
+        },
+    }
+    with open(os.path.join(store_path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class ColumnStore:
+    """Colonnes d'un store, projetées en mémoire à la demande."""
+
+    def __init__(self, path):
+        # Chemin réel : un lien symbolique repointé vers un autre store ne change pas celui-ci
+        self.path = os.path.realpath(path)
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.rows = self.manifest["rows"]
+        self.tracks = self.manifest["tracks"]
+        self.dictionaries = {}
+        self.dtypes = {}
+
+    def spec(self, name):
+        try:
+            return self.manifest["columns"][name]
+        except KeyError:
+            raise KeyError(f"Column {name} is not in the store {self.path}") from None
+
+    def column(self, name):
+        """
+        Colonne name (codes entiers pour une colonne encodée), en lecture
+        seule : une valeur par chanson pour une colonne de TRACK_COLUMNS, par
+        appartenance à une playlist sinon.
+        """
+        return np.load(os.path.join(self.path, self.spec(name)["file"]), mmap_mode="r")
+
+    def dictionary(self, name):
+        """Valeurs triées d'une colonne encodée, ou None pour une colonne numérique."""
+        spec = self.spec(name)
+        if "dictionary" not in spec:
+            return None
+        if name not in self.dictionaries:
+            with open(os.path.join(self.path, spec["dictionary"])) as f:
+                self.dictionaries[name] = json.load(f)
+        return self.dictionaries[name]
+
+    def categorical_dtype(self, name):
+        if name not in self.dtypes:
+            self.dtypes[name] = pd.CategoricalDtype(self.dictionary(name))
+        return self.dtypes[name]
+
+    def iter_chunks(self, columns, chunk_rows):
+        """
+        Parcourt les colonnes demandées par morceaux de chunk_rows lignes
+
+        Args
+        ----
+        columns : list
+            Noms des colonnes
+        chunk_rows : int
+            Nombre de lignes par morceau
+
+        Returns
+        -------
+        generator of pd.DataFrame
+            Une ligne par appartenance à une playlist, comme dans le CSV. Les
+            colonnes encodées sont des Categorical qui partagent le dictionnaire du store
+        """
+        arrays = {name: self.column(name) for name in columns}
+        track_index = self.column("track_id")
+        for start in range(0, self.rows, chunk_rows):
+            track = np.array(track_index[start:start + chunk_rows])
+            chunk = {}
+            for name, array in arrays.items():
+                if name in TRACK_COLUMNS:
+                    values = take(array, track)
+                else:
+                    values = np.array(array[start:start + chunk_rows])
+                if self.dictionary(name) is not None:
+                    values = pd.Categorical.from_codes(values, dtype=self.categorical_dtype(name))
+                chunk[name] = values
+            # Numéros de ligne continus d'un morceau à l'autre, comme pd.read_csv(chunksize=...)
+            yield pd.DataFrame(chunk, index=pd.RangeIndex(start, start + len(values)))
+
+
+def take(array, track):
+    """Valeurs de la table des chansons aux indices track ; manquantes (NaN ou -1) pour l'indice -1."""
+    values = np.asarray(array[np.maximum(track, 0)])
+    values[track < 0] = np.nan if values.dtype.kind == "f" else -1
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit le store en colonnes d'un fichier CSV.")
+    parser.add_argument("csv", help="fichier CSV du jeu de données")
+    parser.add_argument("store", help="dossier du store")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="lignes lues à la fois")
+    args = parser.parse_args()
+    build(args.csv, args.store, args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Brotli/gzip compression of the responses of ``app.server``.
+
+Built on Flask-Compress and its ``COMPRESS_*`` settings, with three changes
+for Dash: the encoding is negotiated per request from the q-values of
+``Accept-Encoding`` (Brotli when the client accepts it at least as much as
+gzip), Brotli uses a fast quality level suited to dynamic responses, and
+compressed bodies are cached by content. The layout, the static figures and
+the JS bundles are byte-identical for every visitor, so they are only
+compressed once per worker. A compressed response with an ``ETag`` gets the
+encoding appended to it, so each variant is validated separately.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import brotli
+import flask
+from flask_compress import Compress
+
+MIMETYPES = [
+    "text/html", "text/css", "text/plain", "text/javascript", "application/javascript",
+    "application/json", "image/svg+xml",
+]
+
+
+class CompressedCache:
+    """
+    LRU cache of compressed bodies, keyed by path, encoding and a hash of the
+    uncompressed body, and bounded by the total size of the entries.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class NegotiatedCompress(Compress):
+    """Flask-Compress, choosing between Brotli and gzip for each request."""
+
+    def init_app(self, app):
+        super().init_app(app)
+        self.cache = CompressedCache(app.config["COMPRESS_CACHE_MAX_BYTES"])
+
+    def after_request(self, response):
+        app = self.app or flask.current_app
+        # Highest q-value wins, Brotli on a tie; "br;q=0" refuses Brotli
+        algorithm = flask.request.accept_encodings.best_match(["br", "gzip"])
+
+        if (algorithm is None
+                or response.mimetype not in app.config["COMPRESS_MIMETYPES"]
+                or not 200 <= response.status_code < 300 or response.status_code == 206
+                or "Content-Encoding" in response.headers):
+            return response
+
+        # Static files are streamed; read them so their size can be checked.
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+            return response
+
+        key = (flask.request.path, algorithm, hashlib.sha1(data).hexdigest())
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self.compress_data(app, algorithm, data)
+            self.cache.set(key, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = algorithm
+        response.headers["Content-Length"] = response.content_length
+        vary = response.headers.get("Vary")
+        if not vary:
+            response.headers["Vary"] = "Accept-Encoding"
+        elif "accept-encoding" not in vary.lower():
+            response.headers["Vary"] = f"{vary}, Accept-Encoding"
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{algorithm}", weak)
+            # The view compared If-None-Match with the uncompressed ETag
+            response.make_conditional(flask.request)
+        return response
+
+    @staticmethod
+    def compress_data(app, algorithm, data):
+        if algorithm == "br":
+            return brotli.compress(data, quality=app.config["COMPRESS_BR_LEVEL"])
+        return gzip.compress(data, compresslevel=app.config["COMPRESS_LEVEL"])
+
+
+def init_app(app):
+    """Compresses the responses of the server of a Dash app."""
+    server = app.server
+    server.config.setdefault("COMPRESS_MIMETYPES", MIMETYPES)
+    server.config.setdefault("COMPRESS_LEVEL", 6)
+    server.config.setdefault("COMPRESS_BR_LEVEL", 5)
+    server.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+    server.config.setdefault("COMPRESS_CACHE_MAX_BYTES", 64 * 2**20)
+    NegotiatedCompress(server)
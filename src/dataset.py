@@ -0,0 +1,510 @@
+"""
+Accès au jeu de données par morceaux, et agrégation de résultats partiels.
+
+Le CSV n'est jamais chargé en entier : il est lu par morceaux, et chaque
+morceau est nettoyé (dates de sortie, année et décennie, filtre sur l'année,
+types compacts) avant d'être replié dans les tables dont les sections ont
+besoin. Pour des agrégats (moyennes, comptes), chaque morceau donne des
+sommes et des nombres de valeurs par groupe, combinés ensuite en totaux. La
+mémoire utilisée dépend de la taille d'un morceau, pas de celle du catalogue.
+
+Les morceaux viennent du CSV, ou du store en colonnes quand la variable
+``SPOTIFY_STORE`` donne son dossier (voir ``src/column_store.py``), ou de la
+base SQLite que donne ``SPOTIFY_SQLITE`` (voir ``src/sqlite_store.py``) :
+les sections y demandent alors leurs agrégats directement
+(``query_sums``, ``query_counts``). ``SPOTIFY_CHUNK_ROWS`` règle le nombre de
+lignes par morceau.
+
+Une chanson a une ligne par playlist qui la contient. Les moyennes par
+chanson ne gardent que sa première ligne (``Distinct(["track_id"])``), celles
+par genre la première de chaque couple (chanson, genre) ; les comptes
+d'appartenances aux playlists gardent toutes les lignes.
+
+De nouvelles chansons s'ajoutent sans redémarrage avec ``append`` : chaque
+section enregistrée avec ``on_append`` replie le lot dans ses totaux et
+n'invalide que les figures qu'il touche. Une nouvelle version du fichier est
+prise en compte avec ``reload`` (appelée par ``src/dataset_watcher.py``) :
+les sections enregistrées avec ``on_reload`` reconstruisent leurs données,
+mises en place ensemble une fois toutes prêtes.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import artist_index, column_store, feature_matrix, sqlite_store
+
+DATASET_PATH = "./dataset/spotify_songs_clean.csv"
+STORE_PATH = os.environ.get("SPOTIFY_STORE")
+SQLITE_PATH = os.environ.get("SPOTIFY_SQLITE")
+CHUNK_ROWS = int(os.environ.get("SPOTIFY_CHUNK_ROWS", 200_000))
+
+_appenders = []
+_reloaders = []
+# Un seul ajout ou rechargement à la fois
+_append_lock = threading.Lock()
+
+# Colonnes texte très répétées, converties en category dans les morceaux nettoyés
+TEXT_COLUMNS = ["playlist_genre", "playlist_subgenre", "track_artist"]
+# Nombre maximal de combinaisons de codes suivies par un Distinct dans sa table de bits (128 Mo)
+BITMAP_LIMIT = 1 << 30
+
+
+class Source:
+    """
+    Une version du jeu de données : store ou connexions SQLite ouverts sur
+    elle, matrice des caractéristiques et dictionnaire des artistes créés à
+    la première demande.
+    """
+
+    def __init__(self):
+        # Le store est lu au chemin réel du moment : repointer le lien n'y change rien
+        self.store = column_store.ColumnStore(STORE_PATH) if STORE_PATH else None
+        self.pool = sqlite_store.ConnectionPool(SQLITE_PATH) if SQLITE_PATH else None
+        self.matrix = None
+        self.artists = None
+        self.lock = threading.RLock()
+
+    def iter_chunks(self, columns):
+        if self.pool is not None:
+            yield from sqlite_store.iter_chunks(self.pool, columns, CHUNK_ROWS)
+        elif self.store is not None:
+            yield from self.store.iter_chunks(columns, CHUNK_ROWS)
+        else:
+            yield from pd.read_csv(DATASET_PATH, usecols=columns, chunksize=CHUNK_ROWS)
+
+    def load_matrix(self):
+        with self.lock:
+            if self.matrix is None:
+                if self.pool is not None:
+                    self.matrix = feature_matrix.load(SQLITE_PATH, CHUNK_ROWS, self.iter_chunks)
+                elif self.store is not None:
+                    self.matrix = feature_matrix.from_store(self.store)
+                else:
+                    self.matrix = feature_matrix.load(DATASET_PATH, CHUNK_ROWS)
+            return self.matrix
+
+    def load_artists(self):
+        with self.lock:
+            if self.artists is None:
+                self.artists = artist_index.ArtistIndex(self.load_matrix().categories["track_artist"])
+            return self.artists
+
+
+_source = Source()
+# Source en construction pendant reload, visible du seul thread qui recharge
+_building = threading.local()
+
+
+def current_source():
+    """Version servie, ou celle que reload construit quand on est dans son thread."""
+    return getattr(_building, "source", None) or _source
+
+
+def iter_chunks(columns):
+    """
+    Parcourt les colonnes demandées du jeu de données par morceaux de CHUNK_ROWS lignes
+
+    Args
+    ----
+    columns : list
+        Noms des colonnes
+
+    Returns
+    -------
+    generator of pd.DataFrame
+    """
+    return current_source().iter_chunks(columns)
+
+
+def query_sums(keys, columns, where="1", params=(), dropna=True):
+    """
+    Sommes et nombres de valeurs de columns par groupe de keys, calculés par
+    la base SQLite (voir sqlite_store.aggregate), sous la forme de partial_sums
+    """
+    return sqlite_store.aggregate(current_source().pool, keys, columns, where, params, dropna)
+
+
+def query_counts(keys, where="1", params=()):
+    """Nombre de lignes par groupe de keys, calculé par la base SQLite (voir sqlite_store.count)."""
+    return sqlite_store.count(current_source().pool, keys, where, params)
+
+
+class Distinct:
+    """
+    Repère, d'un morceau à l'autre, la première ligne de chaque combinaison
+    de valeurs des colonnes keys. Avec ["track_id"], une chanson ne compte
+    qu'une fois quel que soit le nombre de playlists qui la contiennent.
+
+    Quand les clés du premier morceau sont des Categorical (morceaux d'un
+    store), les combinaisons vues sont un bit chacune dans une table indexée
+    par leurs codes. Sinon, et pour les valeurs absentes des dictionnaires,
+    une empreinte de 8 octets par combinaison vue est gardée dans quelques
+    tableaux triés, fusionnés quand ils deviennent de taille comparable.
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.dtypes = None
+        self.bitmap = None
+        self.runs = []
+
+    def first(self, chunk):
+        """
+        Masque des lignes de chunk dont la combinaison n'a pas encore été vue,
+        qui sont ensuite considérées comme vues. Une ligne à laquelle il manque
+        une clé est toujours gardée.
+
+        Returns
+        -------
+        np.ndarray of bool
+        """
+        keys = chunk[self.keys]
+        missing = keys.isna().any(axis=1).to_numpy()
+        if self.dtypes is None:
+            self.use_dictionaries(keys)
+        new = np.zeros(len(keys), dtype=bool)
+        rest = ~missing
+        if self.bitmap is not None:
+            codes = self.codes(keys)
+            known = codes >= 0
+            new[known] = self.first_codes(codes[known])
+            rest &= ~known
+        if rest.any():
+            new[rest] = self.first_hashes(pd.util.hash_pandas_object(keys[rest], index=False).to_numpy())
+        return new | missing
+
+    def use_dictionaries(self, keys):
+        self.dtypes = [keys[name].dtype for name in self.keys]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in self.dtypes):
+            size = int(np.prod([len(dtype.categories) for dtype in self.dtypes], dtype=np.float64))
+            if size <= BITMAP_LIMIT:
+                self.bitmap = np.zeros(size // 8 + 1, dtype=np.uint8)
+
+    def codes(self, keys):
+        """Numéro de la combinaison de chaque ligne dans la table, -1 si une valeur n'y est pas."""
+        combined = np.zeros(len(keys), dtype=np.int64)
+        unknown = np.zeros(len(keys), dtype=bool)
+        for name, dtype in zip(self.keys, self.dtypes):
+            column = keys[name]
+            # Les lignes ajoutées ensuite arrivent en valeurs brutes
+            codes = column.cat.codes if column.dtype is dtype else pd.Categorical(column, dtype=dtype).codes
+            codes = np.asarray(codes, dtype=np.int64)
+            combined = combined * len(dtype.categories) + codes
+            unknown |= codes < 0
+        combined[unknown] = -1
+        return combined
+
+    def first_codes(self, codes):
+        new = np.zeros(len(codes), dtype=bool)
+        if not len(codes):
+            return new
+        unique, index = np.unique(codes, return_index=True)
+        byte, bit = unique >> 3, np.left_shift(1, unique & 7).astype(np.uint8)
+        new[index[(self.bitmap[byte] & bit) == 0]] = True
+        # Codes triés : les bits d'un même octet se suivent
+        starts = np.flatnonzero(np.r_[True, byte[1:] != byte[:-1]])
+        self.bitmap[byte[starts]] |= np.bitwise_or.reduceat(bit, starts)
+        return new
+
+    def first_hashes(self, hashes):
+        unique, index = np.unique(hashes, return_index=True)
+        seen = np.zeros(len(unique), dtype=bool)
+        for run in self.runs:
+            position = np.minimum(np.searchsorted(run, unique), len(run) - 1)
+            seen |= run[position] == unique
+        new = np.zeros(len(hashes), dtype=bool)
+        new[index[~seen]] = True
+        if not seen.all():
+            self.runs.append(unique[~seen])
+            # Chaque tableau garde au moins le double du suivant : leur nombre reste logarithmique
+            while len(self.runs) > 1 and len(self.runs[-2]) < 2 * len(self.runs[-1]):
+                last = self.runs.pop()
+                self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]), kind="stable")
+        return new
+
+
+def read_distinct(keys):
+    """Distinct qui a déjà vu toutes les lignes du jeu de données."""
+    distinct = Distinct(keys)
+    for chunk in iter_chunks(keys):
+        distinct.first(chunk)
+    return distinct
+
+
+def parse_dates(dates):
+    """Dates de sortie, NaT quand pandas ne les reconnaît pas."""
+    return pd.to_datetime(dates, errors="coerce")
+
+
+def parse_release_dates(dates):
+    """
+    Dates de sortie au format complet "%Y-%m-%d" ou année seule "%Y" (au 1er janvier), NaT sinon.
+    """
+    full = pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce")
+    return full.fillna(pd.to_datetime(dates, format="%Y", errors="coerce"))
+
+
+def compact_dtypes(chunk):
+    """Colonnes texte répétées en category, entiers dans le plus petit type suffisant."""
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        if column in TEXT_COLUMNS and chunk[column].dtype == object:
+            chunk[column] = chunk[column].astype("category")
+        elif pd.api.types.is_integer_dtype(chunk[column].dtype):
+            chunk[column] = pd.to_numeric(chunk[column], downcast="integer")
+    return chunk
+
+
+def clean_chunk(chunk, min_year=None, dates=parse_dates, compact=True):
+    """
+    Nettoyage d'un morceau du jeu de données
+
+    Args
+    ----
+    chunk : pd.DataFrame
+        Morceau brut
+    min_year : int, optional
+        Année de sortie minimale ; les chansons sans date sont alors écartées
+    dates : function
+        Conversion des dates de sortie (parse_dates ou parse_release_dates)
+    compact : bool
+        Convertir les colonnes en types compacts (voir compact_dtypes)
+
+    Returns
+    -------
+    pd.DataFrame
+        Morceau avec les dates converties et les colonnes year et decennie
+        quand il contient track_album_release_date
+    """
+    if "track_album_release_date" in chunk:
+        chunk = chunk.assign(track_album_release_date=dates(chunk["track_album_release_date"]))
+        year = chunk["track_album_release_date"].dt.year
+        if min_year is not None:
+            chunk = chunk[year >= min_year]
+            year = year[year >= min_year].astype(int)
+        chunk = chunk.assign(year=year, decennie=(year // 10) * 10)
+    return compact_dtypes(chunk) if compact else chunk
+
+
+def iter_clean_chunks(columns, **options):
+    """Morceaux de iter_chunks nettoyés par clean_chunk (mêmes options)."""
+    for chunk in iter_chunks(columns):
+        yield clean_chunk(chunk, **options)
+
+
+def load_frame(columns, **options):
+    """
+    Lignes nettoyées des colonnes demandées, lues et filtrées morceau par
+    morceau : seules les colonnes et les lignes gardées sont en mémoire.
+    Le texte reste du texte (object), pour les sections qui en ont besoin.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    frame = pd.concat(iter_clean_chunks(columns, compact=False, **options))
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(object)
+    return frame
+
+
+def row_slices(rows):
+    """Tranches de CHUNK_ROWS lignes couvrant rows lignes."""
+    for start in range(0, rows, CHUNK_ROWS):
+        yield slice(start, min(start + CHUNK_ROWS, rows))
+
+
+def load_matrix():
+    """
+    Matrice des caractéristiques (voir feature_matrix.py) : vues sur les
+    fichiers du store s'il est configuré, segment de mémoire partagée sinon.
+    """
+    return current_source().load_matrix()
+
+
+def load_artists():
+    """
+    Dictionnaire des artistes du jeu de données (voir artist_index.py) : les
+    identifiants sont les codes track_artist de la matrice, les artistes
+    ajoutés ensuite sont numérotés à la suite.
+    """
+    return current_source().load_artists()
+
+
+def partial_sums(chunk, keys, columns):
+    """
+    Sommes et nombres de valeurs non manquantes de columns par groupe de keys,
+    pour un morceau
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexé par keys, colonnes ("sum", colonne) et ("count", colonne)
+    """
+    grouped = chunk.groupby(keys, observed=True)[columns]
+    return pd.concat({"sum": grouped.sum(), "count": grouped.count()}, axis=1)
+
+
+def combine(partials):
+    """
+    Somme des résultats partiels (indexés par les mêmes clés) de tous les
+    morceaux ; les clés manquantes gardées dans les partiels restent des groupes.
+    """
+    partials = list(partials)
+    levels = list(range(partials[0].index.nlevels))
+    return pd.concat(partials).groupby(level=levels, observed=True, dropna=False).sum()
+
+
+def as_frame(totals, name=None):
+    """Totaux remis en colonnes, les codes de dictionnaire redevenant du texte."""
+    frame = totals.reset_index(name=name) if name else totals.reset_index()
+    for column in frame.columns[:totals.index.nlevels]:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(object)
+    return frame
+
+
+def add_totals(totals, partial):
+    """Totaux augmentés d'un résultat partiel ; les groupes nouveaux sont ajoutés."""
+    dtypes = totals.dtypes if isinstance(totals, pd.DataFrame) else totals.dtype
+    return totals.add(partial, fill_value=0).astype(dtypes)
+
+
+def means(totals):
+    """
+    Moyennes par groupe à partir de totaux de sommes et de nombres de valeurs
+
+    Returns
+    -------
+    pd.DataFrame
+        Clés puis moyennes, une ligne par groupe, triées par clés
+    """
+    return as_frame(totals["sum"] / totals["count"])
+
+
+def combine_means(partials):
+    """Moyennes par groupe à partir des résultats de partial_sums de chaque morceau."""
+    return means(combine(partials))
+
+
+def combine_counts(partials):
+    """
+    Nombre de lignes par groupe à partir des tailles de groupes de chaque morceau
+
+    Returns
+    -------
+    pd.DataFrame
+        Clés puis colonne count, triées par clés
+    """
+    return as_frame(combine(partials), name="count")
+
+
+def data_version():
+    """
+    Version du jeu de données : chemin réel, taille et date de modification
+    du CSV, de la base SQLite, ou du manifeste du store quand il est
+    configuré (un store remplacé en repointant un lien symbolique change donc
+    de version)
+
+    Returns
+    -------
+    tuple
+    """
+    if SQLITE_PATH:
+        path = SQLITE_PATH
+    elif STORE_PATH:
+        path = os.path.join(STORE_PATH, column_store.MANIFEST)
+    else:
+        path = DATASET_PATH
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+# Version dont les données des sections sont construites
+loaded_version = data_version()
+
+
+def on_append(function):
+    """
+    Enregistre function(batch), appelée par append avec chaque lot de
+    nouvelles chansons (lignes brutes, colonnes du CSV). S'utilise en décorateur.
+    """
+    _appenders.append(function)
+    return function
+
+
+def append(rows, persist=True):
+    """
+    Ajoute des chansons au jeu de données sans tout recalculer : les sections
+    replient le lot dans leurs totaux et n'invalident que les figures touchées.
+    Le coût dépend de la taille du lot et de celle des tables d'agrégats, pas
+    de celle du catalogue.
+
+    Args
+    ----
+    rows : pd.DataFrame or list of dict
+        Nouvelles chansons, avec les colonnes du CSV
+    persist : bool
+        Ajouter aussi les lignes à la fin du CSV, pour les prochains démarrages
+        (un store en colonnes ou une base SQLite doit alors être reconstruit)
+    """
+    global loaded_version
+    batch = pd.DataFrame(rows)
+    with _append_lock:
+        # Les sections d'abord : celles qui calculent leurs totaux à la première
+        # demande les lisent alors dans le CSV sans le lot, puis l'ajoutent
+        for function in _appenders:
+            function(batch.copy())
+        if persist:
+            header = pd.read_csv(DATASET_PATH, nrows=0).columns
+            batch.reindex(columns=header).to_csv(DATASET_PATH, mode="a", header=False, index=False)
+            # Le fichier contient déjà le lot : pas de rechargement ici, seulement
+            # dans les autres processus
+            loaded_version = data_version()
+
+
+def on_reload(function):
+    """
+    Enregistre function(), appelée par reload pour reconstruire les données
+    d'une section à partir de la nouvelle version du jeu de données. Elle
+    renvoie une fonction sans argument qui les met en place (et vide les
+    caches de la section), appelée une fois toutes les sections prêtes.
+    S'utilise en décorateur.
+    """
+    _reloaders.append(function)
+    return function
+
+
+def reload():
+    """
+    Reconstruit les données de toutes les sections à partir de la version
+    actuelle du jeu de données, hors du chemin des requêtes, puis les met en
+    place d'un coup. Les callbacks en cours finissent avec les objets qu'ils
+    tiennent ; les anciennes données sont libérées quand ils les rendent.
+    Si une section échoue, aucune n'est modifiée, et la matrice, les artistes
+    et les connexions servis restent ceux de l'ancienne version.
+
+    Returns
+    -------
+    tuple
+        Version chargée (voir data_version)
+    """
+    global loaded_version, _source
+    with _append_lock:
+        version = data_version()
+        # Store, connexions, matrice et artistes de la nouvelle version ; les
+        # requêtes des autres threads gardent l'ancienne jusqu'à la mise en place
+        source = Source()
+        _building.source = source
+        try:
+            swaps = [function() for function in _reloaders]
+        finally:
+            del _building.source
+        _source = source
+        for swap in swaps:
+            swap()
+        loaded_version = version
+    return version
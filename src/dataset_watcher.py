@@ -0,0 +1,102 @@
+"""
+Hot reload of the dataset, without restarting the server.
+
+A background thread checks the version of the dataset (see
+``dataset.data_version``) every ``DATASET_POLL_SECONDS`` seconds (5 by
+default, 0 disables the watcher). Once a new version has stayed the same for
+two checks in a row (the file is no longer being written), it is loaded.
+
+Run directly (``src/server.py``), the process reloads itself: the sections
+rebuild their data in the watcher thread, off the request path, and swap it
+in together (``dataset.reload``). Callbacks already running finish with the
+data they hold, and the old version is freed when they return. The caches
+are then warmed again (``warmup.refresh``) while the process keeps serving.
+
+Under gunicorn the watcher runs in the master only (``when_ready`` in
+``src/gunicorn_config.py``) and sends it SIGHUP. The master reloads the data
+itself (``on_reload``), then forks a new set of workers from it and stops the
+old ones gracefully: for a moment, old workers still answer with the old
+version while new ones answer with the new one. Since the master always holds
+the current version, workers recycled later (``max_requests``) start from it
+too, and it owns the shared memory segments (see ``feature_matrix.py``), so a
+worker exiting never removes one still in use. Rows added by
+``dataset.append`` in a worker are reloaded the same way, by every worker.
+
+Replace the CSV by moving a complete file over it (``mv``), not by rewriting
+it in place. A store is memory-mapped, so build the new one in another folder
+and point the ``SPOTIFY_STORE`` symlink at it (``ln -sfn``).
+"""
+import logging
+import os
+import threading
+import time
+
+from . import dataset, warmup
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {"pid": None}
+
+
+def reload():
+    """
+    Reloads the dataset if a new version is there; on failure, the current
+    data is kept. Returns whether new data was loaded.
+    """
+    try:
+        if dataset.data_version() == dataset.loaded_version:
+            return False
+    except FileNotFoundError:
+        # Being replaced
+        return False
+    started = time.monotonic()
+    try:
+        version = dataset.reload()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Reload of the dataset failed, keeping the current data")
+        return False
+    logger.info("Reloaded %s in %.1fs", version[0], time.monotonic() - started)
+    return True
+
+
+def reload_in_process(version):
+    """Reloads this process and warms its caches again."""
+    if reload():
+        warmup.refresh()
+
+
+def watch(interval, on_change):
+    pending = handled = None
+    while True:
+        time.sleep(interval)
+        try:
+            version = dataset.data_version()
+        except FileNotFoundError:
+            # Being replaced
+            continue
+        if version in (dataset.loaded_version, handled):
+            pending = None
+            continue
+        if version != pending:
+            pending = version
+            continue
+        # Handled once, even if the reload fails: the next version is tried
+        pending, handled = None, version
+        on_change(version)
+
+
+def start(interval=None, on_change=reload_in_process):
+    """
+    Starts the watcher in the background; does nothing if it already runs in
+    this process. on_change(version) is called once for each new version,
+    from the watcher thread.
+    """
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return
+        _state["pid"] = os.getpid()
+    if interval is None:
+        interval = float(os.environ.get("DATASET_POLL_SECONDS", 5))
+    if interval > 0:
+        threading.Thread(target=watch, args=(interval, on_change), name="dataset-watcher", daemon=True).start()
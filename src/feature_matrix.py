@@ -0,0 +1,272 @@
+"""
+Matrice des caractéristiques audio et des codes catégoriels, en mémoire partagée.
+
+Les colonnes numériques du jeu de données, l'année de sortie et les codes
+entiers du genre, du sous-genre et de l'artiste sont copiés une seule fois
+dans un segment de mémoire partagée nommé. Comme dans le store en colonnes,
+une chanson présente dans plusieurs playlists n'y est qu'une fois : les
+colonnes de TRACK_COLUMNS ont une valeur par chanson, les autres une par
+appartenance à une playlist, avec l'indice de la chanson dans "track". Chaque processus les lit comme
+des vues NumPy, sans copie : sous Gunicorn, les workers partagent donc une
+seule copie des données au lieu d'en garder chacun une (les pages d'un
+DataFrame pandas finissent copiées à cause des compteurs de références).
+
+Le segment commence par un manifeste JSON (colonnes, dtypes, décalages,
+catégories). Son nom dépend du fichier source : avec ``preload_app`` le
+maître le crée et les workers l'héritent, sinon le premier worker le crée
+et les suivants s'y attachent. La création est sérialisée par un fichier
+verrou : un segment resté incomplet (créateur mort avant la fin) est
+supprimé et reconstruit par le processus suivant.
+
+Avec un store en colonnes (``src/column_store.py``), les mêmes colonnes sont
+lues directement dans ses fichiers projetés en mémoire, que le cache de pages
+partage déjà entre les processus.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+import weakref
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+FEATURES = [
+    "track_popularity", "danceability", "energy", "key", "loudness", "mode", "speechiness",
+    "acousticness", "instrumentalness", "liveness", "valence", "tempo", "duration_ms",
+]
+CATEGORICAL = {"playlist_genre": np.int8, "playlist_subgenre": np.int16, "track_artist": np.int32}
+TRACK_COLUMNS = FEATURES + ["year", "track_artist"]
+
+# Longueur du manifeste (écrite en dernier : 0 tant que le segment est en construction)
+PREFIX = struct.Struct("<Q")
+ALIGNMENT = 64
+ATTACH_TIMEOUT = 60
+
+
+def segment_name(path):
+    """Nom du segment, propre à une version du fichier (chemin, taille, date de modification)."""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return "spotify-" + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def build_columns(chunks):
+    """
+    Colonnes de la matrice à partir des données brutes, lues par morceaux
+
+    Args
+    ----
+    chunks : iterable of pd.DataFrame
+        Morceaux lus du CSV
+
+    Returns
+    -------
+    dict
+        {nom: np.ndarray} ; l'année vaut -1 quand la date est invalide,
+        les codes -1 quand la valeur manque. Les colonnes d'une chanson sont
+        prises à sa première ligne ; une ligne sans track_id est une chanson à part.
+    dict
+        {nom de colonne catégorielle: [valeurs triées]}
+    """
+    parts = []
+    for data in chunks:
+        part = {feature: data[feature].to_numpy(dtype=np.float64) for feature in FEATURES}
+        year = pd.to_datetime(data["track_album_release_date"], errors="coerce").dt.year
+        part["year"] = year.fillna(-1).to_numpy(dtype=np.int16)
+        for name in list(CATEGORICAL) + ["track_id"]:
+            part[name] = pd.Categorical(data[name])
+        parts.append(part)
+
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in FEATURES + ["year"]}
+    categories = {}
+    for name, dtype in CATEGORICAL.items():
+        # Codes communs à tous les morceaux, dans l'ordre trié des valeurs
+        combined = union_categoricals([part[name] for part in parts], sort_categories=True)
+        columns[name] = combined.codes.astype(dtype)
+        categories[name] = combined.categories.tolist()
+
+    combined = union_categoricals([part.pop("track_id") for part in parts], sort_categories=True)
+    track = combined.codes.astype(np.int64)
+    missing = track < 0
+    track[missing] = len(combined.categories) + np.arange(missing.sum())
+    _, first = np.unique(track, return_index=True)
+    for name in TRACK_COLUMNS:
+        columns[name] = columns[name][first]
+    columns["track"] = track.astype(np.int32)
+    return columns, categories
+
+
+@contextmanager
+def creation_lock(name):
+    """
+    Verrou exclusif autour de l'attachement au segment name ou de sa
+    création, rendu par le système si son détenteur meurt. Vaut True si le
+    verrou est pris (False sans fcntl).
+    """
+    if fcntl is None:
+        yield False
+        return
+    with open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def discard_segment(name):
+    """Supprime un segment laissé incomplet par un créateur mort."""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def unlink_segment(shm, creator):
+    if os.getpid() == creator:
+        shm.unlink()
+
+
+def aligned(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+class FeatureMatrix:
+    """Colonnes en lecture seule, sur un segment de mémoire partagée ou sur les fichiers d'un store."""
+
+    def __init__(self, columns, categories, shm=None):
+        self.shm = shm
+        self.columns = columns
+        self.categories = categories
+        # Appartenances aux playlists, et chansons distinctes
+        self.rows = len(columns["track"])
+        self.tracks = len(columns["year"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_segment(cls, shm, manifest, data_start):
+        columns = {}
+        for name, spec in manifest["columns"].items():
+            column = np.ndarray((spec["length"],), dtype=spec["dtype"], buffer=shm.buf, offset=data_start + spec["offset"])
+            column.flags.writeable = False
+            columns[name] = column
+        return cls(columns, manifest["categories"], shm)
+
+    @classmethod
+    def create(cls, name, columns, categories):
+        # Décalages relatifs au début des données, qui suivent le manifeste
+        specs, size = {}, 0
+        for column_name, values in columns.items():
+            specs[column_name] = {"dtype": values.dtype.str, "length": len(values), "offset": size}
+            size += aligned(values.nbytes)
+        manifest = {"columns": specs, "categories": categories}
+        header = json.dumps(manifest).encode()
+        data_start = aligned(PREFIX.size + len(header))
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=data_start + max(size, 1))
+        for column_name, values in columns.items():
+            offset = data_start + specs[column_name]["offset"]
+            np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=offset)[:] = values
+        shm.buf[PREFIX.size:PREFIX.size + len(header)] = header
+        shm.buf[:PREFIX.size] = PREFIX.pack(len(header))
+
+        # Seul le processus créateur supprime le segment, pas les workers forkés ;
+        # il le fait à la sortie, ou dès que la matrice n'est plus utilisée
+        # (remplacée par celle d'une nouvelle version du jeu de données)
+        matrix = cls.from_segment(shm, manifest, data_start)
+        weakref.finalize(matrix, unlink_segment, shm, os.getpid())
+        return matrix
+
+    @classmethod
+    def attach(cls, name, timeout=ATTACH_TIMEOUT):
+        shm = shared_memory.SharedMemory(name=name)
+        # Le segment appartient à son créateur : le resource tracker ne doit pas
+        # le supprimer à la sortie de ce processus
+        resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=protected-access
+        deadline = time.monotonic() + timeout
+        while True:
+            (length,) = PREFIX.unpack(bytes(shm.buf[:PREFIX.size]))
+            if length:
+                break
+            if time.monotonic() >= deadline:
+                shm.close()
+                raise TimeoutError(f"Shared memory segment {name} was never completed")
+            time.sleep(0.1)
+        manifest = json.loads(bytes(shm.buf[PREFIX.size:PREFIX.size + length]))
+        return cls.from_segment(shm, manifest, aligned(PREFIX.size + length))
+
+
+def load(path, chunk_rows=200_000, read_chunks=None):
+    """
+    Matrice du fichier path : attachée au segment existant, ou créée.
+
+    Args
+    ----
+    path : str
+        Chemin du fichier CSV, ou de la source lue par read_chunks
+    chunk_rows : int
+        Nombre de lignes lues à la fois pour construire la matrice
+    read_chunks : function, optional
+        read_chunks(columns) parcourt les colonnes de la source par morceaux ;
+        le CSV path est lu par défaut
+
+    Returns
+    -------
+    FeatureMatrix
+    """
+    name = segment_name(path)
+    with creation_lock(name) as exclusive:
+        try:
+            # Avec le verrou, personne d'autre ne construit : un segment
+            # incomplet est abandonné, inutile d'attendre
+            return FeatureMatrix.attach(name, timeout=0 if exclusive else ATTACH_TIMEOUT)
+        except FileNotFoundError:
+            pass
+        except TimeoutError:
+            discard_segment(name)
+        usecols = FEATURES + list(CATEGORICAL) + ["track_id", "track_album_release_date"]
+        if read_chunks is None:
+            text = list(CATEGORICAL) + ["track_id"]
+            chunks = pd.read_csv(path, usecols=usecols, dtype={column: str for column in text}, chunksize=chunk_rows)
+        else:
+            chunks = read_chunks(usecols)
+        columns, categories = build_columns(chunks)
+        try:
+            return FeatureMatrix.create(name, columns, categories)
+        except FileExistsError:
+            # Un autre processus l'a créé entre-temps (sans verrou)
+            return FeatureMatrix.attach(name)
+
+
+def from_store(store):
+    """
+    Matrice lue dans les fichiers d'un store en colonnes, sans copie
+
+    Args
+    ----
+    store : column_store.ColumnStore
+
+    Returns
+    -------
+    FeatureMatrix
+    """
+    names = FEATURES + ["year"] + list(CATEGORICAL)
+    columns = {name: store.column(name) for name in names}
+    # Les chansons du store sont dans l'ordre de leurs codes track_id
+    columns["track"] = store.column("track_id")
+    return FeatureMatrix(columns, {name: store.dictionary(name) for name in CATEGORICAL})
@@ -0,0 +1,69 @@
+"""
+Mémoïsation de figures avec invalidation sélective.
+
+``functools.lru_cache`` ne sait que tout vider. ``memoize`` garde la même
+utilisation (arguments hachables, ``cache_clear``) et ajoute
+``invalidate(predicate)``, qui retire seulement les entrées dont les
+arguments vérifient predicate : après un ajout de chansons, les figures que
+le lot ne touche pas restent en cache. Chaque réponse tirée du cache
+pendant un callback est comptée dans les métriques (``metrics.record_cache_hit``).
+"""
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from . import metrics
+
+
+def memoize(maxsize=128):
+    """
+    Décorateur de mémoïsation LRU, invalidable par prédicat
+
+    Args
+    ----
+    maxsize : int or None
+        Nombre maximal d'entrées gardées (None : pas de limite)
+
+    Returns
+    -------
+    function
+        Décorateur ; la fonction décorée a les méthodes invalidate(predicate) et cache_clear()
+    """
+    def decorator(function):
+        entries = OrderedDict()
+        lock = threading.Lock()
+        # Incrémenté à chaque invalidation : un calcul commencé avant n'est pas gardé
+        generation = [0]
+
+        @wraps(function)
+        def wrapper(*args):
+            with lock:
+                hit = args in entries
+                if hit:
+                    entries.move_to_end(args)
+                    value = entries[args]
+                started = generation[0]
+            if hit:
+                metrics.record_cache_hit()
+                return value
+            value = function(*args)
+            with lock:
+                if generation[0] == started:
+                    entries[args] = value
+                    while maxsize is not None and len(entries) > maxsize:
+                        entries.popitem(last=False)
+            return value
+
+        def invalidate(predicate):
+            with lock:
+                generation[0] += 1
+                for args in [args for args in entries if predicate(*args)]:
+                    del entries[args]
+
+        def cache_clear():
+            invalidate(lambda *args: True)
+
+        wrapper.invalidate = invalidate
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
@@ -0,0 +1,73 @@
+"""
+Gunicorn settings for serving the dashboard in production.
+
+Run from the repository root (the dataset path is relative to it)::
+
+    gunicorn -c src/gunicorn_config.py src.server:server
+
+The app is preloaded: the dataset and every figure precomputed at import
+time are built once in the master process, then shared copy-on-write by
+the forked workers instead of being rebuilt by each of them.
+"""
+import gc
+import multiprocessing
+import os
+import signal
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+
+# Build the app once in the master before forking the workers.
+preload_app = True
+
+# Callbacks are mostly CPU-bound pandas/plotly work, so one process per core,
+# with a few threads each to overlap request I/O.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+# Recycle workers periodically to bound memory growth, with jitter so they
+# don't all restart at the same time.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def child_exit(server, worker):
+    """Drops the metrics files of a dead worker (see src/metrics.py)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir"):
+        from prometheus_client import multiprocess  # pylint: disable=import-outside-toplevel
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    """Warms the section caches in the background of each new worker (see src/warmup.py)."""
+    from src import warmup  # pylint: disable=import-outside-toplevel
+    warmup.start()
+
+
+def when_ready(server):
+    """
+    Runs in the master after the app is preloaded, just before forking, and
+    watches the dataset from there (see src/dataset_watcher.py): a new version
+    makes the master reload itself (SIGHUP, see on_reload).
+    """
+    from src import dataset_watcher  # pylint: disable=import-outside-toplevel
+    # Move everything allocated during preload out of the garbage collector's
+    # reach, so collections in the workers don't write to (and copy) those pages.
+    gc.freeze()
+    dataset_watcher.start(on_change=lambda version: os.kill(os.getpid(), signal.SIGHUP))
+
+
+def on_reload(server):
+    """
+    Runs in the master on SIGHUP, before it forks the new workers: loads the
+    new version of the dataset, if any, so they start from it.
+    """
+    from src import dataset_watcher  # pylint: disable=import-outside-toplevel
+    gc.unfreeze()
+    if dataset_watcher.reload():
+        gc.collect()
+    gc.freeze()
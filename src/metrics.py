@@ -0,0 +1,125 @@
+"""
+Prometheus metrics for the Dash callbacks, served on ``/metrics``.
+
+Every callback registered after ``instrument_callbacks(app)`` is timed and
+counted, labeled by its output ID (the key Dash uses in ``app.callback_map``).
+
+Under Gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` (``prometheus_multiproc_dir``
+for older prometheus-client releases) to an empty directory so that
+``/metrics`` aggregates all the workers instead of the one that answered.
+"""
+import functools
+import os
+import time
+
+import flask
+from dash.exceptions import PreventUpdate
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+CALLBACK_LATENCY = Histogram(
+    "dash_callback_duration_seconds",
+    "Wall time spent in a Dash callback.",
+    ["output"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CALLBACK_RESPONSE_BYTES = Histogram(
+    "dash_callback_response_bytes",
+    "Size of the response body sent back for a Dash callback.",
+    ["output"],
+    buckets=(1e3, 5e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6),
+)
+CALLBACK_INPUTS = Histogram(
+    "dash_callback_inputs",
+    "Number of inputs sent with a Dash callback request.",
+    ["output"],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32),
+)
+CALLBACK_ERRORS = Counter(
+    "dash_callback_errors_total",
+    "Dash callbacks that raised an exception.",
+    ["output"],
+)
+CACHE_HITS = Counter(
+    "dash_callback_cache_hits_total",
+    "Results served from a cache while answering a Dash callback.",
+    ["output"],
+)
+
+
+def multiprocess_dir():
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+
+def current_output():
+    """Output ID of the callback being answered, if any."""
+    if flask.has_request_context():
+        return flask.g.get("dash_output")
+    return None
+
+
+def record_cache_hit():
+    """To be called by section code when it answers from one of its caches."""
+    output = current_output()
+    if output is not None:
+        CACHE_HITS.labels(output=output).inc()
+
+
+def instrument_callbacks(app):
+    """
+    Wraps ``app.callback`` so that every callback registered afterwards
+    records its latency, input count and errors.
+    """
+    register = app.callback
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def wrap(func):
+            @functools.wraps(func)
+            def timed(*func_args, **func_kwargs):
+                body = flask.request.get_json(silent=True) or {}
+                output = body.get("output", func.__name__)
+                flask.g.dash_output = output
+                CALLBACK_INPUTS.labels(output=output).observe(len(body.get("inputs", [])))
+
+                start = time.perf_counter()
+                try:
+                    return func(*func_args, **func_kwargs)
+                except PreventUpdate:
+                    raise
+                except Exception:
+                    CALLBACK_ERRORS.labels(output=output).inc()
+                    raise
+                finally:
+                    CALLBACK_LATENCY.labels(output=output).observe(time.perf_counter() - start)
+
+            return decorator(timed)
+
+        return wrap
+
+    app.callback = callback
+
+
+def record_response_size(response):
+    output = flask.g.get("dash_output")
+    if output is not None and not response.direct_passthrough:
+        CALLBACK_RESPONSE_BYTES.labels(output=output).observe(len(response.get_data()))
+    return response
+
+
+def metrics_view():
+    registry = REGISTRY
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return flask.Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Instruments the callbacks of a Dash app and serves ``/metrics`` from its server."""
+    instrument_callbacks(app)
+    app.server.after_request(record_response_size)
+    app.server.add_url_rule("/metrics", "metrics", metrics_view)
@@ -5,43 +5,110 @@ from dash import State
 from dash import callback_context as ctx
 from dash import ctx, no_update
 
+from . import dataset
+from .figure_cache import memoize
+
 
 
 # dataset et carac audio
-dataset_path = "./dataset/spotify_songs_clean.csv"
 carac_audio = [
     "danceability", "energy", "key", "loudness", "mode", 
     "speechiness", "acousticness", "instrumentalness", "liveness", "valence"
 ]
 
+def aggregate_chunk(chunk, tracks, pairs):
+    """
+    Sommes et nombres de valeurs par an, et par an et genre, pour un morceau brut
+    du jeu de données. Une chanson ne compte qu'une fois par an (tracks), et une
+    fois par genre (pairs), même si plusieurs playlists la contiennent.
+
+    Args
+    ----
+    chunk : pd.DataFrame
+        Morceau brut, avec track_id
+    tracks, pairs : dataset.Distinct
+        Chansons et couples (chanson, genre) déjà comptés
+    """
+    columns = ["track_popularity"] + carac_audio
+    # release date -> datetime et year, en gardant les données après 1970
+    df = dataset.clean_chunk(chunk.assign(first_track=tracks.first(chunk), first_pair=pairs.first(chunk)), min_year=1970)
+    return (dataset.partial_sums(df[df["first_track"]], ["year"], columns),
+            dataset.partial_sums(df[df["first_pair"]], ["year", "playlist_genre"], columns))
+
 def preprocess_data():
-    df = pd.read_csv(dataset_path)
-    
-    
-    # release date -> datetime et extract year
-    df["track_album_release_date"] = pd.to_datetime(df["track_album_release_date"], errors="coerce")
-    df["year"] = df["track_album_release_date"].dt.year
-    # print(df)
-    
-    
-    # garder les données après 1970
-    df = df[df["year"] >= 1970]
-    # print(df)
-    
-    # moyenne de popularite par an pour chaque carcteristique audio
-    grouped_df = df.groupby("year")[["track_popularity"] + carac_audio].mean().reset_index()
-    
-    #for each genre
-    grouped_df_genre = df.groupby(["year", "playlist_genre"])[["track_popularity"] + carac_audio].mean().reset_index()
+    """
+    Sommes et nombres de valeurs par an, et par an et genre, sur tout le jeu de données
+
+    Returns
+    -------
+    pd.DataFrame, pd.DataFrame
+        Totaux par an, et par an et genre
+    dataset.Distinct, dataset.Distinct
+        Chansons et couples (chanson, genre) comptés ; None avec la base
+        SQLite, qui calcule les totaux elle-même (voir get_counted)
+    """
+    if dataset.SQLITE_PATH:
+        columns = ["track_popularity"] + carac_audio
+        return (dataset.query_sums({"year": "year"}, columns, "first_track AND year >= ?", (1970,)),
+                dataset.query_sums({"year": "year", "playlist_genre": "playlist_genre"}, columns,
+                                   "first_pair AND year >= ?", (1970,)),
+                None, None)
+    columns = ["track_id", "track_album_release_date", "playlist_genre", "track_popularity"] + carac_audio
+    tracks, pairs = dataset.Distinct(["track_id"]), dataset.Distinct(["track_id", "playlist_genre"])
+    partials = [aggregate_chunk(chunk, tracks, pairs) for chunk in dataset.iter_chunks(columns)]
+    return (dataset.combine(by_year for by_year, _ in partials), dataset.combine(by_genre for _, by_genre in partials),
+            tracks, pairs)
+
+totals_by_year, totals_by_genre, counted_tracks, counted_pairs = preprocess_data()
+
+# moyenne de popularite par an pour chaque carcteristique audio
+grouped_df = dataset.means(totals_by_year)
+#for each genre
+grouped_df_genre = dataset.means(totals_by_genre)
+
+def get_counted():
+    """Chansons et couples (chanson, genre) comptés, lus à la première demande avec la base SQLite."""
+    global counted_tracks, counted_pairs
+    if counted_tracks is None:
+        counted_tracks = dataset.read_distinct(["track_id"])
+        counted_pairs = dataset.read_distinct(["track_id", "playlist_genre"])
+    return counted_tracks, counted_pairs
+
+@dataset.on_append
+def append_rows(batch):
+    """
+    Ajoute un lot de nouvelles chansons aux totaux, et retire du cache les
+    graphiques dont la période et le genre couvrent une chanson du lot
+    """
+    global totals_by_year, totals_by_genre, grouped_df, grouped_df_genre
+    by_year, by_genre = aggregate_chunk(batch, *get_counted())
+    if by_year.empty and by_genre.empty:
+        return
+    totals_by_year = dataset.add_totals(totals_by_year, by_year)
+    totals_by_genre = dataset.add_totals(totals_by_genre, by_genre)
+    grouped_df, grouped_df_genre = dataset.means(totals_by_year), dataset.means(totals_by_genre)
+
+    # (genre ou "all", année) des moyennes qui changent
+    changed = {("all", year) for year in by_year.index} | {(genre, year) for year, genre in by_genre.index}
+    get_charts.invalidate(lambda year_range, genre, features: any(
+        key == genre and year_range[0] <= year <= year_range[1] for key, year in changed
+    ))
 
-    # print("grouped df")
-    # print(grouped_df)
-    # print("grouped df for genre")
-    # print(grouped_df_genre )
-    return grouped_df,grouped_df_genre
+@dataset.on_reload
+def reload_data():
+    """
+    Totaux recalculés sur la nouvelle version du jeu de données ; renvoie la
+    fonction qui les met en place
+    """
+    by_year, by_genre, tracks, pairs = preprocess_data()
+    means = dataset.means(by_year), dataset.means(by_genre)
 
-grouped_df,grouped_df_genre = preprocess_data()
-# print(df)
+    def swap():
+        global totals_by_year, totals_by_genre, counted_tracks, counted_pairs, grouped_df, grouped_df_genre
+        totals_by_year, totals_by_genre, counted_tracks, counted_pairs = by_year, by_genre, tracks, pairs
+        grouped_df, grouped_df_genre = means
+        get_charts.cache_clear()
+    return swap
 
 def filter_df(year_range, genre):
     start_year, end_year = year_range
@@ -109,6 +176,123 @@ layout = html.Div([
     
 ])
 
+
+def get_story_page(page):
+    """
+    Texte, filtres et caractéristiques affichés pour une page de l'histoire (1 à 7).
+    """
+    text = ""
+    genre = "all"
+    year_range = [1970, 2020]
+    features = carac_audio.copy()
+
+    if page == 1:
+        text = html.Span([
+            "En observant les graphiques, on remarque une très faible corrélation entre les variations des caractéristiques energy, loudness, danceability et celles de la popularité.",
+            html.Br(),
+            "Pour les autres caractéristiques, il n’existe pas de relation directe et systématique entre la valeur d’une caractéristique audio et la popularité d’une chanson,",
+            html.Br(),
+            "ce qui indique que les caractéristiques audio jouent un rôle limité dans la popularité de la musique."
+        ])
+
+    elif page == 2:
+        text = html.Span([
+            "Même en filtrant par genres, dans ce cas le “pop”, on n’observe pas une forte corrélation entre les caractéristiques audio et la popularité d’une chanson au sein de genres spécifiques.",
+            html.Br(),
+            "Vous pouvez aussi explorer les données pour un genre de votre choix en utilisant le filtre par genre."
+        ])
+        genre = "pop"
+    elif page == 3:
+        text = "Les musiques anciennes présentent un mode, valence et loudness élevés"
+        year_range = [1970, 2010]
+        features = ["mode", "valence", "loudness"]
+    elif page == 4:
+        text = "Alors que les musique récentes présentent un mode, valence et loudness plus faibles"
+        year_range = [2010, 2020]
+        features = ["mode", "valence", "loudness"]
+    elif page == 5:
+        text = html.Span([
+            "Ce qui indique que les musiques récentes présentent des caractéristiques audio différentes, avec une tendance vers des morceaux plus mélancoliques,",
+            html.Br(),
+            "moins puissants et davantage influencés par des éléments instrumentaux et vocaux."
+        ])
+    elif page == 6:
+        text = "Les caractéristiques audio exceptées key et liveness présentent des tendances et des évolutions notables au fil du temps"
+        features = [f for f in carac_audio if f not in ["key", "liveness"]]
+    elif page == 7:
+        text = html.Span([
+            "Alors que les caractéristiques Key et Liveness restent relativement stables au fil du temps et intemporelles, suggérant que ni la répartition des tonalités musicales",
+            html.Br(),
+            "ni la présence d'effets de public en direct dans les chansons populaires n'ont significativement évolué au fil des années."
+        ])
+        features = ["key", "liveness"]
+
+    return text, year_range, genre, f"{page}/7", features
+
+
+@memoize(maxsize=64)
+def get_charts(year_range, selected_genre, features):
+    """
+    Graphiques de la section pour une période, un genre et des caractéristiques.
+    Mémoïsé : les arguments sont des tuples.
+    """
+    filtered_df = filter_df(year_range, selected_genre)
+    charts = []
+    total_features = len(features)
+    charts_per_row = 3
+    if len(features) == 2:
+        charts_per_row = 2
+    for i, feature in enumerate(features):
+        # getting index of last subchart in row
+        show_colorbar = ((i + 1) % charts_per_row == 0) or (i == len(features) - 1)
+        fig = px.scatter(
+            filtered_df.copy(),
+            x=feature,
+            y="track_popularity",
+            size=[20]*len(filtered_df),
+            color="year",
+            color_continuous_scale="Viridis",
+            labels={"track_popularity": "Popularité Moyenne", feature: feature.capitalize(), "year": "Année"},
+            title=f"{feature.capitalize()} vs Popularity"
+        )
+        fig.update_traces(
+            marker=dict(opacity=0.95),
+            hovertemplate=(
+                f"{feature.capitalize()}: %{{x:.6f}}<br>"
+                "Popularité Moyenne: %{y:.5f}<br>"
+                "Année: %{marker.color}"
+            )
+        )
+        if not show_colorbar:
+            fig.update_coloraxes(showscale=False)
+        fig.update_layout(
+            title_x=0.5, 
+            yaxis_title="Popularity", 
+            xaxis_title=feature.capitalize(),
+            title_font_color='white',
+            xaxis=dict(title_font=dict(color='white'), tickfont=dict(color='white')),
+            yaxis=dict(title_font=dict(color='white'), tickfont=dict(color='white')),
+            coloraxis_colorbar=dict(
+            tickfont=dict(color='white'),
+            title=dict(font=dict(color='white'))
+            ),
+            plot_bgcolor='#121212', 
+            paper_bgcolor='#121212',
+            height=350,
+            showlegend=True  
+            )
+        # centering last row
+        remaining = total_features % 3
+        is_last = i == total_features - 1
+        needs_centering = remaining == 1 and is_last
+        style = {"width": "100%", "textAlign": "center"}
+        if needs_centering:
+            style["gridColumn"] = "2 / 3"  # center in the second column of 3
+        charts.append(html.Div(dcc.Graph(figure=fig), style=style))
+        
+    return charts
+
+
 # Register callbacks with the main app.
 def register_callbacks(app):
     @app.callback(
@@ -135,53 +319,7 @@ def register_callbacks(app):
         Input("story-page-q1", "data"),
     )
     def display_story(page):
-        text = ""
-        genre = "all"
-        year_range = [1970, 2020]
-        features = carac_audio.copy()
-
-        if page == 1:
-            text = html.Span([
-                "En observant les graphiques, on remarque une très faible corrélation entre les variations des caractéristiques energy, loudness, danceability et celles de la popularité.",
-                html.Br(),
-                "Pour les autres caractéristiques, il n’existe pas de relation directe et systématique entre la valeur d’une caractéristique audio et la popularité d’une chanson,",
-                html.Br(),
-                "ce qui indique que les caractéristiques audio jouent un rôle limité dans la popularité de la musique."
-            ])
-
-        elif page == 2:
-            text = html.Span([
-                "Même en filtrant par genres, dans ce cas le “pop”, on n’observe pas une forte corrélation entre les caractéristiques audio et la popularité d’une chanson au sein de genres spécifiques.",
-                html.Br(),
-                "Vous pouvez aussi explorer les données pour un genre de votre choix en utilisant le filtre par genre."
-            ])
-            genre = "pop"
-        elif page == 3:
-            text = "Les musiques anciennes présentent un mode, valence et loudness élevés"
-            year_range = [1970, 2010]
-            features = ["mode", "valence", "loudness"]
-        elif page == 4:
-            text = "Alors que les musique récentes présentent un mode, valence et loudness plus faibles"
-            year_range = [2010, 2020]
-            features = ["mode", "valence", "loudness"]
-        elif page == 5:
-            text = html.Span([
-                "Ce qui indique que les musiques récentes présentent des caractéristiques audio différentes, avec une tendance vers des morceaux plus mélancoliques,",
-                html.Br(),
-                "moins puissants et davantage influencés par des éléments instrumentaux et vocaux."
-            ])
-        elif page == 6:
-            text = "Les caractéristiques audio exceptées key et liveness présentent des tendances et des évolutions notables au fil du temps"
-            features = [f for f in carac_audio if f not in ["key", "liveness"]]
-        elif page == 7:
-            text = html.Span([
-                "Alors que les caractéristiques Key et Liveness restent relativement stables au fil du temps et intemporelles, suggérant que ni la répartition des tonalités musicales",
-                html.Br(),
-                "ni la présence d'effets de public en direct dans les chansons populaires n'ont significativement évolué au fil des années."
-            ])
-            features = ["key", "liveness"]
-
-        return text, year_range, genre, f"{page}/7", features
+        return get_story_page(page)
 
     @app.callback(
         Output("charts-container", "children"),
@@ -190,61 +328,7 @@ def register_callbacks(app):
         Input("features-store", "data")
     )
     def update_charts(year_range, selected_genre, features):
-        filtered_df = filter_df(year_range, selected_genre)
-        charts = []
-        total_features = len(features)
-        charts_per_row = 3
-        if len(features) == 2:
-            charts_per_row = 2
-        for i, feature in enumerate(features):
-            # getting index of last subchart in row
-            show_colorbar = ((i + 1) % charts_per_row == 0) or (i == len(features) - 1)
-            fig = px.scatter(
-                filtered_df.copy(),
-                x=feature,
-                y="track_popularity",
-                size=[20]*len(filtered_df),
-                color="year",
-                color_continuous_scale="Viridis",
-                labels={"track_popularity": "Popularité Moyenne", feature: feature.capitalize(), "year": "Année"},
-                title=f"{feature.capitalize()} vs Popularity"
-            )
-            fig.update_traces(
-                marker=dict(opacity=0.95),
-                hovertemplate=(
-                    f"{feature.capitalize()}: %{{x:.6f}}<br>"
-                    "Popularité Moyenne: %{y:.5f}<br>"
-                    "Année: %{marker.color}"
-                )
-            )
-            if not show_colorbar:
-                fig.update_coloraxes(showscale=False)
-            fig.update_layout(
-                title_x=0.5, 
-                yaxis_title="Popularity", 
-                xaxis_title=feature.capitalize(),
-                title_font_color='white',
-                xaxis=dict(title_font=dict(color='white'), tickfont=dict(color='white')),
-                yaxis=dict(title_font=dict(color='white'), tickfont=dict(color='white')),
-                coloraxis_colorbar=dict(
-                tickfont=dict(color='white'),
-                title=dict(font=dict(color='white'))
-                ),
-                plot_bgcolor='#121212', 
-                paper_bgcolor='#121212',
-                height=350,
-                showlegend=True  
-                )
-            # centering last row
-            remaining = total_features % 3
-            is_last = i == total_features - 1
-            needs_centering = remaining == 1 and is_last
-            style = {"width": "100%", "textAlign": "center"}
-            if needs_centering:
-                style["gridColumn"] = "2 / 3"  # center in the second column of 3
-            charts.append(html.Div(dcc.Graph(figure=fig), style=style))
-            
-        return charts
+        return get_charts(tuple(year_range), selected_genre, tuple(features))
 
 
 
@@ -1,25 +1,84 @@
+import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
 from dash import dcc, html
 
+from . import dataset
+from .figure_cache import memoize
 
-def convert_date(date):
-    try:
-        # Format complet "%Y-%m-%d"
-        return pd.to_datetime(date, format="%Y-%m-%d")
-    except ValueError:
-        try:
-            # Format année seule "%Y", compléter par "-01-01"
-            return pd.to_datetime(date, format="%Y") + pd.offsets.DateOffset(months=0, days=0)
-        except ValueError:
-            return pd.NaT
 
+def aggregate_chunk(data):
+    """
+    Somme et nombre des popularités par couple (artiste, sous-genre), pour un morceau nettoyé
+    """
+    # Les chansons sans sous-genre comptent quand même dans la popularité de l'artiste
+    grouped = data.groupby(["track_artist", "playlist_subgenre"], observed=True, dropna=False)["track_popularity"]
+    return pd.DataFrame({"sum": grouped.sum(), "count": grouped.count()})
 
-def get_dataframe(path):
-    data = pd.read_csv(path)
-    data["track_album_release_date"] = data["track_album_release_date"].apply(convert_date)
-    data = data[data["track_album_release_date"].dt.year >= 1970] # On ne garde que les musiques après 1970, car il n'y a pas assez d'échantillons avant
-    return data
+def clean_rows(chunk):
+    # On ne garde que les musiques après 1970, car il n'y a pas assez d'échantillons avant
+    return dataset.clean_chunk(chunk, min_year=1970, dates=dataset.parse_release_dates)
+
+def read_pair_totals():
+    """
+    Totaux par couple (artiste, sous-genre), agrégés par morceaux du jeu de
+    données, ou par une requête avec la base SQLite.
+    """
+    if dataset.SQLITE_PATH:
+        totals = dataset.query_sums({"track_artist": "track_artist", "playlist_subgenre": "playlist_subgenre"},
+                                    ["track_popularity"], "release_year >= ?", (1970,), dropna=False)
+        totals.columns = totals.columns.droplevel(1)
+        return totals
+    chunks = dataset.iter_chunks(["track_artist", "playlist_subgenre", "track_popularity", "track_album_release_date"])
+    return dataset.combine(aggregate_chunk(clean_rows(chunk)) for chunk in chunks)
+
+pair_totals = None
+
+def get_pair_totals():
+    """Totaux par couple (artiste, sous-genre), calculés à la première demande."""
+    global pair_totals
+    if pair_totals is None:
+        pair_totals = read_pair_totals()
+    return pair_totals
+
+@dataset.on_append
+def append_rows(batch):
+    """Ajoute un lot de nouvelles chansons aux totaux par couple (artiste, sous-genre)."""
+    global pair_totals
+    pair_totals = dataset.add_totals(get_pair_totals(), aggregate_chunk(clean_rows(batch)))
+    get_figure.cache_clear()
+
+@dataset.on_reload
+def reload_data():
+    """Totaux recalculés sur la nouvelle version du jeu de données ; renvoie la fonction qui les met en place."""
+    totals = read_pair_totals()
+
+    def swap():
+        global pair_totals
+        pair_totals = totals
+        get_figure.cache_clear()
+    return swap
+
+def get_artist_stats():
+    """
+    Nombre de sous-genres et popularité moyenne de chaque artiste
+    """
+    totals = get_pair_totals()
+    artists = dataset.load_artists()
+    # Identifiants des artistes de chaque couple, en ne cherchant chaque nom qu'une fois
+    names, codes = totals.index.levels[0], totals.index.codes[0]
+    ids = np.where(codes >= 0, artists.lookup(names, add=True)[codes], -1)
+    has_subgenre = totals.index.get_level_values("playlist_subgenre").notna()
+
+    present = np.flatnonzero(artists.bincount(ids))
+    stats = pd.DataFrame({
+        "track_artist": artists.names[present],
+        "nb_subgenres": artists.bincount(ids, has_subgenre)[present].astype(np.int64),
+        "popularity_sum": artists.bincount(ids, totals["sum"])[present],
+        "popularity_count": artists.bincount(ids, totals["count"])[present],
+    })
+    stats["mean_popularity"] = stats["popularity_sum"] / stats["popularity_count"]
+    return stats
 
 def get_hover_template():
     return (
@@ -32,9 +91,9 @@ def get_hover_template():
         "<extra></extra>" # Pour enlever le "trace 0" qui apparait automatiquement sinon
     )
 
+@memoize(maxsize=1)
 def get_figure():
-    data = get_dataframe("./dataset/spotify_songs_clean.csv")
-    div_pop_df = data.groupby("track_artist").agg(nb_subgenres=("playlist_subgenre", "nunique"), mean_popularity=("track_popularity", "mean")).reset_index()
+    div_pop_df = get_artist_stats()
     div_pop_df = div_pop_df.groupby("nb_subgenres").agg(mean_popularity=("mean_popularity", "mean"), nb_artist=("track_artist", "count")).reset_index()
     div_pop_df = div_pop_df[div_pop_df["nb_artist"] > 4]
 
@@ -66,28 +125,29 @@ def get_figure():
     )
     return fig
 
-layout = html.Div([
-    html.H1("Impact d'une discographie variée sur la popularité"),
-    html.Div([
-        dcc.Graph(id="graph-q11", figure=get_figure()),
-    ], style={'width': '60%', 'display': 'inline-block'}),
-    html.Div([
-        dcc.Markdown("""
-            Une discographie diversifiée (avec de nombreux sous-genres) semble impacter positivement la popularité. 
-            On pourrait expliquer ce phénomène en supposant que ces artistes :
-            - **s’adaptent à leur environnement** en explorant des sous-genres différents pour parfaire leurs musiques vis à vis de leurs auditoires.
-            - **aux modes des époques** pour perdurer dans le temps.
+def layout():
+    return html.Div([
+        html.H1("Impact d'une discographie variée sur la popularité"),
+        html.Div([
+            dcc.Graph(id="graph-q11", figure=get_figure()),
+        ], style={'width': '60%', 'display': 'inline-block'}),
+        html.Div([
+            dcc.Markdown("""
+                Une discographie diversifiée (avec de nombreux sous-genres) semble impacter positivement la popularité. 
+                On pourrait expliquer ce phénomène en supposant que ces artistes :
+                - **s’adaptent à leur environnement** en explorant des sous-genres différents pour parfaire leurs musiques vis à vis de leurs auditoires.
+                - **aux modes des époques** pour perdurer dans le temps.
             
-            Une majorité des artistes ne possède qu’un seul genre, montrant possiblement la difficulté à changer de style. Ils ont également en moyenne la **popularité** la plus faible.
+                Une majorité des artistes ne possède qu’un seul genre, montrant possiblement la difficulté à changer de style. Ils ont également en moyenne la **popularité** la plus faible.
+                """, style={'backgroundColor': '#121212','fontSize': '16px',}),
+                html.Br(),
+                html.Br(),
+                html.Br(),
+                html.Br(),
+            dcc.Markdown("""
+                ### Attention cependant à la lecture de ce graphique!
+                Un grand nombre de sous-genre peut signifier beaucoup de tests de la part des artistes en questions, mais pas forcément que ceux-ci ont fait un album complet de chaque genre.
             """, style={'backgroundColor': '#121212','fontSize': '16px',}),
-            html.Br(),
-            html.Br(),
-            html.Br(),
-            html.Br(),
-        dcc.Markdown("""
-            ### Attention cependant à la lecture de ce graphique!
-            Un grand nombre de sous-genre peut signifier beaucoup de tests de la part des artistes en questions, mais pas forcément que ceux-ci ont fait un album complet de chaque genre.
-        """, style={'backgroundColor': '#121212','fontSize': '16px',}),
-    ], style={'width': '40%', 'display': 'inline-block', 'verticalAlign': 'top', "marginTop": "100px", 'color': 'white'}),
-])
+        ], style={'width': '40%', 'display': 'inline-block', 'verticalAlign': 'top', "marginTop": "100px", 'color': 'white'}),
+    ])
 
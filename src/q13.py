@@ -1,31 +1,150 @@
+import numpy as np
 import pandas as pd
 from dash import dcc, html, Input, Output
 import plotly.express as px
 
-file_path = "./dataset/spotify_songs_clean.csv"
-data = pd.read_csv(file_path)
+from . import dataset
+from .figure_cache import memoize
 
-data["track_album_release_date"] = pd.to_datetime(data["track_album_release_date"], errors='coerce')
-data["year"] = data["track_album_release_date"].dt.year
-data["decade"] = (data["year"] // 10) * 10
-
-div_pop_df = data.groupby("track_artist").agg(nb_decennie=("decade", "nunique"))\
-                 .query("nb_decennie >= 3").reset_index()
+# Colonnes numériques et codes partagés entre les workers (voir feature_matrix.py),
+# parcourus par tranches de chansons : une chanson présente dans plusieurs
+# playlists ne compte qu'une fois
+matrix = dataset.load_matrix()
+# Identifiants des artistes : les codes de la matrice, puis les artistes ajoutés ensuite
+artists = dataset.load_artists()
 
 features = ["track_popularity", "danceability", "energy", "valence", "tempo"]
 
-def generate_line_chart(selected_feature):
-    data_filtered = data[data["year"] >= 1970]
-
-    long_career_artists = div_pop_df["track_artist"]
-    data_long = data_filtered[data_filtered["track_artist"].isin(long_career_artists)]
-    data_short = data_filtered[~data_filtered["track_artist"].isin(long_career_artists)]
 
-    long_data = data_long.groupby("year")[selected_feature].mean().reset_index()
-    long_count = data_long.groupby("year").size().reset_index(name='track_count')
-
-    short_data = data_short.groupby("year")[selected_feature].mean().reset_index()
-    short_count = data_short.groupby("year").size().reset_index(name='track_count')
+def aggregate_pairs(artists, years, values):
+    """
+    Nombre de chansons, sommes et nombres de valeurs connues des caractéristiques
+    par couple (code d'artiste, année), pour les chansons dont l'année est connue
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexé par (track_artist, year), colonnes ("sum" ou "count", caractéristique ou "tracks")
+    """
+    rows = pd.DataFrame({"track_artist": artists, "year": years, **values, "tracks": 1})
+    rows = rows[rows["year"] >= 0]
+    return dataset.partial_sums(rows, ["track_artist", "year"], features + ["tracks"])
+
+
+def get_pair_totals(matrix):
+    partials = []
+    for rows in dataset.row_slices(matrix.tracks):
+        values = {feature: matrix[feature][rows] for feature in features}
+        partials.append(aggregate_pairs(matrix["track_artist"][rows], matrix["year"][rows], values))
+    return dataset.combine(partials)
+
+pair_totals = get_pair_totals(matrix)
+
+
+def summarize(pair_totals):
+    """
+    Artistes actifs sur au moins 3 décennies, et totaux par année (depuis 1970)
+    pour ces artistes et pour les autres
+
+    Returns
+    -------
+    np.ndarray
+        Identifiants des artistes de longue carrière
+    pd.DataFrame
+        Totaux indexés par (long_career, year)
+    """
+    ids = pair_totals.index.get_level_values("track_artist").to_numpy(dtype=np.int64)
+    years = pair_totals.index.get_level_values("year").to_numpy(dtype=np.int64)
+    known = ids >= 0
+    # Couples (artiste, décennie) distincts, puis nombre de décennies par artiste
+    decades = np.unique(np.stack([ids[known], years[known] // 10]), axis=1)
+    is_long_career = np.bincount(decades[0]) >= 3
+    long_career = np.flatnonzero(is_long_career)
+
+    recent = years >= 1970
+    is_long = np.zeros(len(ids), dtype=bool)
+    is_long[known] = is_long_career[ids[known]]
+    is_long = pd.Index(is_long[recent], name="long_career")
+    return long_career, pair_totals[recent].groupby([is_long, pd.Index(years[recent], name="year")]).sum()
+
+long_career, yearly = summarize(pair_totals)
+
+
+# Chansons déjà comptées, lues dans le jeu de données au premier ajout
+counted_tracks = None
+
+def get_counted_tracks():
+    global counted_tracks
+    if counted_tracks is None:
+        counted_tracks = dataset.read_distinct(["track_id"])
+    return counted_tracks
+
+
+@dataset.on_append
+def append_rows(batch):
+    """
+    Ajoute un lot de nouvelles chansons aux totaux par (artiste, année) ; les
+    graphiques ne sont retirés du cache que si les totaux par année changent
+    """
+    global pair_totals, long_career, yearly
+    batch = dataset.clean_chunk(batch[get_counted_tracks().first(batch)])
+    batch = batch[batch["year"].notna()]
+    if batch.empty:
+        return
+    values = {feature: batch[feature].to_numpy(dtype=np.float64) for feature in features}
+    partial = aggregate_pairs(artists.lookup(batch["track_artist"], add=True), batch["year"].to_numpy(dtype=np.int64), values)
+    pair_totals = dataset.add_totals(pair_totals, partial)
+    previous = yearly
+    long_career, yearly = summarize(pair_totals)
+    if not yearly.equals(previous):
+        generate_line_chart.cache_clear()
+
+
+@dataset.on_reload
+def reload_data():
+    """
+    Matrice et totaux de la nouvelle version du jeu de données ; renvoie la
+    fonction qui les met en place. L'ancienne matrice est libérée quand plus
+    aucun callback ne s'en sert.
+    """
+    new_matrix, new_artists = dataset.load_matrix(), dataset.load_artists()
+    totals = get_pair_totals(new_matrix)
+    summary = summarize(totals)
+
+    def swap():
+        global matrix, artists, pair_totals, long_career, yearly, counted_tracks
+        matrix, artists, pair_totals = new_matrix, new_artists, totals
+        long_career, yearly = summary
+        counted_tracks = None
+        generate_line_chart.cache_clear()
+    return swap
+
+
+def yearly_mean(long, selected_feature):
+    """
+    Moyenne de la caractéristique et nombre de chansons par année, pour les
+    artistes de longue carrière (long=True) ou les autres
+
+    Returns
+    -------
+    pd.DataFrame
+        Colonnes year et mean
+    pd.DataFrame
+        Colonnes year et track_count
+    """
+    totals = yearly[yearly.index.get_level_values("long_career") == long]
+    years = totals.index.get_level_values("year").to_numpy(dtype=np.float64)
+    means = totals[("sum", selected_feature)] / totals[("count", selected_feature)]
+    return (pd.DataFrame({"year": years, "mean": means.to_numpy()}),
+            pd.DataFrame({"year": years, "track_count": totals[("sum", "tracks")].to_numpy(dtype=np.int64)}))
+
+
+@memoize(maxsize=None)
+def generate_line_chart(selected_feature):
+    long_data, long_count = yearly_mean(True, selected_feature)
+    short_data, short_count = yearly_mean(False, selected_feature)
+    long_data = long_data.rename(columns={"mean": selected_feature})
+    short_data = short_data.rename(columns={"mean": selected_feature})
 
     fig = px.line()
 
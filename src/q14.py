@@ -1,59 +1,355 @@
+import numpy as np
 import pandas as pd
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, Patch, ctx, no_update
 import plotly.express as px
 
-def convert_date(date):
-    try:
-        #Complete format: "%Y-%m-%d"
-        return pd.to_datetime(date, format="%Y-%m-%d")
-    except ValueError:
-        try:
-            #Year only: "%Y", completed with "-01-01"
-            return pd.to_datetime(date, format="%Y") + pd.offsets.DateOffset(months=0, days=0)
-        except ValueError:
-            return pd.NaT
+from . import dataset, metrics
+from .figure_cache import memoize
 
+def load_data():
+    """
+    Colonnes utilisées par la section, lues et nettoyées morceau par morceau :
+    dates au format "%Y-%m-%d" ou "%Y", chansons sorties à partir de 1970
+    """
+    return dataset.load_frame(
+        ["track_name", "track_artist", "track_album_release_date", "playlist_genre", "playlist_subgenre"],
+        min_year=1970, dates=dataset.parse_release_dates,
+    )
 
-def get_dataframe(path):
-    data = pd.read_csv(path)
-    data["track_album_release_date"] = data["track_album_release_date"].apply(convert_date)
-    #Keep only songs released from 1970 onward
-    data = data[data["track_album_release_date"].dt.year >= 1970]
-    return data
+data = load_data()
 
-def get_color_map():
+# Dictionnaire des artistes (voir artist_index.py), pour retrouver leurs chronologies
+artists = dataset.load_artists()
+
+def get_color_map(data):
     """
     Récupération de certaines couleurs pour faire correspondre les sous-genres des artistes à ceux du graphe des sou-genres
     
     """
-    data = get_dataframe("./dataset/spotify_songs_clean.csv")
     color_sequence = ['rgb(27,158,119)','rgb(117,112,179)','rgb(102,166,30)','rgb(166,118,29)']
 
     color_map = {}
-    for genre in sorted(data["playlist_genre"].unique()) :
+    for genre in sorted(data["playlist_genre"].dropna().unique()) :
         subgenres_genre = data[data["playlist_genre"] == genre]["playlist_subgenre"].unique()
         color_map.update({subgenre: color_sequence[i % len(color_sequence)] for i, subgenre in enumerate(subgenres_genre)})
     return color_map
 
-color_map = get_color_map()
+color_map = get_color_map(data)
+
+
+def build_cumulative_timelines(group_codes, dates, subgenre_codes, n_subgenres):
+    """
+    Construit, en une seule passe vectorisée, les comptes cumulés par jour de sortie
+    et par sous-genre pour chaque groupe de chansons
+
+    Args
+    ----
+    group_codes : np.ndarray
+        Code entier du groupe de chaque chanson (ex. le genre), -1 si elle n'en a pas
+    dates : np.ndarray
+        Dates de sortie (datetime64[ns]) de chaque chanson
+    subgenre_codes : np.ndarray
+        Indice du sous-genre de chaque chanson au sein de son genre (NaN si inconnu)
+    n_subgenres : int
+        Nombre de colonnes de sous-genres
+
+    Returns
+    -------
+    np.ndarray
+        Offsets : le groupe i occupe les lignes offsets[i]:offsets[i+1]
+    np.ndarray
+        Jours de sortie distincts (int64, en ns), triés dans chaque groupe
+    np.ndarray
+        Comptes cumulés (jours x sous-genres) depuis le début de chaque groupe
+    """
+    #Chansons sans groupe (ex. artiste ou genre manquant) ou sans sous-genre : ignorées
+    n_groups = int(group_codes.max()) + 1 if len(group_codes) else 0
+    keep = (group_codes >= 0) & ~pd.isna(subgenre_codes)
+    group_codes, dates = group_codes[keep], dates[keep]
+    subgenre_codes = subgenre_codes[keep].astype(np.int64)
+
+    days = dates.astype("datetime64[ns]").astype("int64")
+    order = np.lexsort((days, group_codes))
+    group_sorted = group_codes[order]
+    days_sorted = days[order]
+
+    #Une ligne par couple (groupe, jour) distinct
+    is_new = np.ones(len(order), dtype=bool)
+    is_new[1:] = (group_sorted[1:] != group_sorted[:-1]) | (days_sorted[1:] != days_sorted[:-1])
+    row = np.cumsum(is_new) - 1
+
+    counts = np.zeros((int(is_new.sum()), n_subgenres), dtype=np.int64)
+    np.add.at(counts, (row, subgenre_codes[order]), 1)
+
+    #Cumul global, puis on retire le cumul des groupes précédents
+    row_groups = group_sorted[is_new]
+    offsets = np.searchsorted(row_groups, np.arange(n_groups + 1))
+    cum = np.cumsum(counts, axis=0)
+    before = np.vstack([np.zeros((1, n_subgenres), dtype=np.int64), cum])[offsets[:-1]]
+    cum -= np.repeat(before, np.diff(offsets), axis=0)
+
+    return offsets, days_sorted[is_new], cum
+
+
+def get_subgenre_codes(data):
+    """
+    Indice de chaque sous-genre au sein de son genre
+
+    Args
+    ----
+    data : pd.DataFrame
+        Données nettoyées
+
+    Returns
+    -------
+    dict
+        {genre: [sous-genres triés]}
+    np.ndarray
+        Indice local du sous-genre de chaque chanson
+    """
+    subgenres_by_genre = {
+        genre: sorted(subgenres.dropna().unique())
+        for genre, subgenres in data.groupby("playlist_genre")["playlist_subgenre"]
+    }
+    local_index = {subgenre: j for subgenres in subgenres_by_genre.values() for j, subgenre in enumerate(subgenres)}
+    return subgenres_by_genre, data["playlist_subgenre"].map(local_index).to_numpy()
+
+subgenres_by_genre, subgenre_codes = get_subgenre_codes(data)
+n_subgenres = max(len(subgenres) for subgenres in subgenres_by_genre.values())
+
+
+def build_genre_timelines(data, subgenres_by_genre, subgenre_codes, n_subgenres):
+    """
+    Prépare, pour chaque genre, le tableau trié des jours de sortie et les comptes
+    cumulés par sous-genre utilisés pour le binning personnalisé
+
+    Args
+    ----
+    data : pd.DataFrame
+        Données nettoyées
+    subgenres_by_genre, subgenre_codes : dict, np.ndarray
+        Résultats de get_subgenre_codes
+    n_subgenres : int
+        Nombre maximal de sous-genres d'un genre
+
+    Returns
+    -------
+    dict
+        {genre: {"subgenres": [...], "days": np.ndarray, "cum": np.ndarray}}
+    """
+    genre_codes, genres = pd.factorize(data["playlist_genre"], sort=True)
+    offsets, days, cum = build_cumulative_timelines(
+        genre_codes, data["track_album_release_date"].to_numpy(), subgenre_codes, n_subgenres
+    )
+
+    timelines = {}
+    for i, genre in enumerate(genres):
+        subgenres = subgenres_by_genre[genre]
+        timelines[genre] = {
+            "subgenres": subgenres,
+            "days": days[offsets[i]:offsets[i + 1]],
+            "cum": cum[offsets[i]:offsets[i + 1], :len(subgenres)],
+        }
+    return timelines
+
+genre_timelines = build_genre_timelines(data, subgenres_by_genre, subgenre_codes, n_subgenres)
+
+
+def build_artist_timelines(data, artists, subgenre_codes, n_subgenres):
+    """
+    Prépare les comptes cumulés par sous-genre de tous les couples (artiste, genre)
+    en une seule passe. Les couples partagent les mêmes tableaux : le couple
+    (artiste i, genre j) occupe les lignes offsets[k]:offsets[k+1] de "days" et
+    "cum", avec k = i * len(genres) + j.
+
+    Args
+    ----
+    data : pd.DataFrame
+        Données nettoyées
+    artists : artist_index.ArtistIndex
+        Dictionnaire des artistes ; les artistes inconnus y sont ajoutés
+    subgenre_codes : np.ndarray
+        Indice local du sous-genre de chaque chanson
+    n_subgenres : int
+        Nombre maximal de sous-genres d'un genre
+
+    Returns
+    -------
+    dict
+        {"genres": pd.Index, "offsets": np.ndarray, "days": np.ndarray, "cum": np.ndarray}
+    """
+    artist_ids = artists.lookup(data["track_artist"], add=True)
+    genre_codes, genres = pd.factorize(data["playlist_genre"], sort=True)
+    known = (artist_ids >= 0) & (genre_codes >= 0)
+    pair_codes = np.where(known, artist_ids * len(genres) + genre_codes, -1)
+    offsets, days, cum = build_cumulative_timelines(
+        pair_codes, data["track_album_release_date"].to_numpy(), subgenre_codes, n_subgenres
+    )
+    return {"genres": pd.Index(genres), "offsets": offsets, "days": days, "cum": cum.astype(np.int32)}
+
+artist_timelines = build_artist_timelines(data, artists, subgenre_codes, n_subgenres)
+
+#Chronologies des couples (artiste, genre) qui ont reçu des chansons après le démarrage
+artist_timeline_updates = {}
+
+
+#Nombre maximal d'artistes renvoyés au dropdown
+ARTIST_OPTIONS_LIMIT = 50
+
+def build_artist_search_index(data):
+    """
+    Index de recherche par préfixe des artistes de chaque genre.
+    Les artistes sont numérotés par nombre de chansons décroissant, donc les
+    meilleurs résultats d'une recherche sont les plus petits identifiants.
+    Chaque début de mot du nom est indexé ("weeknd" trouve "The Weeknd").
+
+    Args
+    ----
+    data : pd.DataFrame
+        Données nettoyées
+
+    Returns
+    -------
+    dict
+        {genre: {"names": np.ndarray, "keys": np.ndarray, "ids": np.ndarray}}
+    """
+    index = {}
+    for genre, genre_data in data.groupby("playlist_genre"):
+        song_counts = genre_data.groupby("track_artist")["track_name"].nunique()
+        song_counts = song_counts.sort_values(ascending=False, kind="mergesort")
+        names = song_counts.index.to_numpy(dtype=object)
+
+        keys, ids = [], []
+        for i, name in enumerate(names):
+            lowered = name.lower()
+            for start in [0] + [j + 1 for j, char in enumerate(lowered) if char == " "]:
+                keys.append(lowered[start:])
+                ids.append(i)
+        keys = np.asarray(keys, dtype=object)
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(keys, kind="mergesort")
+        index[genre] = {"names": names, "keys": keys[order], "ids": ids[order]}
+    return index
+
+artist_search_index = build_artist_search_index(data)
+
+# Les lignes ne servent qu'à construire les index ci-dessus : elles ne restent
+# pas en mémoire dans chaque worker
+del data, subgenre_codes
+
+
+def search_artists(genre_filter, search_value=None, limit=ARTIST_OPTIONS_LIMIT):
+    """
+    Artistes du genre dont un mot commence par search_value, classés par nombre de chansons
+
+    Args
+    ----
+    genre_filter : str
+        Genre sélectionné
+    search_value : str, optional
+        Texte saisi dans le dropdown
+    limit : int
+        Nombre maximal d'artistes renvoyés
+
+    Returns
+    -------
+    list
+        Noms des artistes
+    """
+    index = artist_search_index.get(genre_filter)
+    if index is None:
+        return []
+    prefix = (search_value or "").strip().lower()
+    if not prefix:
+        return list(index["names"][:limit])
+
+    lo = np.searchsorted(index["keys"], prefix, side="left")
+    hi = np.searchsorted(index["keys"], prefix + "\uffff", side="left")
+    ids = np.unique(index["ids"][lo:hi])[:limit]
+    return list(index["names"][ids])
+
+
+def get_artist_timeline(artist, genre_filter):
+    """
+    Jours de sortie et comptes cumulés par sous-genre d'un artiste dans un genre
+
+    Returns
+    -------
+    np.ndarray, np.ndarray
+        Jours (int64, en ns) et comptes cumulés, vides si l'artiste n'a pas de chanson dans ce genre
+    """
+    if (artist, genre_filter) in artist_timeline_updates:
+        return artist_timeline_updates[(artist, genre_filter)]
+    genres, offsets = artist_timelines["genres"], artist_timelines["offsets"]
+    artist_id = artists.code(artist)
+    i = artist_id * len(genres) + genres.get_loc(genre_filter) if artist_id >= 0 and genre_filter in genres else -1
+    if not 0 <= i < len(offsets) - 1:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.int32)
+    start, end = offsets[i], offsets[i + 1]
+    n = len(subgenres_by_genre[genre_filter])
+    return artist_timelines["days"][start:end], artist_timelines["cum"][start:end, :n]
+
+
+def count_until(days, cum, edges, side="right"):
+    """
+    Nombre de chansons par sous-genre sorties jusqu'à chaque borne (incluse si side="right")
+    """
+    idx = np.searchsorted(days, edges, side=side)
+    counts = cum[np.maximum(idx - 1, 0)]
+    counts[idx == 0] = 0
+    return counts
+
+
+def count_decades(data):
+    """
+    Nombre de chansons par décennie, genre et sous-genre, pour un morceau nettoyé du jeu de données
+
+    Args
+    ----
+    data : pd.DataFrame
+        Morceau avec les colonnes decennie, playlist_genre et playlist_subgenre
+
+    Returns
+    -------
+    pd.Series
+        Comptes indexés par (decennie, playlist_genre, playlist_subgenre)
+    """
+    return data.groupby(["decennie", "playlist_genre", "playlist_subgenre"], observed=True).size()
+
+def read_decade_totals():
+    """
+    Comptes par décennie agrégés morceau par morceau, sans charger tout le jeu
+    de données, ou par une requête avec la base SQLite.
+    """
+    if dataset.SQLITE_PATH:
+        return dataset.query_counts(
+            {"decennie": "release_year / 10 * 10", "playlist_genre": "playlist_genre",
+             "playlist_subgenre": "playlist_subgenre"},
+            "release_year >= ?", (1970,),
+        )
+    return dataset.combine(
+        count_decades(chunk)
+        for chunk in dataset.iter_clean_chunks(
+            ["track_album_release_date", "playlist_genre", "playlist_subgenre"],
+            min_year=1970, dates=dataset.parse_release_dates,
+        )
+    )
+
+decade_totals = read_decade_totals()
+decade_counts = dataset.as_frame(decade_totals, name="count")
 
 
-def data_preprocess(path, filter_type, artist=None):
+def data_preprocess(filter_type):
     """
     Fonction pour preprocess les données
 
     Args
     ----
-    path : str
-        Chemin du fichier CSV
     filter_type : str
         Type de filtre à appliquer :
-            - "artist" pour filtrer par artiste avec le nom de l'artiste dans l'argument artist
             - "genre" pour grouper par genres
             - "edm", "latin", "pop", "r&b", "rap", "rock" pour filtrer par genre (et donc grouper par ses sous-genres)
-    artist : str, optional
-        Nom de l'artiste à filtrer si filter_type est "artist"
 
     Returns
     -------
@@ -61,20 +357,14 @@ def data_preprocess(path, filter_type, artist=None):
         Données preprocess pour le graph
     
     """
-    data = get_dataframe(path)
-    data["year"] = data["track_album_release_date"].dt.year
-    data["decennie"] = (data["year"] // 10) * 10  #Calculate the decade
-
-    if filter_type == "artist":
-        data = data[data["track_artist"] == artist]
-        group_by_column = "playlist_subgenre"
-    elif filter_type in ["edm", "latin", "pop", "r&b", "rap", "rock"]:
-        data = data[data["playlist_genre"] == filter_type]
+    if filter_type in ["edm", "latin", "pop", "r&b", "rap", "rock"]:
+        counts = decade_counts[decade_counts["playlist_genre"] == filter_type]
         group_by_column = "playlist_subgenre"
     else:
+        counts = decade_counts
         group_by_column = "playlist_genre"
 
-    genre_data = data.groupby(["decennie", group_by_column]).size().reset_index(name="count")
+    genre_data = counts.groupby(["decennie", group_by_column])["count"].sum().reset_index()
     genre_data = genre_data.pivot(index="decennie", columns=group_by_column, values="count").fillna(0)
  
     genre_data = (genre_data.div(genre_data.sum(axis=1), axis=0) * 100).reset_index()
@@ -82,14 +372,12 @@ def data_preprocess(path, filter_type, artist=None):
 
     return genre_data
 
-def data_preprocess_artist_cumulative(path, artist, genre_filter):
+def data_preprocess_artist_cumulative(artist, genre_filter):
     """
     Preprocess des données pour les artistes avec les pourcentages cumulatifs par sous-genre
 
     Args
     ----
-    path : str
-        Chemin du fichier CSV des données
     artist : str
         Nom de l'artiste à filtrer
     genre_filter : str
@@ -100,32 +388,80 @@ def data_preprocess_artist_cumulative(path, artist, genre_filter):
     pd.DataFrame
         Données preprocess pour le graph
     """
-    data = get_dataframe(path)
-    data = data[(data["track_artist"] == artist) & (data["playlist_genre"] == genre_filter)] # Filtrage pour l'artiste et le genre
-    data["formatted_date"] = pd.to_datetime(data["track_album_release_date"]).dt.strftime("%Y-%m-%d")
-    
-    grouped = data.groupby(["formatted_date", "playlist_subgenre"]).size().reset_index(name="count")
-    pivot = grouped.pivot(index="formatted_date", columns="playlist_subgenre", values="count").fillna(0).sort_index()
-    
-    cum = pivot.cumsum() # Cumulatif par sous-genre
-    total_cum = cum.sum(axis=1) # Total cumulatif par date
-    cum_percent = cum.div(total_cum, axis=0) * 100 # % cumulatif par sous-genre
-    
-    # Repasser en format "long" pour la suite
-    cum_percent = cum_percent.reset_index().melt(id_vars="formatted_date", var_name="playlist_subgenre", value_name="percentage")
-    cum_percent["formatted_date"] = pd.to_datetime(cum_percent["formatted_date"]).sort_values()
-    
-    return cum_percent
+    days, cum = get_artist_timeline(artist, genre_filter)
+    if len(days) == 0:
+        return pd.DataFrame(columns=["formatted_date", "playlist_subgenre", "percentage"])
+
+    present = cum[-1] > 0 # Sous-genres de l'artiste dans ce genre
+    total_cum = cum.sum(axis=1, keepdims=True) # Total cumulatif par date
+    cum_percent = cum[:, present] / total_cum * 100 # % cumulatif par sous-genre
+
+    # Format "long" pour la suite
+    subgenres = np.asarray(subgenres_by_genre[genre_filter], dtype=object)[present]
+    return pd.DataFrame({
+        "formatted_date": np.tile(days.view("datetime64[ns]"), len(subgenres)),
+        "playlist_subgenre": np.repeat(subgenres, len(days)),
+        "percentage": cum_percent.T.ravel(),
+    })
+
+#Nombre de nanosecondes dans un jour, pour passer des dates aux valeurs des sliders
+NS_PER_DAY = 86_400_000_000_000
+
+def compute_custom_bins(genre_filter, bins=10, start_date=None, end_date=None):
+    """
+    Pourcentages par sous-genre de chaque bin d'une période quelconque.
+
+    Les comptes de chaque bin sont obtenus par différence des comptes cumulés
+    aux bornes (searchsorted), sans reparcourir les chansons du genre.
+
+    Returns
+    -------
+    pd.DatetimeIndex
+        Milieux des bins
+    np.ndarray
+        Pourcentages (bins x sous-genres du genre), NaN pour les bins vides
+    tuple
+        Dates de début et de fin
+    """
+    timeline = genre_timelines[genre_filter]
+    days, cum = timeline["days"], timeline["cum"]
+
+    #Dates de début et de fin
+    min_date = start_date or pd.Timestamp(days[0])
+    max_date = end_date or pd.Timestamp(days[-1])
+
+    #S'il n'y a qu'une date, on rajoute un jour
+    if min_date == max_date:
+        max_date = min_date + pd.Timedelta(days=1)
+
+    #Création des bins (la première borne est incluse, comme avec include_lowest)
+    bin_edges = pd.date_range(start=min_date, end=max_date, periods=bins+1)
+    bin_midpoints = bin_edges[:-1] + (bin_edges[1:] - bin_edges[:-1]) / 2
+    edges = bin_edges.asi8
+    counts = np.vstack([
+        count_until(days, cum, edges[:1], side="left"),
+        count_until(days, cum, edges[1:]),
+    ])
+    bin_counts = np.diff(counts, axis=0)
+
+    #Calcul des pourcentages
+    totals = bin_counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percentages = bin_counts / totals * 100
+
+    return bin_midpoints, percentages, (min_date, max_date)
+
 
 #Custom binning preprocessing function with 10 bins over a dynamic time range
-def data_preprocess_custom(path,genre_filter, bins=10, start_date=None, end_date=None):
+def data_preprocess_custom(genre_filter, bins=10, start_date=None, end_date=None):
     """
     Preprocess des données avec des dates personnalisées et des bins
 
+    Tous les sous-genres du genre sont présents (à 0 % s'ils n'ont aucune chanson
+    sur la période) pour que l'ordre des traces du graphe reste stable.
+
     Args
     ----
-    path : str
-        Chemin du fichier CSV des données
     genre_filter : str
         Genre à filtrer
     bins : int
@@ -142,35 +478,34 @@ def data_preprocess_custom(path,genre_filter, bins=10, start_date=None, end_date
     tuple
         Dates de début et de fin
     """
-    data = get_dataframe(path)
-    
-    data = data[data["playlist_genre"] == genre_filter]
-    
-    #Dates de début et de fin
-    min_date = start_date or data["track_album_release_date"].min()
-    max_date = end_date or data["track_album_release_date"].max()
+    bin_midpoints, percentages, date_range = compute_custom_bins(genre_filter, bins, start_date, end_date)
 
-    #S'il n'y a qu'une date, on rajoute un jour
-    if min_date == max_date:
-        max_date = min_date + pd.Timedelta(days=1)
-        
-    #Création des bins
-    bin_edges = pd.date_range(start=min_date, end=max_date, periods=bins+1)
-    bin_midpoints = [bin_edges[i] + (bin_edges[i+1] - bin_edges[i]) / 2 for i in range(len(bin_edges)-1)]
-    
-    #Filtrage des données et assignation des chansons aux bins
-    data = data[(data["track_album_release_date"] >= min_date) & (data["track_album_release_date"] <= max_date)]
-    data["time_bin"] = pd.cut(data["track_album_release_date"], bins=bin_edges, labels=bin_midpoints, include_lowest=True)
-    
-    #Calcul des pourcentages
-    genre_data = data.groupby(["time_bin", "playlist_subgenre"]).size().reset_index(name="count")
-    genre_data = genre_data.pivot(index="time_bin", columns="playlist_subgenre", values="count").fillna(0)
-    genre_data = (genre_data.div(genre_data.sum(axis=1), axis=0) * 100).reset_index()
-    genre_data = genre_data.melt(id_vars="time_bin", var_name="playlist_subgenre", value_name="percentage")
-    
-    return genre_data, (min_date, max_date)
+    #Format "long" : un bloc de bins par sous-genre
+    subgenres = subgenres_by_genre[genre_filter]
+    genre_data = pd.DataFrame({
+        "time_bin": np.tile(bin_midpoints, len(subgenres)),
+        "playlist_subgenre": np.repeat(np.asarray(subgenres, dtype=object), bins),
+        "percentage": percentages.T.ravel(),
+    })
+
+    return genre_data, date_range
+
+
+def get_window_marks(start_day, end_day):
+    """
+    Marques annuelles (au plus une dizaine) du slider de la fenêtre temporelle
+    """
+    first_year = pd.Timestamp(start_day * NS_PER_DAY).year
+    last_year = pd.Timestamp(end_day * NS_PER_DAY).year
+    step = max(1, -(-(last_year - first_year) // 10))
+    marks = {}
+    for year in range(first_year, last_year + 1, step):
+        day = pd.Timestamp(year=year, month=1, day=1).value // NS_PER_DAY
+        marks[int(max(day, start_day))] = {'label': str(year), 'style': {'color': 'white'}}
+    return marks
 
 
+@memoize(maxsize=1)
 def get_figure_genre():
     genres_couleurs = {
         "rock": "#FF0000",       # Rouge
@@ -180,7 +515,7 @@ def get_figure_genre():
         "r&b": "#008000",        # Vert
         "pop": "#ADD8E6"         # Bleu clair
     }
-    genre_data = data_preprocess("./dataset/spotify_songs_clean.csv", "playlist_genre", "playlist_genre")
+    genre_data = data_preprocess("playlist_genre")
     fig = px.area(genre_data, x="decennie", y="percentage", color="playlist_genre", line_group="playlist_genre", hover_data=["playlist_genre"],
                   color_discrete_map=genres_couleurs)
     fig.update_layout(
@@ -198,57 +533,119 @@ def get_figure_genre():
     return fig
 
 
-#Figures en cache pour les sous-genres
-subgenre_cache = {
-    "edm": px.area(
-        data_preprocess("./dataset/spotify_songs_clean.csv", "edm"),
-        x="decennie", y="percentage", color="playlist_subgenre",
-        line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
-        color_discrete_map=color_map,
-        title="Évolution des sous-genres de Edm",
-        height=500,
-    ),
-    "latin": px.area(
-        data_preprocess("./dataset/spotify_songs_clean.csv", "latin"),
-        x="decennie", y="percentage", color="playlist_subgenre",
-        line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
-        color_discrete_map=color_map,
-        title="Évolution des sous-genres de Latin",
-        height=500
-    ),
-    "pop": px.area(
-        data_preprocess("./dataset/spotify_songs_clean.csv", "pop"),
-        x="decennie", y="percentage", color="playlist_subgenre",
-        line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
-        color_discrete_map=color_map,
-        title="Évolution des sous-genres de Pop",
-        height=500
-    ),
-    "r&b": px.area(
-        data_preprocess("./dataset/spotify_songs_clean.csv", "r&b"),
-        x="decennie", y="percentage", color="playlist_subgenre",
-        line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
-        color_discrete_map=color_map,
-        title="Évolution des sous-genres de R&b",
-        height=500
-    ),
-    "rap": px.area(
-        data_preprocess("./dataset/spotify_songs_clean.csv", "rap"),
-        x="decennie", y="percentage", color="playlist_subgenre",
-        line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
-        color_discrete_map=color_map,
-        title="Évolution des sous-genres de Rap",
-        height=500
-    ),
-    "rock": px.area(
-        data_preprocess("./dataset/spotify_songs_clean.csv", "rock"),
-        x="decennie", y="percentage", color="playlist_subgenre",
-        line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
-        color_discrete_map=color_map,
-        title="Évolution des sous-genres de Rock",
-        height=500
-    )
-}
+#Figures en cache pour les sous-genres, construites à la première demande
+subgenre_cache = {}
+
+def get_subgenre_figure(genre):
+    if genre in subgenre_cache:
+        metrics.record_cache_hit()
+    else:
+        subgenre_cache[genre] = px.area(
+            data_preprocess(genre),
+            x="decennie", y="percentage", color="playlist_subgenre",
+            line_group="playlist_subgenre", hover_data=["playlist_subgenre"],
+            color_discrete_map=color_map,
+            title=f"Évolution des sous-genres de {genre.capitalize()}",
+            height=500
+        )
+    return subgenre_cache[genre]
+
+def merge_timeline(days, cum, new_days, new_codes):
+    """
+    Ajoute des chansons à une chronologie de comptes cumulés
+
+    Args
+    ----
+    days : np.ndarray
+        Jours de sortie distincts triés (int64, en ns)
+    cum : np.ndarray
+        Comptes cumulés (jours x sous-genres)
+    new_days : np.ndarray
+        Jour de sortie de chaque nouvelle chanson (int64, en ns)
+    new_codes : np.ndarray
+        Indice local du sous-genre de chaque nouvelle chanson
+
+    Returns
+    -------
+    np.ndarray, np.ndarray
+        Jours et comptes cumulés, nouveaux jours compris
+    """
+    merged_days = np.union1d(days, new_days)
+    counts = np.zeros((len(merged_days), cum.shape[1]), dtype=np.int64)
+    counts[np.searchsorted(merged_days, days)] = np.diff(cum, axis=0, prepend=np.zeros((1, cum.shape[1]), dtype=cum.dtype))
+    np.add.at(counts, (np.searchsorted(merged_days, new_days), new_codes), 1)
+    return merged_days, np.cumsum(counts, axis=0).astype(cum.dtype)
+
+
+@dataset.on_append
+def append_rows(batch):
+    """
+    Ajoute un lot de nouvelles chansons aux comptes par décennie et aux
+    chronologies des genres et des couples (artiste, genre) touchés. Seules
+    les figures des genres du lot sont retirées du cache. Une chanson d'un
+    sous-genre inconnu du genre ne compte que par décennie (les chronologies
+    ont une colonne par sous-genre connu) ; l'index de recherche des artistes
+    est reconstruit au prochain démarrage.
+    """
+    global decade_totals, decade_counts
+    batch = dataset.clean_chunk(batch, min_year=1970, dates=dataset.parse_release_dates, compact=False)
+    if batch.empty:
+        return
+    decade_totals = dataset.add_totals(decade_totals, count_decades(batch))
+    decade_counts = dataset.as_frame(decade_totals, name="count")
+
+    codes = np.array([
+        subgenres_by_genre[genre].index(subgenre) if subgenre in subgenres_by_genre.get(genre, []) else -1
+        for genre, subgenre in zip(batch["playlist_genre"], batch["playlist_subgenre"])
+    ])
+    known = batch.assign(code=codes, day=batch["track_album_release_date"].to_numpy().astype("datetime64[ns]").astype("int64"))
+    known = known[known["code"] >= 0]
+    for genre, rows in known.groupby("playlist_genre"):
+        timeline = genre_timelines[genre]
+        days, cum = merge_timeline(timeline["days"], timeline["cum"], rows["day"].to_numpy(), rows["code"].to_numpy())
+        genre_timelines[genre] = {**timeline, "days": days, "cum": cum}
+    for (artist, genre), rows in known.groupby(["track_artist", "playlist_genre"]):
+        days, cum = get_artist_timeline(artist, genre)
+        if not len(days):
+            cum = np.zeros((0, len(subgenres_by_genre[genre])), dtype=np.int32)
+        artist_timeline_updates[(artist, genre)] = merge_timeline(days, cum, rows["day"].to_numpy(), rows["code"].to_numpy())
+
+    get_figure_genre.cache_clear()
+    for genre in batch["playlist_genre"].dropna().unique():
+        subgenre_cache.pop(genre, None)
+
+
+@dataset.on_reload
+def reload_data():
+    """
+    Chronologies, index de recherche et comptes de la nouvelle version du
+    jeu de données ; renvoie la fonction qui les met en place (les lignes
+    lues sont libérées au retour)
+    """
+    new_data = load_data()
+    new_subgenres, new_codes = get_subgenre_codes(new_data)
+    new_width = max(len(subgenres) for subgenres in new_subgenres.values())
+    new_color_map = get_color_map(new_data)
+    new_genre_timelines = build_genre_timelines(new_data, new_subgenres, new_codes, new_width)
+    new_artists = dataset.load_artists()
+    new_artist_timelines = build_artist_timelines(new_data, new_artists, new_codes, new_width)
+    new_search_index = build_artist_search_index(new_data)
+    new_decade_totals = read_decade_totals()
+    new_decade_counts = dataset.as_frame(new_decade_totals, name="count")
+
+    def swap():
+        global color_map, subgenres_by_genre, n_subgenres, genre_timelines
+        global artist_timelines, artist_timeline_updates, artist_search_index, decade_totals, decade_counts
+        global artists
+        color_map, artists = new_color_map, new_artists
+        subgenres_by_genre, n_subgenres = new_subgenres, new_width
+        genre_timelines, artist_timelines, artist_timeline_updates = new_genre_timelines, new_artist_timelines, {}
+        artist_search_index = new_search_index
+        decade_totals, decade_counts = new_decade_totals, new_decade_counts
+        get_figure_genre.cache_clear()
+        subgenre_cache.clear()
+    return swap
+
 
 def get_hover_template(type_name):
     return (
@@ -275,89 +672,148 @@ def get_hover_template_custom(type_name):
     )
 
 
-layout = html.Div([
-    html.H1("Adaptation des artistes à l'évolution des goûts musicaux"),
-    html.Div([
-        dcc.Graph(id="graph-q8", figure=get_figure_genre())
-    ], style={'width': '50%', 'display': 'inline-block'}),
-    html.Div([
-        dcc.Markdown("""
-        ### Analyse de l'évolution des genres des artistes
+def layout():
+    return html.Div([
+        html.H1("Adaptation des artistes à l'évolution des goûts musicaux"),
+        html.Div([
+            dcc.Graph(id="graph-q8", figure=get_figure_genre())
+        ], style={'width': '50%', 'display': 'inline-block'}),
+        html.Div([
+            dcc.Markdown("""
+            ### Analyse de l'évolution des genres des artistes
                      
-        Il est maintenant possible de s'attarder non plus sur les caractéristiques des musiques elles-mêmes, mais sur l'évolution des artistes et des genres qu'ils créent.
+            Il est maintenant possible de s'attarder non plus sur les caractéristiques des musiques elles-mêmes, mais sur l'évolution des artistes et des genres qu'ils créent.
                      
-        On peut y apprendre de nombreux éléments sur l'évolution des goûts musicaux. 
-        Par exemple, le rock semblait être le plus populaire dans les années 1970 (on peut alors penser à l'apparition de groupes comme les Rolling Stones, U2 ou Radiohead…)
-        alors que l'EDM a lui émergé dans les années 2000.
-        """),
-        html.Br(),
-        dcc.Markdown("""
-        Vous pouvez **choisir un genre** en particulier pour observer les évolutions de ses sous-genres, ainsi que choisir un des artistes de ce genre pour observer l'évolution de sa discographie !
+            On peut y apprendre de nombreux éléments sur l'évolution des goûts musicaux. 
+            Par exemple, le rock semblait être le plus populaire dans les années 1970 (on peut alors penser à l'apparition de groupes comme les Rolling Stones, U2 ou Radiohead…)
+            alors que l'EDM a lui émergé dans les années 2000.
+            """),
+            html.Br(),
+            dcc.Markdown("""
+            Vous pouvez **choisir un genre** en particulier pour observer les évolutions de ses sous-genres, ainsi que choisir un des artistes de ce genre pour observer l'évolution de sa discographie !
         
-        *Il est ainsi possible de remarquer par exemple que pour le rap, le hip-hop qui représente aujourd'hui la majeure partie du genre, n'existait pas avant les années 1990 !*
-        """)
-        ],
-    style={'width': '50%', 'display': 'inline-block', 'verticalAlign': 'top', "marginTop": "50px", 'color': 'white'}),
-    # TODO : à compléter
-    html.Div([
-        html.H4("Sélectionnez votre genre et votre artiste préféré et voyez si votre idole suit le flow !", style={"textAlign": "center", "margin": "20px 0"})
-    ]),
-
-    # Graphes des sous-genres et artistes
-    html.Div([
+            *Il est ainsi possible de remarquer par exemple que pour le rap, le hip-hop qui représente aujourd'hui la majeure partie du genre, n'existait pas avant les années 1990 !*
+            """)
+            ],
+        style={'width': '50%', 'display': 'inline-block', 'verticalAlign': 'top', "marginTop": "50px", 'color': 'white'}),
+        # TODO : à compléter
         html.Div([
-            html.Label("Sélectionnez un genre:", style={"color": "white"}),
-            dcc.Dropdown(
-                id='genre_dropdown',
-                options=[{'label': g.capitalize(), 'value': g,} for g in ['edm', 'latin', 'pop', 'r&b', 'rap', 'rock']],
-                placeholder="Sélectionnez un genre",
-                style={"width": "80%"},
-                className='custom-dropdown'
-            ),
-            
-            dcc.Graph(id='subgenre_graph-q15')
-        ], style={"width": "50%", "display": "inline-block", "verticalAlign": "top", "padding": "10px"}),
+            html.H4("Sélectionnez votre genre et votre artiste préféré et voyez si votre idole suit le flow !", style={"textAlign": "center", "margin": "20px 0"})
+        ]),
 
+        # Graphes des sous-genres et artistes
         html.Div([
-            html.Label("Sélectionnez un artiste:", style={"color": "white"}),
-            dcc.Dropdown(
-                id='artist_dropdown',
-                placeholder="Sélectionnez un artiste",
-                optionHeight=35,
-                style={"width": "80%"},
-                className='custom-dropdown'
-            ),
-            dcc.Graph(id='artist_subgenre_graph')
-        ], style={"width": "50%", "display": "inline-block", "verticalAlign": "top", "padding": "10px"})
-    ], style={"display": "flex", "flex-direction": "row"})
-])
+            html.Div([
+                html.Label("Sélectionnez un genre:", style={"color": "white"}),
+                dcc.Dropdown(
+                    id='genre_dropdown',
+                    options=[{'label': g.capitalize(), 'value': g,} for g in ['edm', 'latin', 'pop', 'r&b', 'rap', 'rock']],
+                    placeholder="Sélectionnez un genre",
+                    style={"width": "80%"},
+                    className='custom-dropdown'
+                ),
+            
+                dcc.Graph(id='subgenre_graph-q15'),
+                html.Label("Nombre de périodes :", style={"color": "white"}),
+                dcc.Slider(
+                    id='bins_slider-q14',
+                    min=2, max=50, step=1, value=10,
+                    marks={n: {'label': str(n), 'style': {'color': 'white'}} for n in [2, 10, 20, 30, 40, 50]},
+                    disabled=True,
+                    updatemode='drag'
+                ),
+                html.Label("Fenêtre temporelle :", style={"color": "white"}),
+                dcc.RangeSlider(
+                    id='window_slider-q14',
+                    min=0, max=1, value=[0, 1],
+                    allowCross=False,
+                    disabled=True,
+                    updatemode='drag'
+                )
+            ], style={"width": "50%", "display": "inline-block", "verticalAlign": "top", "padding": "10px"}),
+
+            html.Div([
+                html.Label("Sélectionnez un artiste:", style={"color": "white"}),
+                dcc.Dropdown(
+                    id='artist_dropdown',
+                    placeholder="Sélectionnez un artiste",
+                    optionHeight=35,
+                    style={"width": "80%"},
+                    className='custom-dropdown'
+                ),
+                dcc.Graph(id='artist_subgenre_graph')
+            ], style={"width": "50%", "display": "inline-block", "verticalAlign": "top", "padding": "10px"})
+        ], style={"display": "flex", "flex-direction": "row"})
+    ])
 
 
 
 
 def register_callbacks(app):
-# Callback to update the artist dropdown based on the selected genre
+# Callback to update the artist dropdown based on the selected genre and the search text
     @app.callback(
         [Output('artist_dropdown', 'options'),
         Output('artist_dropdown', 'value')],
-        [Input('genre_dropdown', 'value')]
+        [Input('genre_dropdown', 'value'),
+        Input('artist_dropdown', 'search_value')],
+        State('artist_dropdown', 'value')
     )
-    def update_artist_options(selected_genre):
+    def update_artist_options(selected_genre, search_value, selected_artist):
         if not selected_genre:
             return [], None
-        data = get_dataframe("./dataset/spotify_songs_clean.csv")
-        data = data[data["playlist_genre"] == selected_genre] # Filtrage par genre des chansons
-        artist_counts = data.groupby("track_artist")["track_name"].nunique().reset_index(name="song_count")
-        artist_counts = artist_counts.sort_values("song_count", ascending=False)
-        options = [{'label': artist, 'value': artist} for artist in artist_counts["track_artist"]] # Création des options pour le dropdown
-        return options, None
+        genre_changed = ctx.triggered_id != 'artist_dropdown'
+        if genre_changed:
+            search_value, selected_artist = None, None
+
+        artists = search_artists(selected_genre, search_value) # Meilleurs résultats seulement
+        if selected_artist and selected_artist not in artists:
+            artists.append(selected_artist) # L'artiste sélectionné doit rester dans les options
+        options = [{'label': artist, 'value': artist} for artist in artists] # Création des options pour le dropdown
+        return options, None if genre_changed else no_update
     
+    # Callback to fit the time window controls to the selected genre and artist
     @app.callback(
-        Output('subgenre_graph-q15', 'figure'),
+        [Output('window_slider-q14', 'min'),
+        Output('window_slider-q14', 'max'),
+        Output('window_slider-q14', 'value'),
+        Output('window_slider-q14', 'marks'),
+        Output('window_slider-q14', 'disabled'),
+        Output('bins_slider-q14', 'disabled')],
         [Input('genre_dropdown', 'value'),
         Input('artist_dropdown', 'value')]
     )
-    def update_subgenre_graph(selected_genre, selected_artist):
+    def update_window_controls(selected_genre, selected_artist):
+        artist_days = get_artist_timeline(selected_artist, selected_genre)[0] if selected_genre and selected_artist else []
+        if len(artist_days) == 0:
+            return no_update, no_update, no_update, no_update, True, True
+
+        genre_days = genre_timelines[selected_genre]["days"]
+        start_day, end_day = int(genre_days[0] // NS_PER_DAY), int(genre_days[-1] // NS_PER_DAY)
+        window = [int(artist_days[0] // NS_PER_DAY), int(artist_days[-1] // NS_PER_DAY)]
+        return start_day, end_day, window, get_window_marks(start_day, end_day), False, False
+
+    @app.callback(
+        Output('subgenre_graph-q15', 'figure'),
+        [Input('genre_dropdown', 'value'),
+        Input('artist_dropdown', 'value'),
+        Input('bins_slider-q14', 'value'),
+        Input('window_slider-q14', 'value')]
+    )
+    def update_subgenre_graph(selected_genre, selected_artist, bins, window):
+        selection_changed = any(
+            prop in ctx.triggered_prop_ids for prop in ('genre_dropdown.value', 'artist_dropdown.value')
+        )
+        if selected_genre and selected_artist and ctx.triggered_id and not selection_changed:
+            # Seules les données des traces changent : on les envoie sans reconstruire la figure
+            start_date, end_date = (pd.Timestamp(day * NS_PER_DAY) for day in window)
+            bin_midpoints, percentages, _ = compute_custom_bins(selected_genre, bins, start_date, end_date)
+            patch = Patch()
+            for i, subgenre in enumerate(subgenres_by_genre[selected_genre]):
+                patch["data"][i]["x"] = bin_midpoints
+                patch["data"][i]["y"] = percentages[:, i]
+                patch["data"][i]["customdata"] = [[subgenre]] * bins
+            return patch
+
         if not selected_genre:
             fig = px.area()
             fig.add_annotation(dict(xref="paper", yref="paper", x=0.5, y=0.5),
@@ -374,11 +830,10 @@ def register_callbacks(app):
             return fig
 
         if selected_artist: # Mise à jour du graphe avec les ranges de l'artiste
-            data = get_dataframe("./dataset/spotify_songs_clean.csv")
-            data_artist = data[(data["playlist_genre"] == selected_genre) &(data["track_artist"] == selected_artist)]
+            artist_days, _ = get_artist_timeline(selected_artist, selected_genre)
             
-            if data_artist.empty:
-                fig = subgenre_cache[selected_genre]
+            if len(artist_days) == 0:
+                fig = get_subgenre_figure(selected_genre)
                 fig.update_layout(
                     title_font=dict(color='white'),
                     legend_title=dict(font=dict(color='white')),
@@ -389,23 +844,22 @@ def register_callbacks(app):
                     yaxis=dict(showgrid=True, title_font=dict(color='white'), tickfont=dict(color='white'))
                 )
             else:
-                artist_min = data_artist["track_album_release_date"].min()
-                artist_max = data_artist["track_album_release_date"].max()
+                artist_min = pd.Timestamp(artist_days[0])
+                artist_max = pd.Timestamp(artist_days[-1])
                 genre_data, _ = data_preprocess_custom(
-                    "./dataset/spotify_songs_clean.csv", 
                     selected_genre, 
-                    bins=10, 
+                    bins=bins or 10, 
                     start_date=artist_min, 
                     end_date=artist_max
                 )
-                genre_data["time_bin"] = pd.to_datetime(genre_data["time_bin"])
                 fig = px.area(
                     genre_data, 
                     x="time_bin", y="percentage", 
                     color="playlist_subgenre",
                     line_group="playlist_subgenre", 
                     hover_data=["playlist_subgenre"],
-                    color_discrete_map=color_map
+                    color_discrete_map=color_map,
+                    category_orders={"playlist_subgenre": subgenres_by_genre[selected_genre]}
                 )
 
                 fig.update_traces(hovertemplate=get_hover_template_custom(selected_genre))
@@ -425,7 +879,7 @@ def register_callbacks(app):
 
                 fig.update_xaxes(title_text="Date", tickformat="%Y")
         else:
-            fig = subgenre_cache[selected_genre]
+            fig = get_subgenre_figure(selected_genre)
             fig.update_layout(
                     title_font=dict(color='white'),
                     legend_title=dict(font=dict(color='white')),
@@ -461,7 +915,7 @@ def register_callbacks(app):
             return fig
 
         # Proportions cumulées des sous-genres pour l'artiste
-        artist_data = data_preprocess_artist_cumulative("./dataset/spotify_songs_clean.csv", selected_artist, selected_genre)
+        artist_data = data_preprocess_artist_cumulative(selected_artist, selected_genre)
         
         # Création du graphique
         fig = px.area(artist_data, x="formatted_date", y="percentage", color="playlist_subgenre",
@@ -2,7 +2,8 @@ import dash
 from dash import dcc, html, Input, Output, State
 import plotly.graph_objs as go
 import numpy as np
-import pandas as pd
+
+from .figure_cache import memoize
 
 button_style = {
     'backgroundColor': '#222',
@@ -17,24 +18,6 @@ button_style = {
 }
 
 
-# Load dataset
-def get_dataframe(path):
-    """Load and preprocess the Spotify dataset."""
-    data = pd.read_csv(path)
-    data["track_album_release_date"] = pd.to_datetime(data["track_album_release_date"])
-    # data = data.groupby("playlist_genre").apply(lambda x: x.nlargest("track_popularity")).reset_index(drop=True)
-    # excluded_artists = [
-    #     "The Sleep Specialist", "Nature Sounds", "Natural Sound Makers", "Mother Nature Sound FX",
-    #     "Rain Recordings", "Pinetree Way", "Aquagirl", "Rain Sounds FX", "Relax Meditate Sleep",
-    #     "Life Sounds Nature"
-    # ]
-    # data = data[~data["track_artist"].isin(excluded_artists)]
-    data = data[data["track_album_release_date"].dt.year >= 1970]
-    return data
-
-# Load data
-data = get_dataframe("dataset/spotify_songs_clean.csv")
-
 # Define matrix size
 x_size = 10
 y_size = 6
@@ -237,6 +220,142 @@ layout = html.Div([
 ])
 
 
+@memoize(maxsize=32)
+def get_column_outputs(selected_column, colors_key):
+    """
+    Sorties du callback de navigation pour une colonne (None pour la vue d'ensemble).
+    Mémoïsé : colors_key est la grille du color-store en tuples.
+    """
+    stored_colors = np.array(colors_key)
+
+    if selected_column is None:
+        return (
+            "Explorez avec les flèches",
+            create_figure(stored_colors),
+            None,
+            "La pop, latin et R&B partagent des caractéristiques communes, tandis que les autres genres se distinguent davantage par des particularités propres."
+        )
+    
+    selected_characteristic = x_labels[selected_column]
+    temp_colors = stored_colors.copy()
+
+    rock_idx = 0
+    edm_idx = 1
+    rap_idx = 2
+    rb_idx = 3
+    latin_idx = 4
+    pop_idx = 5
+
+    loudness_idx = x_labels.index("loudness")
+    energy_idx = x_labels.index("energy")
+    acousticness_idx = x_labels.index("acousticness")
+    valence_idx = x_labels.index("valence")
+    danceability_idx = x_labels.index("danceability")
+    tempo_idx = x_labels.index("tempo")
+    instrumentalness_idx = x_labels.index("instrumentalness")
+    duration_idx = x_labels.index("duration_ms")
+    speechiness_idx = x_labels.index("speechiness")
+    liveness_idx = x_labels.index("liveness")
+
+    correlations = {
+        pop_idx: {
+            (loudness_idx, energy_idx): 0.67,
+            (acousticness_idx, energy_idx): -0.53,
+            (acousticness_idx, loudness_idx): -0.36,
+            (valence_idx, energy_idx): 0.36,
+            (valence_idx, danceability_idx): 0.34,
+            (valence_idx, loudness_idx): 0.28,
+            (tempo_idx, danceability_idx): -0.24
+        },
+        rap_idx: {
+            (loudness_idx, energy_idx): 0.69,
+            (instrumentalness_idx, loudness_idx): -0.42,
+            (instrumentalness_idx, energy_idx): -0.36,
+            (valence_idx, energy_idx): 0.35,
+            (instrumentalness_idx, acousticness_idx): 0.31,
+            (acousticness_idx, energy_idx): -0.3,
+            (acousticness_idx, loudness_idx): -0.26
+        },
+        rock_idx: {
+            (loudness_idx, energy_idx): 0.76,
+            (acousticness_idx, energy_idx): -0.62,
+            (valence_idx, danceability_idx): 0.53,
+            (acousticness_idx, loudness_idx): -0.49,
+            (energy_idx, speechiness_idx): 0.29,
+            (tempo_idx, danceability_idx): -0.25,
+            (speechiness_idx, loudness_idx): 0.22,
+            (duration_idx, valence_idx): -0.22,
+            (tempo_idx, speechiness_idx): 0.21
+        },
+        latin_idx: {
+            (loudness_idx, energy_idx): 0.7,
+            (acousticness_idx, energy_idx): -0.45,
+            (valence_idx, energy_idx): 0.4,
+            (acousticness_idx, loudness_idx): -0.33,
+            (valence_idx, danceability_idx): 0.32,
+            (valence_idx, loudness_idx): 0.29,
+            (tempo_idx, danceability_idx): -0.22
+        },
+        rb_idx: {
+            (loudness_idx, energy_idx): 0.68,
+            (acousticness_idx, energy_idx): -0.57,
+            (valence_idx, energy_idx): 0.43,
+            (valence_idx, danceability_idx): 0.42,
+            (acousticness_idx, loudness_idx): -0.4,
+            (acousticness_idx, danceability_idx): -0.37,
+            (valence_idx, loudness_idx): 0.24,
+            (energy_idx, danceability_idx): 0.23,
+            (tempo_idx, acousticness_idx): -0.22,
+            (loudness_idx, danceability_idx): 0.21
+        },
+        edm_idx: {
+            (loudness_idx, energy_idx): 0.66,
+            (acousticness_idx, energy_idx): -0.42,
+            (valence_idx, danceability_idx): 0.38,
+            (duration_idx, loudness_idx): -0.3,
+            (duration_idx, instrumentalness_idx): 0.28,
+            (acousticness_idx, loudness_idx): -0.25,
+            (instrumentalness_idx, loudness_idx): -0.21,
+            (tempo_idx, energy_idx): 0.19,
+            (liveness_idx, energy_idx): 0.19,
+            (loudness_idx, liveness_idx): 0.18
+        }
+    }
+
+    def update_colors(selected_characteristic, temp_colors):
+        selected_idx = x_labels.index(selected_characteristic)
+        for genre, correlations_dict in correlations.items():
+            for (feature1, feature2), value in correlations_dict.items():
+                if selected_idx in (feature1, feature2):
+                    target_feature = feature2 if feature1 == selected_idx else feature1 
+                    if temp_colors[genre, target_feature] != "white":
+                        temp_colors[genre, target_feature] = "#ff9999" if value < 0 else "#66a3ff"
+
+    update_colors(selected_characteristic, temp_colors)
+
+    for y in range(y_size):
+        if temp_colors[y, selected_column] != "white":
+            temp_colors[y, selected_column] = "#90EE90"
+
+    # Analyses par caractéristique
+        analyses = {
+            "loudness": "La loudness est un élément important pour tous les genres. Elle accompagne souvent l’énergie pour intensifier un morceau. Dans la Pop, le Latin ou le R&B, elle soutient des ambiances joyeuses, renforcées par une valence plus élevée. À l’inverse, la loudness s’atténue dans les morceaux plus acoustiques.",
+            "energy": "L’énergie constitue une caractéristique clé, notamment dans la Pop, le Latin et le R&B, où elle va de pair avec une forte loudness. Elle est généralement opposée à l’acousticness, révélant un contraste entre sons produits et ambiances acoustiques.",
+            "acousticness": "L’acousticness présente une corrélation négative avec l’énergie et le volume, traduisant une atmosphère plus douce et organique. Elle est peu présente dans les genres modernes et très produits comme l’EDM, la Pop ou le Rock.",
+            "valence": "La valence, reflet de la positivité émotionnelle, est une variable influente dans tous les genres. Elle est souvent renforcée par l’énergie et la danceability, ce qui en fait un indicateur clé des morceaux joyeux et entraînants.",
+            "danceability": "La danceability est largement valorisée dans la plupart des genres — sauf le Rap — pour générer une ambiance positive. En R&B, elle occupe une place centrale et dépend de multiples facteurs comme l’énergy ou la loudness, illustrant une richesse musicale.",
+            "tempo": "Le tempo intervient comme un facteur structurant dans tous les styles, à l’exception du Rap. Un rythme trop rapide peut limiter la danceability dans certains genres (Pop, Latin, EDM), mais dans l’EDM, il soutient directement l’energy.",
+            "instrumentalness": "L’instrumentalness se révèle importante dans l’EDM et le Rap, bien que de façon opposée : l’EDM favorise les sons artificiels puissants, tandis que le Rap alterne entre morceaux vocaux dominants et productions plus instrumentales.",
+            "duration_ms": "La durée des morceaux joue un rôle secondaire, sauf en EDM et en Rock. Dans ces styles, des morceaux plus courts peuvent amplifier l’impact sonore et émotionnel, en accentuant la puissance ou la positivité du morceau.",
+            "speechiness": "La speechiness est une dimension particulièrement marquée dans le Rock, où les passages parlés apportent intensité et énergie. Elle contribue à renforcer le lien avec l’auditeur.",
+            "liveness": "L’EDM se distingue par sa liveness, suggérant une forte interaction avec le public. Cela renforce l’effet de loudness et d’énergy, en particulier lorsqu’une ambiance de concert est recréée à l’écoute."
+        }
+
+    analysis = analyses.get(selected_characteristic, "")
+
+    return selected_characteristic.capitalize(), create_figure(temp_colors), selected_column, analysis
+
+
 def register_callbacks(app):
     @app.callback(
         Output("selected-feature-display", "children"),
@@ -249,8 +368,6 @@ def register_callbacks(app):
         State("color-store", "data")
     )
     def navigate_columns(prev_clicks, next_clicks, selected_column, stored_colors):
-        stored_colors = np.array(stored_colors)
-
         all_columns = [None] + list(range(len(x_labels)))
         ctx = dash.callback_context
         button_id = ctx.triggered[0]["prop_id"].split(".")[0] if ctx.triggered else None
@@ -265,129 +382,4 @@ def register_callbacks(app):
 
         selected_column = all_columns[new_index]
 
-        if selected_column is None:
-            return (
-                "Explorez avec les flèches",
-                create_figure(stored_colors),
-                None,
-                "La pop, latin et R&B partagent des caractéristiques communes, tandis que les autres genres se distinguent davantage par des particularités propres."
-            )
-        
-        selected_characteristic = x_labels[selected_column]
-        temp_colors = stored_colors.copy()
-
-        rock_idx = 0
-        edm_idx = 1
-        rap_idx = 2
-        rb_idx = 3
-        latin_idx = 4
-        pop_idx = 5
-
-        loudness_idx = x_labels.index("loudness")
-        energy_idx = x_labels.index("energy")
-        acousticness_idx = x_labels.index("acousticness")
-        valence_idx = x_labels.index("valence")
-        danceability_idx = x_labels.index("danceability")
-        tempo_idx = x_labels.index("tempo")
-        instrumentalness_idx = x_labels.index("instrumentalness")
-        duration_idx = x_labels.index("duration_ms")
-        speechiness_idx = x_labels.index("speechiness")
-        liveness_idx = x_labels.index("liveness")
-
-        correlations = {
-            pop_idx: {
-                (loudness_idx, energy_idx): 0.67,
-                (acousticness_idx, energy_idx): -0.53,
-                (acousticness_idx, loudness_idx): -0.36,
-                (valence_idx, energy_idx): 0.36,
-                (valence_idx, danceability_idx): 0.34,
-                (valence_idx, loudness_idx): 0.28,
-                (tempo_idx, danceability_idx): -0.24
-            },
-            rap_idx: {
-                (loudness_idx, energy_idx): 0.69,
-                (instrumentalness_idx, loudness_idx): -0.42,
-                (instrumentalness_idx, energy_idx): -0.36,
-                (valence_idx, energy_idx): 0.35,
-                (instrumentalness_idx, acousticness_idx): 0.31,
-                (acousticness_idx, energy_idx): -0.3,
-                (acousticness_idx, loudness_idx): -0.26
-            },
-            rock_idx: {
-                (loudness_idx, energy_idx): 0.76,
-                (acousticness_idx, energy_idx): -0.62,
-                (valence_idx, danceability_idx): 0.53,
-                (acousticness_idx, loudness_idx): -0.49,
-                (energy_idx, speechiness_idx): 0.29,
-                (tempo_idx, danceability_idx): -0.25,
-                (speechiness_idx, loudness_idx): 0.22,
-                (duration_idx, valence_idx): -0.22,
-                (tempo_idx, speechiness_idx): 0.21
-            },
-            latin_idx: {
-                (loudness_idx, energy_idx): 0.7,
-                (acousticness_idx, energy_idx): -0.45,
-                (valence_idx, energy_idx): 0.4,
-                (acousticness_idx, loudness_idx): -0.33,
-                (valence_idx, danceability_idx): 0.32,
-                (valence_idx, loudness_idx): 0.29,
-                (tempo_idx, danceability_idx): -0.22
-            },
-            rb_idx: {
-                (loudness_idx, energy_idx): 0.68,
-                (acousticness_idx, energy_idx): -0.57,
-                (valence_idx, energy_idx): 0.43,
-                (valence_idx, danceability_idx): 0.42,
-                (acousticness_idx, loudness_idx): -0.4,
-                (acousticness_idx, danceability_idx): -0.37,
-                (valence_idx, loudness_idx): 0.24,
-                (energy_idx, danceability_idx): 0.23,
-                (tempo_idx, acousticness_idx): -0.22,
-                (loudness_idx, danceability_idx): 0.21
-            },
-            edm_idx: {
-                (loudness_idx, energy_idx): 0.66,
-                (acousticness_idx, energy_idx): -0.42,
-                (valence_idx, danceability_idx): 0.38,
-                (duration_idx, loudness_idx): -0.3,
-                (duration_idx, instrumentalness_idx): 0.28,
-                (acousticness_idx, loudness_idx): -0.25,
-                (instrumentalness_idx, loudness_idx): -0.21,
-                (tempo_idx, energy_idx): 0.19,
-                (liveness_idx, energy_idx): 0.19,
-                (loudness_idx, liveness_idx): 0.18
-            }
-        }
-
-        def update_colors(selected_characteristic, temp_colors):
-            selected_idx = x_labels.index(selected_characteristic)
-            for genre, correlations_dict in correlations.items():
-                for (feature1, feature2), value in correlations_dict.items():
-                    if selected_idx in (feature1, feature2):
-                        target_feature = feature2 if feature1 == selected_idx else feature1 
-                        if temp_colors[genre, target_feature] != "white":
-                            temp_colors[genre, target_feature] = "#ff9999" if value < 0 else "#66a3ff"
-
-        update_colors(selected_characteristic, temp_colors)
-
-        for y in range(y_size):
-            if temp_colors[y, selected_column] != "white":
-                temp_colors[y, selected_column] = "#90EE90"
-
-        # Analyses par caractéristique
-            analyses = {
-                "loudness": "La loudness est un élément important pour tous les genres. Elle accompagne souvent l’énergie pour intensifier un morceau. Dans la Pop, le Latin ou le R&B, elle soutient des ambiances joyeuses, renforcées par une valence plus élevée. À l’inverse, la loudness s’atténue dans les morceaux plus acoustiques.",
-                "energy": "L’énergie constitue une caractéristique clé, notamment dans la Pop, le Latin et le R&B, où elle va de pair avec une forte loudness. Elle est généralement opposée à l’acousticness, révélant un contraste entre sons produits et ambiances acoustiques.",
-                "acousticness": "L’acousticness présente une corrélation négative avec l’énergie et le volume, traduisant une atmosphère plus douce et organique. Elle est peu présente dans les genres modernes et très produits comme l’EDM, la Pop ou le Rock.",
-                "valence": "La valence, reflet de la positivité émotionnelle, est une variable influente dans tous les genres. Elle est souvent renforcée par l’énergie et la danceability, ce qui en fait un indicateur clé des morceaux joyeux et entraînants.",
-                "danceability": "La danceability est largement valorisée dans la plupart des genres — sauf le Rap — pour générer une ambiance positive. En R&B, elle occupe une place centrale et dépend de multiples facteurs comme l’énergy ou la loudness, illustrant une richesse musicale.",
-                "tempo": "Le tempo intervient comme un facteur structurant dans tous les styles, à l’exception du Rap. Un rythme trop rapide peut limiter la danceability dans certains genres (Pop, Latin, EDM), mais dans l’EDM, il soutient directement l’energy.",
-                "instrumentalness": "L’instrumentalness se révèle importante dans l’EDM et le Rap, bien que de façon opposée : l’EDM favorise les sons artificiels puissants, tandis que le Rap alterne entre morceaux vocaux dominants et productions plus instrumentales.",
-                "duration_ms": "La durée des morceaux joue un rôle secondaire, sauf en EDM et en Rock. Dans ces styles, des morceaux plus courts peuvent amplifier l’impact sonore et émotionnel, en accentuant la puissance ou la positivité du morceau.",
-                "speechiness": "La speechiness est une dimension particulièrement marquée dans le Rock, où les passages parlés apportent intensité et énergie. Elle contribue à renforcer le lien avec l’auditeur.",
-                "liveness": "L’EDM se distingue par sa liveness, suggérant une forte interaction avec le public. Cela renforce l’effet de loudness et d’énergy, en particulier lorsqu’une ambiance de concert est recréée à l’écoute."
-            }
-
-        analysis = analyses.get(selected_characteristic, "")
-
-        return selected_characteristic.capitalize(), create_figure(temp_colors), selected_column, analysis
+        return get_column_outputs(selected_column, tuple(map(tuple, stored_colors)))
@@ -7,15 +7,63 @@ import plotly.express as px
 import plotly.graph_objects as go
 from statsmodels.nonparametric.smoothers_lowess import lowess
 
-def generate_duration_popularity_plot():
-    data = pd.read_csv("./dataset/spotify_songs_clean.csv")
+from . import dataset
+from .figure_cache import memoize
+
+def aggregate_chunk(data):
+    """
+    Somme et nombre des popularités, et nombre de morceaux, par quart de minute de durée
+    pour un morceau du jeu de données
+    """
     data["duration_min"] = data["duration_ms"] / 60000
     data["duration_bin"] = (data["duration_min"] * 4).round() / 4
 
-    grouped_data = data.groupby("duration_bin", as_index=False).agg({
-        "track_popularity": "mean",
-        "track_id": "count"
-    }).rename(columns={"track_id": "count"})
+    grouped = data.groupby("duration_bin")
+    return pd.DataFrame({
+        "popularity_sum": grouped["track_popularity"].sum(),
+        "popularity_count": grouped["track_popularity"].count(),
+        "count": grouped["track_id"].count(),
+    })
+
+def read_duration_totals():
+    """Totaux par tranche de durée, agrégés par morceaux du jeu de données."""
+    chunks = dataset.iter_clean_chunks(["duration_ms", "track_popularity", "track_id"])
+    return dataset.combine(aggregate_chunk(chunk) for chunk in chunks)
+
+duration_totals = None
+
+def get_duration_totals():
+    """Totaux par tranche de durée, calculés à la première demande."""
+    global duration_totals
+    if duration_totals is None:
+        duration_totals = read_duration_totals()
+    return duration_totals
+
+@dataset.on_append
+def append_rows(batch):
+    """Ajoute un lot de nouvelles chansons aux totaux par tranche de durée."""
+    global duration_totals
+    duration_totals = dataset.add_totals(get_duration_totals(), aggregate_chunk(dataset.clean_chunk(batch)))
+    generate_duration_popularity_plot.cache_clear()
+
+@dataset.on_reload
+def reload_data():
+    """Totaux recalculés sur la nouvelle version du jeu de données ; renvoie la fonction qui les met en place."""
+    totals = read_duration_totals()
+
+    def swap():
+        global duration_totals
+        duration_totals = totals
+        generate_duration_popularity_plot.cache_clear()
+    return swap
+
+@memoize(maxsize=1)
+def generate_duration_popularity_plot():
+    totals = get_duration_totals()
+    grouped_data = pd.DataFrame({
+        "track_popularity": totals["popularity_sum"] / totals["popularity_count"],
+        "count": totals["count"],
+    }).reset_index()
 
     grouped_data["duration_bin"] = grouped_data["duration_bin"].round(2)
     grouped_data["track_popularity"] = grouped_data["track_popularity"].round(2)
@@ -94,19 +142,20 @@ En termes de popularité globale sur les plateformes, **le format court gagne la
     """)
 ], style={'padding': '20px', 'backgroundColor': '#121212', 'borderRadius': '8px', 'marginLeft': '5%', 'marginRight': '5%'})
 
-layout = html.Div([
-    html.H1("Durée des morceaux et popularité", style={"textAlign": "left", "color": "white"}),
-
-    html.Div([
-        html.Div([
-            narrative_q4
-        ], style={'width': '40%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '10px'}),
+def layout():
+    return html.Div([
+        html.H1("Durée des morceaux et popularité", style={"textAlign": "left", "color": "white"}),
 
         html.Div([
-            dcc.Graph(id='scatter-duration-popularity', figure=generate_duration_popularity_plot())
-        ], style={'width': '60%', 'display': 'inline-block'})
+            html.Div([
+                narrative_q4
+            ], style={'width': '40%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginTop': '10px'}),
+
+            html.Div([
+                dcc.Graph(id='scatter-duration-popularity', figure=generate_duration_popularity_plot())
+            ], style={'width': '60%', 'display': 'inline-block'})
+        ])
     ])
-])
 
 def register_callbacks(app):
     pass
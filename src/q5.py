@@ -5,28 +5,34 @@ from dash.dependencies import Input, Output
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
-def load_and_clean_data(filepath="./dataset/spotify_songs_clean.csv"):
-    df = pd.read_csv(filepath)
-    df = preprocess_dates(df)
-    return df
+from . import dataset
+from .figure_cache import memoize
 
 def preprocess_dates(df):
-    df["track_album_release_date"] = pd.to_datetime(df["track_album_release_date"], errors='coerce') #conversion en datetime
     df = df[df["track_album_release_date"].notna() & (df["track_album_release_date"].dt.month.notna())] 
     df["year_month"] = df["track_album_release_date"].dt.to_period('M')
     df = df[df["year_month"] > '2000-01'] #filtre pour ne garder que les dates après 2000
     df["year_month"] = df["year_month"].astype(str)
     return df
 
-def filter_popular_songs(df):
+def aggregate_popular_songs(chunk, pairs):
+    """
+    Sommes et nombres de valeurs des chansons populaires par groupe de 3 ans et genre, pour un morceau brut.
+    Une chanson ne compte qu'une fois par genre, même si plusieurs playlists la contiennent
+    (pairs : couples (chanson, genre) déjà comptés).
+    """
     popularity_threshold = 50
     features = ["danceability", "energy", "speechiness", "liveness", "valence", "loudness"]
 
+    df = preprocess_dates(dataset.clean_chunk(chunk[pairs.first(chunk)]))
     df["year_month"] = pd.to_datetime(df["year_month"])
     df["year"] = df["year_month"].dt.year
     df["year_group"] = (df["year"] // 3) * 3
     
-    df_popular = df[df["track_popularity"] > popularity_threshold].groupby(["year_group", "playlist_genre"])[features].mean().reset_index()
+    return dataset.partial_sums(df[df["track_popularity"] > popularity_threshold], ["year_group", "playlist_genre"], features)
+
+def filter_popular_songs(totals):
+    df_popular = dataset.means(totals)
     df_popular["year_group"] = pd.to_datetime(df_popular["year_group"], format='%Y')
     return df_popular.sort_values("year_group")
 
@@ -41,9 +47,63 @@ def calculate_index(df_popular, base_year=1998):
             ) 
     return df_popular
 
-# data
-df = load_and_clean_data("./dataset/spotify_songs_clean.csv")
-df_popular = filter_popular_songs(df)
+# data, agrégées par morceaux du jeu de données
+columns = ["track_id", "track_album_release_date", "track_popularity", "playlist_genre",
+           "danceability", "energy", "speechiness", "liveness", "valence", "loudness"]
+def read_popular_totals():
+    """
+    Totaux, et couples (chanson, genre) comptés ; avec la base SQLite, les
+    totaux sont calculés par une requête et les couples lus à la première
+    demande (voir get_counted_pairs).
+    """
+    if dataset.SQLITE_PATH:
+        totals = dataset.query_sums(
+            {"year_group": "year / 3 * 3", "playlist_genre": "playlist_genre"}, columns[4:],
+            "first_pair AND release_date >= ? AND track_popularity > ?", ("2000-02-01", 50),
+        )
+        return totals, None
+    pairs = dataset.Distinct(["track_id", "playlist_genre"])
+    return dataset.combine(aggregate_popular_songs(chunk, pairs) for chunk in dataset.iter_chunks(columns)), pairs
+
+popular_totals, counted_pairs = read_popular_totals()
+df_popular = filter_popular_songs(popular_totals)
+
+def get_counted_pairs():
+    global counted_pairs
+    if counted_pairs is None:
+        counted_pairs = dataset.read_distinct(["track_id", "playlist_genre"])
+    return counted_pairs
+
+@dataset.on_append
+def append_rows(batch):
+    """
+    Ajoute un lot de nouvelles chansons aux totaux. Chaque graphique montre
+    toutes les périodes et tous les genres : ils sont tous retirés du cache
+    dès que le lot touche une période.
+    """
+    global popular_totals, df_popular
+    partial = aggregate_popular_songs(batch, get_counted_pairs())
+    if partial.empty:
+        return
+    popular_totals = dataset.add_totals(popular_totals, partial)
+    df_popular = filter_popular_songs(popular_totals)
+    get_graphs.cache_clear()
+
+@dataset.on_reload
+def reload_data():
+    """
+    Totaux recalculés sur la nouvelle version du jeu de données ; renvoie la
+    fonction qui les met en place. Les bornes du curseur d'année de base
+    restent celles du démarrage.
+    """
+    totals, pairs = read_popular_totals()
+    popular = filter_popular_songs(totals)
+
+    def swap():
+        global popular_totals, counted_pairs, df_popular
+        popular_totals, counted_pairs, df_popular = totals, pairs, popular
+        get_graphs.cache_clear()
+    return swap
     
 min_year = df_popular["year_group"].dt.year.min()
 max_year = df_popular["year_group"].dt.year.max()
@@ -113,6 +173,124 @@ layout = html.Div([
 ])
 
 
+@memoize(maxsize=64)
+def get_graphs(base_year, selected_genre):
+    """
+    Graphiques des indices pour une année de base et un genre mis en avant.
+    Mémoïsé ; l'indice est calculé sur une copie de df_popular, partagé entre les requêtes.
+    """
+    df_popular_updated = calculate_index(df_popular.copy(), base_year=base_year)
+    features = ["danceability", "energy", "speechiness", "liveness", "valence", "loudness"]
+    genres_couleurs = {
+        "rock": "#FF0000",       # Rouge
+        "latin": "#FFA500",      # Orange
+        "edm": "#f542f5",        # Rose
+        "rap": "#800080",        # Violet
+        "r&b": "#008000",        # Vert
+        "pop": "#ADD8E6"         # Bleu clair
+    }
+
+    feature_emojis = {
+        "danceability": "💃",
+        "energy": "⚡",
+        "speechiness": "🗣️",
+        "liveness": "🎤",
+        "valence": "😊",
+        "loudness": "🔊"
+    }
+
+    #subplots
+    fig = make_subplots(
+        rows=2, 
+        cols=3,
+        subplot_titles=[
+            f"{feature_emojis[feature]} Évolution de {feature.capitalize()}" 
+            for feature in features
+        ],
+        vertical_spacing=0.15,
+        horizontal_spacing=0.1
+    )
+
+    #traces
+    for i, feature in enumerate(features):
+        row = (i // 3) + 1
+        col = (i % 3) + 1
+        
+        for genre in df_popular_updated["playlist_genre"].unique():
+            genre_df = df_popular_updated[df_popular_updated["playlist_genre"] == genre]
+            
+            opacity = 1.0 if selected_genre == 'all' or genre == selected_genre else 0.25
+
+            fig.add_trace(
+                go.Scatter(
+                    x=genre_df["year_group"],
+                    y=genre_df[f"{feature}_index"],
+                    name=genre,
+                    legendgroup=genre,
+                    showlegend=True if i == 0 else False,
+                    hovertemplate=f"<b>{genre}</b>: %{{y:.2f}}<extra></extra>",
+                    line=dict(width=2, color=genres_couleurs.get(genre, "#FFFFFF")),
+                    opacity=opacity
+                ),
+                row=row,
+                col=col
+            )
+        
+        # horizontal line
+        fig.add_hline(
+            y=100,
+            line_dash="dash",
+            line_color="gray",
+            row=row,
+            col=col
+        )
+
+
+    fig.update_layout(
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.2,
+            xanchor="center",
+            x=0.5,
+            title_text="Genres:",
+            font=dict(color="white") 
+        ),
+        dragmode=False,
+        height=800,
+        margin=dict(t=50, b=50),
+        hovermode="x unified",
+        plot_bgcolor='#121212',  
+        paper_bgcolor='#121212',  
+        font=dict(color="white") 
+    )
+
+    for i, feature in enumerate(features):
+        row = (i // 3) + 1
+        col = (i % 3) + 1
+        fig.update_yaxes(
+            title_text=f"{feature.capitalize()} (%)", 
+            title_font=dict(color="white"),  
+            tickfont=dict(color="white"), 
+            showgrid=False, 
+            row=row, 
+            col=col
+        )
+        fig.update_xaxes(
+            title_text="Année", 
+            title_font=dict(color="white"), 
+            tickfont=dict(color="white"),  
+            showgrid=False,  
+            tickmode="array", 
+            tickvals=df_popular_updated["year_group"].dt.year.unique(),  
+            ticktext=[str(year) for year in df_popular_updated["year_group"].dt.year.unique()], 
+            row=row, 
+            col=col
+        )
+
+    return html.Div([dcc.Graph(figure=fig, style={'width': '100%', 'height': '800px'})])
+
+
 def register_callbacks(app):
     analyses = {
         "tous": "Sélectionnez un genre pour afficher une analyse spécifique.",
@@ -141,113 +319,4 @@ def register_callbacks(app):
         selected_key = selected_genre if selected_genre in analyses else "tous"
         analysis_text = analyses[selected_key]
         
-        df_popular_updated = calculate_index(df_popular, base_year=base_year)
-        features = ["danceability", "energy", "speechiness", "liveness", "valence", "loudness"]
-        genres_couleurs = {
-            "rock": "#FF0000",       # Rouge
-            "latin": "#FFA500",      # Orange
-            "edm": "#f542f5",        # Rose
-            "rap": "#800080",        # Violet
-            "r&b": "#008000",        # Vert
-            "pop": "#ADD8E6"         # Bleu clair
-        }
-        
-        feature_emojis = {
-            "danceability": "💃",
-            "energy": "⚡",
-            "speechiness": "🗣️",
-            "liveness": "🎤",
-            "valence": "😊",
-            "loudness": "🔊"
-        }
-        
-        #subplots
-        fig = make_subplots(
-            rows=2, 
-            cols=3,
-            subplot_titles=[
-                f"{feature_emojis[feature]} Évolution de {feature.capitalize()}" 
-                for feature in features
-            ],
-            vertical_spacing=0.15,
-            horizontal_spacing=0.1
-        )
-        
-        #traces
-        for i, feature in enumerate(features):
-            row = (i // 3) + 1
-            col = (i % 3) + 1
-            
-            for genre in df_popular_updated["playlist_genre"].unique():
-                genre_df = df_popular_updated[df_popular_updated["playlist_genre"] == genre]
-                
-                opacity = 1.0 if selected_genre == 'all' or genre == selected_genre else 0.25
-
-                fig.add_trace(
-                    go.Scatter(
-                        x=genre_df["year_group"],
-                        y=genre_df[f"{feature}_index"],
-                        name=genre,
-                        legendgroup=genre,
-                        showlegend=True if i == 0 else False,
-                        hovertemplate=f"<b>{genre}</b>: %{{y:.2f}}<extra></extra>",
-                        line=dict(width=2, color=genres_couleurs.get(genre, "#FFFFFF")),
-                        opacity=opacity
-                    ),
-                    row=row,
-                    col=col
-                )
-            
-            # horizontal line
-            fig.add_hline(
-                y=100,
-                line_dash="dash",
-                line_color="gray",
-                row=row,
-                col=col
-            )
-        
-        
-        fig.update_layout(
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=-0.2,
-                xanchor="center",
-                x=0.5,
-                title_text="Genres:",
-                font=dict(color="white") 
-            ),
-            dragmode=False,
-            height=800,
-            margin=dict(t=50, b=50),
-            hovermode="x unified",
-            plot_bgcolor='#121212',  
-            paper_bgcolor='#121212',  
-            font=dict(color="white") 
-        )
-        
-        for i, feature in enumerate(features):
-            row = (i // 3) + 1
-            col = (i % 3) + 1
-            fig.update_yaxes(
-                title_text=f"{feature.capitalize()} (%)", 
-                title_font=dict(color="white"),  
-                tickfont=dict(color="white"), 
-                showgrid=False, 
-                row=row, 
-                col=col
-            )
-            fig.update_xaxes(
-                title_text="Année", 
-                title_font=dict(color="white"), 
-                tickfont=dict(color="white"),  
-                showgrid=False,  
-                tickmode="array", 
-                tickvals=df_popular_updated["year_group"].dt.year.unique(),  
-                ticktext=[str(year) for year in df_popular_updated["year_group"].dt.year.unique()], 
-                row=row, 
-                col=col
-            )
-            
-        return dcc.Markdown(analysis_text), html.Div([dcc.Graph(figure=fig, style={'width': '100%', 'height': '800px'})])
+        return dcc.Markdown(analysis_text), get_graphs(base_year, selected_genre)
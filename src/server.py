@@ -1,5 +1,12 @@
 """
 Contains the server to run our application.
+
+In development (``FLASK_ENV=development``, the default when this file is run
+directly) the app is wrapped in flask_failsafe and served by the Flask dev
+server. In production, Gunicorn imports ``server`` with the settings of
+``src/gunicorn_config.py``::
+
+    gunicorn -c src/gunicorn_config.py src.server:server
 """
 from flask_failsafe import failsafe
 import sys
@@ -7,7 +14,11 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-@failsafe
+DEVELOPMENT = os.environ.get(
+    "FLASK_ENV", "development" if __name__ == "__main__" else "production"
+) == "development"
+
+
 def create_app():
     """
     Gets the underlying Flask server from our Dash app.
@@ -19,6 +30,11 @@ def create_app():
     from src.app import app  # pylint: disable=import-outside-toplevel
     return app.server
 
+
+# The failsafe wrapper only helps while editing code, keep it out of production.
+if DEVELOPMENT:
+    create_app = failsafe(create_app)
+
 # Create the WSGI callable that Gunicorn expects.
 server = create_app()
 
@@ -28,5 +44,10 @@ if __name__ == "__main__":
 
     # Version serveur
     port = int(os.environ.get("PORT", 8050))
+    # Avec le rechargeur de Flask, seul le processus enfant sert les requêtes.
+    if not DEVELOPMENT or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from src import dataset_watcher, warmup  # pylint: disable=import-outside-toplevel
+        warmup.start()
+        dataset_watcher.start()
     # Utilise 0.0.0.0 pour écouter sur toutes les interfaces.
-    server.run(port=port, debug=True, host='0.0.0.0')
\ No newline at end of file
+    server.run(port=port, debug=DEVELOPMENT, host='0.0.0.0')
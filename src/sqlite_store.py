@@ -0,0 +1,230 @@
+"""
+Base SQLite du jeu de données, pour les catalogues qui changent souvent.
+
+Le CSV est chargé dans une table ``songs`` (une ligne par appartenance d'une
+chanson à une playlist, colonnes du CSV telles quelles) avec des colonnes
+dérivées : année de sortie et date normalisée (``year``, ``release_date``),
+année au format "%Y-%m-%d" ou "%Y" (``release_year``), et deux drapeaux pour
+les agrégats par chanson : ``first_track`` (première ligne de la chanson) et
+``first_pair`` (première ligne du couple chanson, genre). Des index sur
+(playlist_genre, year), (playlist_subgenre, release_year) et (track_artist,
+release_date) servent les requêtes des sections.
+
+Les sections y demandent leurs agrégats par des requêtes paramétrées (voir
+``aggregate`` et ``count``) au lieu de parcourir le fichier. Les workers
+ouvrent la base en lecture seule, projetée en mémoire : ses pages restent
+dans le cache du système, partagé entre les processus.
+
+Construction, depuis la racine du dépôt::
+
+    python -m src.sqlite_store dataset/spotify_songs_clean.csv dataset/spotify.db
+
+puis ``SPOTIFY_SQLITE=dataset/spotify.db`` pour que les sections la lisent
+(voir ``src/dataset.py``). La base est écrite à côté puis renommée : une
+reconstruction en place est vue comme une nouvelle version.
+"""
+import argparse
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import pandas as pd
+
+TABLE = "songs"
+TEXT_COLUMNS = [
+    "track_id", "track_name", "track_artist", "track_album_id", "track_album_name", "track_album_release_date",
+    "playlist_name", "playlist_id", "playlist_genre", "playlist_subgenre",
+]
+INDEXES = {
+    "songs_genre_year": ["playlist_genre", "year"],
+    "songs_subgenre_year": ["playlist_subgenre", "release_year", "playlist_genre"],
+    "songs_artist_date": ["track_artist", "release_date"],
+}
+POOL_SIZE = 4
+MMAP_SIZE = 1 << 30
+
+
+def quoted(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def build(csv_path, db_path, chunk_rows=200_000):
+    """
+    Construit la base à partir du CSV, lu par morceaux
+
+    Args
+    ----
+    csv_path : str
+        Chemin du fichier CSV
+    db_path : str
+        Chemin de la base, remplacée une fois complète
+    chunk_rows : int
+        Nombre de lignes lues à la fois
+    """
+    # pylint: disable=import-outside-toplevel
+    from .dataset import parse_dates, parse_release_dates
+
+    header = list(pd.read_csv(csv_path, nrows=0).columns)
+    text = [name for name in header if name in TEXT_COLUMNS]
+    columns = [f"{quoted(name)} {'TEXT' if name in text else 'NUMERIC'}" for name in header]
+    columns += ["year INTEGER", "release_date TEXT", "release_year INTEGER",
+                "first_track INTEGER NOT NULL DEFAULT 0", "first_pair INTEGER NOT NULL DEFAULT 0"]
+
+    building = db_path + ".building"
+    if os.path.exists(building):
+        os.remove(building)
+    conn = sqlite3.connect(building)
+    try:
+        conn.execute(f"CREATE TABLE {TABLE} ({', '.join(columns)})")
+        for chunk in pd.read_csv(csv_path, dtype={name: str for name in text}, chunksize=chunk_rows):
+            dates = parse_dates(chunk["track_album_release_date"])
+            chunk = chunk.assign(
+                year=dates.dt.year.astype("Int64"),
+                release_date=dates.dt.strftime("%Y-%m-%d"),
+                release_year=parse_release_dates(chunk["track_album_release_date"]).dt.year.astype("Int64"),
+            )
+            chunk.to_sql(TABLE, conn, if_exists="append", index=False)
+        # Première ligne (dans l'ordre du fichier) de chaque chanson, et de chaque
+        # couple (chanson, genre) ; une ligne à laquelle il manque une clé compte à part
+        conn.execute(f"""
+            UPDATE {TABLE} SET
+                first_track = track_id IS NULL
+                    OR rowid IN (SELECT MIN(rowid) FROM {TABLE} GROUP BY track_id),
+                first_pair = track_id IS NULL OR playlist_genre IS NULL
+                    OR rowid IN (SELECT MIN(rowid) FROM {TABLE} GROUP BY track_id, playlist_genre)
+        """)
+        for name, keys in INDEXES.items():
+            conn.execute(f"CREATE INDEX {name} ON {TABLE} ({', '.join(map(quoted, keys))})")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(building, db_path)
+
+
+class ConnectionPool:
+    """
+    Connexions en lecture seule à une base, gardées d'une requête à l'autre.
+    La base est ouverte à son chemin réel : remplacée ensuite, elle n'est vue
+    que par un nouveau pool. Une connexion ne traverse pas un fork : un
+    processus forké repart d'un pool vide.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = os.path.realpath(path)
+        self.size = size
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue()
+
+    def connect(self):
+        conn = sqlite3.connect(f"file:{quote(self.path)}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if self.pid != os.getpid():
+            self.pid, self.idle = os.getpid(), queue.LifoQueue()
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            if self.idle.qsize() < self.size:
+                self.idle.put(conn)
+            else:
+                conn.close()
+
+
+def iter_chunks(pool, columns, chunk_rows):
+    """
+    Parcourt les colonnes demandées de la table par morceaux de chunk_rows
+    lignes, dans l'ordre du fichier d'origine
+
+    Returns
+    -------
+    generator of pd.DataFrame
+    """
+    sql = f"SELECT {', '.join(map(quoted, columns))} FROM {TABLE} ORDER BY rowid"
+    start = 0
+    with pool.connection() as conn:
+        for chunk in pd.read_sql_query(sql, conn, chunksize=chunk_rows):
+            # Numéros de ligne continus d'un morceau à l'autre, comme pd.read_csv(chunksize=...)
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+
+def _query(pool, keys, values, where, params, dropna):
+    conditions = [f"({where})"] + ([f"{expression} IS NOT NULL" for expression in keys.values()] if dropna else [])
+    sql = (
+        f"SELECT {', '.join(f'{expression} AS {quoted(name)}' for name, expression in keys.items())}, {', '.join(values)}"
+        f" FROM {TABLE} WHERE {' AND '.join(conditions)} GROUP BY {', '.join(map(quoted, keys))}"
+    )
+    with pool.connection() as conn:
+        frame = pd.read_sql_query(sql, conn, params=params)
+    # Même ordre que groupby : clés triées, valeurs manquantes à la fin
+    return frame.set_index(list(keys)).sort_index()
+
+
+def aggregate(pool, keys, columns, where="1", params=(), dropna=True):
+    """
+    Sommes et nombres de valeurs non manquantes de columns par groupe de keys,
+    calculés par SQLite
+
+    Args
+    ----
+    pool : ConnectionPool
+        Connexions à la base
+    keys : dict
+        {nom de la clé: expression SQL}
+    columns : list
+        Colonnes sommées
+    where : str
+        Condition SQL, avec des paramètres "?"
+    params : tuple
+        Valeurs des paramètres de where
+    dropna : bool
+        Écarter les groupes dont une clé manque, comme groupby
+
+    Returns
+    -------
+    pd.DataFrame
+        Même forme que dataset.partial_sums : indexé par keys, colonnes
+        ("sum", colonne) et ("count", colonne)
+    """
+    values = [f"SUM({quoted(name)}), COUNT({quoted(name)})" for name in columns]
+    frame = _query(pool, keys, values, where, params, dropna)
+    frame.columns = pd.MultiIndex.from_tuples(
+        [(kind, name) for name in columns for kind in ("sum", "count")]
+    )
+    # SUM d'un groupe sans valeur donne NULL, la somme pandas 0
+    return frame[["sum", "count"]].fillna(0)
+
+
+def count(pool, keys, where="1", params=()):
+    """
+    Nombre de lignes par groupe de keys (voir aggregate), sans les groupes dont une clé manque
+
+    Returns
+    -------
+    pd.Series
+    """
+    return _query(pool, keys, ["COUNT(*)"], where, params, dropna=True).iloc[:, 0].rename(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit la base SQLite d'un fichier CSV.")
+    parser.add_argument("csv", help="fichier CSV du jeu de données")
+    parser.add_argument("database", help="fichier de la base")
+    parser.add_argument("--chunk-rows", type=int, default=200_000, help="lignes lues à la fois")
+    args = parser.parse_args()
+    build(args.csv, args.database, args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Fingerprinted URLs and long-lived caching for the files of ``src/assets``.
+
+``asset_url("icons/play_icon.png")`` gives ``/assets/icons/play_icon.png?v=<hash>``,
+the hash being taken from the file content, so the URL changes whenever the
+file does. Asset responses requested with a version (our ``?v=`` or the
+``?m=`` Dash adds to the CSS/JS it includes) are then marked immutable for a
+year: repeat visits take them from the browser cache without revalidating.
+Unversioned requests keep Flask's default headers.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+import flask
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
+ASSETS_URL = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@lru_cache(maxsize=None)
+def fingerprint(path):
+    """Short hash of the content of an asset (path relative to src/assets)."""
+    digest = hashlib.sha1()
+    with open(os.path.join(ASSETS_DIR, path), "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def asset_url(path):
+    return f"{ASSETS_URL}{path}?v={fingerprint(path)}"
+
+
+def add_cache_headers(response):
+    request = flask.request
+    if (request.path.startswith(ASSETS_URL) and response.status_code in (200, 206, 304)
+            and ("v" in request.args or "m" in request.args)):
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.headers.pop("Expires", None)
+    return response
+
+
+def init_app(app):
+    """Serves the versioned assets of a Dash app with immutable cache headers."""
+    app.server.after_request(add_cache_headers)
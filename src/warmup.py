@@ -0,0 +1,163 @@
+"""
+Background warm-up of the section caches, with ``/healthz`` and ``/readyz``.
+
+Once started, a small thread pool precomputes the default and story-page
+outputs of every section (q1 story pages, q2 columns, q5 base years, q13
+features, q14 genres, q4/q11 figures) through the same memoized functions
+the callbacks use. ``/healthz`` answers as long as the worker is alive;
+``/readyz`` answers 503 until the warm-up is over, so that a load balancer
+only routes visitors to warm workers.
+
+The warm-up runs once per process: Gunicorn starts it in each worker
+(``post_fork`` in ``src/gunicorn_config.py``), ``src/server.py`` when run
+directly, and the first ``/readyz`` probe otherwise. After a reload of the
+dataset, ``refresh`` warms the new data the same way, the worker staying
+ready meanwhile.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {"pid": None, "total": 0, "done": 0, "failed": []}
+_ready = threading.Event()
+
+
+def warm_q1_page(page):
+    from . import q1  # pylint: disable=import-outside-toplevel
+    _, year_range, genre, _, features = q1.get_story_page(page)
+    q1.get_charts(tuple(year_range), genre, tuple(features))
+
+
+def warm_q2_column(column):
+    from . import q2  # pylint: disable=import-outside-toplevel
+    q2.get_column_outputs(column, tuple(map(tuple, q2.colors.tolist())))
+
+
+def warm_q5_base_year(base_year):
+    from . import q5  # pylint: disable=import-outside-toplevel
+    q5.get_graphs(base_year, "all")
+
+
+def warm_up_tasks():
+    """
+    Lists the ``(name, function, args)`` to precompute, the outputs shown
+    on page load first.
+    """
+    # pylint: disable=import-outside-toplevel
+    from . import q2, q4, q5, q11, q13, q14
+
+    base_years = [int(year) for year in range(q5.min_year, q5.max_year + 1, 3)]
+    columns = [None] + list(range(len(q2.x_labels)))
+    defaults = [
+        ("q1 page 1", warm_q1_page, (1,)),
+        ("q2 overview", warm_q2_column, (None,)),
+        ("q5 base year", warm_q5_base_year, (base_years[0],)),
+        ("q13 feature", q13.generate_line_chart, (q13.features[0],)),
+        ("q14 genres", q14.get_figure_genre, ()),
+        ("q4 figure", q4.generate_duration_popularity_plot, ()),
+        ("q11 figure", q11.get_figure, ()),
+    ]
+    others = (
+        [(f"q1 page {page}", warm_q1_page, (page,)) for page in range(2, 8)]
+        + [(f"q2 column {column}", warm_q2_column, (column,)) for column in columns[1:]]
+        + [(f"q5 base year {year}", warm_q5_base_year, (year,)) for year in base_years[1:]]
+        + [(f"q13 {feature}", q13.generate_line_chart, (feature,)) for feature in q13.features[1:]]
+        + [(f"q14 {genre}", q14.get_subgenre_figure, (genre,)) for genre in q14.subgenres_by_genre]
+    )
+    return defaults + others
+
+
+def _call(name, function, args):
+    try:
+        function(*args)
+        return True
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Warm-up of %s failed", name)
+        return False
+
+
+def _run(name, function, args):
+    if not _call(name, function, args):
+        with _lock:
+            _state["failed"].append(name)
+    with _lock:
+        _state["done"] += 1
+        if _state["done"] == _state["total"]:
+            _ready.set()
+            logger.info("Warm-up done (%d tasks, %d failed)", _state["total"], len(_state["failed"]))
+
+
+def start(max_workers=None):
+    """
+    Starts the warm-up in the background; does nothing if it already started
+    in this process (threads don't survive a fork, so each worker has its own).
+    """
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return
+        _state.update(pid=os.getpid(), total=0, done=0, failed=[])
+        _ready.clear()
+
+    def schedule():
+        try:
+            tasks = warm_up_tasks()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Warm-up could not start")
+            tasks = []
+        with _lock:
+            _state["total"] = len(tasks)
+        if not tasks:
+            _ready.set()
+            return
+        workers = max_workers or int(os.environ.get("WARMUP_THREADS", 2))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup")
+        for task in tasks:
+            executor.submit(_run, *task)
+        executor.shutdown(wait=False)
+
+    threading.Thread(target=schedule, name="warmup", daemon=True).start()
+
+
+def refresh(max_workers=None):
+    """
+    Warms the caches again in the background, after they were emptied by a
+    reload of the dataset; the readiness of the worker is left as it is.
+    """
+    try:
+        tasks = warm_up_tasks()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Warm-up refresh could not start")
+        return
+    workers = max_workers or int(os.environ.get("WARMUP_THREADS", 2))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup")
+    for task in tasks:
+        executor.submit(_call, *task)
+    executor.shutdown(wait=False)
+
+
+def is_ready():
+    return _ready.is_set() and _state["pid"] == os.getpid()
+
+
+def healthz():
+    return flask.jsonify(status="ok")
+
+
+def readyz():
+    start()
+    with _lock:
+        body = {"status": "ready" if is_ready() else "warming", "done": _state["done"],
+                "total": _state["total"], "failed": list(_state["failed"])}
+    return flask.jsonify(body), 200 if body["status"] == "ready" else 503
+
+
+def init_app(app):
+    """Serves ``/healthz`` and ``/readyz`` from the server of a Dash app."""
+    app.server.add_url_rule("/healthz", "healthz", healthz)
+    app.server.add_url_rule("/readyz", "readyz", readyz)
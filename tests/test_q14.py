@@ -0,0 +1,51 @@
+"""
+q14 sur des chansons sans artiste, genre ou sous-genre : la section doit démarrer,
+et accepter un lot ajouté qui en contient.
+
+Les sections lisent ./dataset/spotify_songs_clean.csv à l'import : chaque
+test importe l'application dans un processus séparé, depuis un dossier
+temporaire qui contient un petit jeu de données synthétique.
+"""
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+
+from generate_dataset import generate_dataset  # noqa: E402
+
+
+def run_app(workdir, script):
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    for name in ("SPOTIFY_STORE", "SPOTIFY_SQLITE"):
+        env.pop(name, None)
+    subprocess.run([sys.executable, "-c", "import src.app\n" + script], cwd=workdir, env=env, check=True)
+
+
+def write_dataset(workdir, blank):
+    """Jeu de données de 2000 lignes où les colonnes de blank sont vidées sur quelques lignes."""
+    os.makedirs(workdir / "dataset")
+    path = workdir / "dataset" / "spotify_songs_clean.csv"
+    generate_dataset(path, 2000)
+    data = pd.read_csv(path)
+    for column, rows in blank.items():
+        data.loc[rows, column] = None
+    data.to_csv(path, index=False)
+    return data
+
+
+def test_missing_artist_and_genre(tmp_path):
+    write_dataset(tmp_path, {"track_artist": [0, 7], "playlist_genre": [3, 7], "playlist_subgenre": [5]})
+    run_app(tmp_path, "from src import q14\nassert q14.genre_timelines and len(q14.artist_timelines['offsets']) > 1")
+
+
+def test_append_missing_artist_and_genre(tmp_path):
+    data = write_dataset(tmp_path, {})
+    batch = data.iloc[:4].copy()
+    batch.loc[batch.index[:2], "track_artist"] = None
+    batch.loc[batch.index[1:3], "playlist_genre"] = None
+    batch.to_csv(tmp_path / "batch.csv", index=False)
+    run_app(tmp_path, "import pandas as pd\nfrom src import dataset\ndataset.append(pd.read_csv('batch.csv'), persist=False)")